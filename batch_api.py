@@ -0,0 +1,174 @@
+import abc
+import json
+import time
+
+import openai
+import requests
+
+# Batch API принимает не больше 50 000 запросов в одном файле
+MAX_REQUESTS_PER_BATCH = 50_000
+
+# и не больше 200 МБ в одном файле (каждая строка повторяет весь промпт, поэтому 50 000 строк в него не помещаются)
+MAX_BYTES_PER_BATCH = 200_000_000
+
+# Пакетная обработка стоит вдвое дешевле обычных запросов
+BATCH_PRICE_FACTOR = 0.5
+
+# Конечные статусы пакетного задания
+FINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Префикс custom_id строки в файле запросов
+CUSTOM_ID_PREFIX = "row-"
+
+
+# Интерфейс поставщика пакетной обработки: загрузка файла запросов, создание задания, опрос и скачивание результатов
+class BatchProvider(abc.ABC):
+    # Загружает файл запросов, возвращает id файла
+    @abc.abstractmethod
+    def upload_file(self, path):
+        ...
+
+    # Создаёт пакетное задание, возвращает id задания
+    @abc.abstractmethod
+    def create_batch(self, input_file_id):
+        ...
+
+    # Возвращает состояние задания (словарь с status, output_file_id, error_file_id)
+    @abc.abstractmethod
+    def get_batch(self, batch_id):
+        ...
+
+    # Возвращает содержимое файла результатов
+    @abc.abstractmethod
+    def download_file(self, file_id):
+        ...
+
+
+# Batch API OpenAI через REST (openai==0.28 не содержит методов Batch API).
+# api_base можно направить на локальный fake_openai_server.py для проверки без сети.
+class OpenAIBatchProvider(BatchProvider):
+    def __init__(self, api_key=None, api_base=None, timeout=60):
+        self.api_key = api_key or openai.api_key
+        self.api_base = (api_base or openai.api_base).rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+
+    def _request(self, method, path, **kwargs):
+        response = self.session.request(method, f"{self.api_base}{path}", timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def upload_file(self, path):
+        with open(path, "rb") as requests_file:
+            response = self._request("POST", "/files", data={"purpose": "batch"},
+                                     files={"file": (path, requests_file, "application/jsonl")})
+        return response.json()["id"]
+
+    def create_batch(self, input_file_id):
+        response = self._request("POST", "/batches", json={"input_file_id": input_file_id,
+                                                           "endpoint": "/v1/chat/completions",
+                                                           "completion_window": "24h"})
+        return response.json()["id"]
+
+    def get_batch(self, batch_id):
+        return self._request("GET", f"/batches/{batch_id}").json()
+
+    def download_file(self, file_id):
+        return self._request("GET", f"/files/{file_id}/content").content.decode("utf-8")
+
+
+# Функция для строки файла запросов Batch API
+def build_batch_request(row_id, prompt_template, input_text, model, max_tokens=1500, temperature=0.7):
+    return {
+        "custom_id": f"{CUSTOM_ID_PREFIX}{row_id}",
+        "method": "POST",
+        "url": "/v1/chat/completions",
+        "body": {
+            "model": model,
+            "messages": [{"role": "system", "content": prompt_template},
+                         {"role": "user", "content": input_text}],
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        },
+    }
+
+
+# Функция для записи файлов запросов: entries - (id, текст запроса), не больше max_requests строк
+# и max_bytes байт в файле; новый файл начинается, как только следующая строка превысила бы любой из лимитов.
+# Возвращает список путей (base_path, base_path.2, ...).
+def write_batch_files(base_path, entries, prompt_template, model, max_tokens=1500, temperature=0.7,
+                      max_requests=MAX_REQUESTS_PER_BATCH, max_bytes=MAX_BYTES_PER_BATCH):
+    paths = []
+    requests_file = None
+    written = 0
+    written_bytes = 0
+    try:
+        for row_id, input_text in entries:
+            request = build_batch_request(row_id, prompt_template, input_text, model, max_tokens, temperature)
+            line = (json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8")
+            if requests_file is None or written >= max_requests or (written and written_bytes + len(line) > max_bytes):
+                if requests_file is not None:
+                    requests_file.close()
+                path = base_path if not paths else f"{base_path}.{len(paths) + 1}"
+                paths.append(path)
+                requests_file = open(path, "wb")
+                written = 0
+                written_bytes = 0
+            requests_file.write(line)
+            written += 1
+            written_bytes += len(line)
+    finally:
+        if requests_file is not None:
+            requests_file.close()
+    return paths
+
+
+# Функция для отправки файла запросов: загрузка и создание задания, возвращает id задания
+def submit_batch(provider, requests_path):
+    return provider.create_batch(provider.upload_file(requests_path))
+
+
+# Функция для ожидания завершения задания с опросом раз в poll_interval секунд.
+# on_status(batch) вызывается после каждого опроса (для вывода прогресса).
+def wait_for_batch(provider, batch_id, poll_interval=30.0, on_status=None):
+    while True:
+        batch = provider.get_batch(batch_id)
+        if on_status is not None:
+            on_status(batch)
+        if batch["status"] in FINAL_BATCH_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+# Функция для разбора файла результатов Batch API.
+# Возвращает {id строки: (текст ответа или None, usage или None, текст ошибки или None)}.
+def parse_batch_output(output_text):
+    results = {}
+    for line in output_text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        custom_id = record.get("custom_id", "")
+        if not custom_id.startswith(CUSTOM_ID_PREFIX):
+            continue
+        row_id = int(custom_id[len(CUSTOM_ID_PREFIX):])
+        response = record.get("response") or {}
+        body = response.get("body") or {}
+        if record.get("error") or response.get("status_code") != 200 or not body.get("choices"):
+            error = record.get("error") or body.get("error") or {"status_code": response.get("status_code")}
+            results[row_id] = (None, None, str(error))
+            continue
+        usage = body.get("usage") or {}
+        results[row_id] = (body["choices"][0]["message"]["content"].strip(),
+                           (usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)), None)
+    return results
+
+
+# Функция для скачивания результатов завершённого задания (вместе с файлом ошибок, если он есть)
+def download_batch_results(provider, batch):
+    results = {}
+    for file_key in ("error_file_id", "output_file_id"):
+        if batch.get(file_key):
+            results.update(parse_batch_output(provider.download_file(batch[file_key])))
+    return results
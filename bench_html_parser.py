@@ -0,0 +1,132 @@
+# Бенчмарк разбора HTML-ответов: однопроходный парсер против прежнего двойного разбора BeautifulSoup.
+# Запуск: python bench_html_parser.py [файл_с_ответами.jsonl] [--count 5000]
+# Файл ответов - JSONL с полем "response" (если не указан, ответы генерируются по шаблону из промпта).
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+
+from html_response_parser import parse_html_response
+
+
+# Прежняя реализация (BeautifulSoup, два разбора и регулярное выражение) - для сравнения скорости и результатов
+def parse_html_response_bs4(html_response):
+    from bs4 import BeautifulSoup
+
+    def extract_category_from_html(html_response):
+        try:
+            soup = BeautifulSoup(html_response, "html.parser")
+            category_p = soup.find("h3", string="Категория:").find_next("p")
+            if category_p:
+                category_text = category_p.get_text(strip=True)
+                category_match = re.match(r"^(\d+)$", category_text)
+                return category_match.group(1) if category_match else "Не определена"
+            return "Не определена"
+        except Exception:
+            return "Ошибка"
+
+    try:
+        soup = BeautifulSoup(html_response, "html.parser")
+        question_h2 = soup.find("h2", string="Вопрос:")
+        question = question_h2.find_next("p").get_text(strip=True) if question_h2 else "Вопрос не найден"
+        answer_h2 = soup.find("h2", string="Ответ:")
+        answer_elements = []
+        if answer_h2:
+            for sibling in answer_h2.find_next_siblings():
+                if sibling.name == "h2":
+                    break
+                answer_elements.append(str(sibling))
+            answer = ''.join(answer_elements)
+        else:
+            answer = "Заголовок 'Ответ:' не найден"
+        answer = re.sub(r"<h3>Категория:</h3>\s*<p>\d+</p>", "", answer, flags=re.DOTALL).strip()
+        category = extract_category_from_html(html_response)
+        return question, answer, category
+    except Exception:
+        return "Ошибка при разборе вопроса", "Ошибка при разборе ответа", "Ошибка"
+
+
+# Функция для генерации ответа модели по шаблону из Промпт_with_category.txt
+def make_sample_response(rng):
+    steps = "\n".join(f"      <li>Шаг диагностики {n}: проверьте узел {rng.randint(1, 99)}.</li>"
+                      for n in range(1, rng.randint(2, 6)))
+    paragraph = " ".join(rng.choice(["Отключите", "технику", "от сети", "и проверьте", "датчик", "температуры",
+                                     "уплотнитель", "двери", "вентилятор", "плату управления"]) for _ in range(40))
+    category = rng.choice([str(rng.randint(1, 30))] * 8 + ["0", "Холодильники"])
+    return f"""<div>
+  <h2>Вопрос:</h2>
+  <p>Почему {rng.choice(['холодильник', 'стиральная машина', 'телевизор'])} не работает?</p>
+  <h2>Ответ:</h2>
+  <div>
+    <h3>Что сделать в первую очередь:</h3>
+    <p>{paragraph}</p>
+  </div>
+  <div>
+    <h3>Диагностика:</h3>
+    <ol>
+{steps}
+    </ol>
+  </div>
+  <div>
+    <h3>Возможное решение:</h3>
+    <p>{paragraph}</p>
+  </div>
+  <div>
+    <h3>Когда обращаться к мастеру:</h3>
+    <p>{paragraph}</p>
+  </div>
+  <h3>Категория:</h3>
+  <p>{category}</p>
+</div>"""
+
+
+# Функция для замера времени разбора одного ответа (в микросекундах)
+def time_parser(parser, responses):
+    timings = []
+    for response in responses:
+        start = time.perf_counter()
+        parser(response)
+        timings.append((time.perf_counter() - start) * 1_000_000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк разбора HTML-ответов модели")
+    parser.add_argument("responses", nargs="?", help="JSONL с полем response")
+    parser.add_argument("--count", type=int, default=5000, help="число сгенерированных ответов")
+    args = parser.parse_args()
+
+    if args.responses:
+        with open(args.responses, "r", encoding="utf-8") as responses_file:
+            responses = [json.loads(line)["response"] for line in responses_file if line.strip()]
+    else:
+        rng = random.Random(0)
+        responses = [make_sample_response(rng) for _ in range(args.count)]
+
+    parsers = [("однопроходный html.parser", parse_html_response)]
+    try:
+        import bs4  # noqa: F401
+        parsers.append(("BeautifulSoup (прежний)", parse_html_response_bs4))
+    except ImportError:
+        print("BeautifulSoup не установлен - сравнение с прежним парсером пропущено")
+
+    for name, parse in parsers:
+        timings = time_parser(parse, responses)
+        print(f"{name}: среднее {statistics.mean(timings):.1f} мкс, "
+              f"медиана {statistics.median(timings):.1f} мкс, "
+              f"p95 {sorted(timings)[int(len(timings) * 0.95)]:.1f} мкс на ответ ({len(responses)} ответов)")
+
+    if len(parsers) > 1:
+        same = [0, 0, 0]
+        for response in responses:
+            new, old = parse_html_response(response), parse_html_response_bs4(response)
+            for field in range(3):
+                same[field] += new[field] == old[field]
+        print(f"Совпадение с прежним парсером: вопрос {same[0] / len(responses) * 100:.1f}%, "
+              f"ответ {same[1] / len(responses) * 100:.1f}%, категория {same[2] / len(responses) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
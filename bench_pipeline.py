@@ -0,0 +1,265 @@
+# Сквозной бенчмарк конвейера qna_processor_50k.py на локальном fake_openai_server.py (без сети и расходов на API).
+# Запуск: python bench_pipeline.py [--rows 50000] [--latency-ms 300 --latency-dist lognormal] [--json-out baseline.json]
+# Для каждого входа (100 строк из "Формат передачи_100.txt" и синтетический файл на --rows строк) обработка
+# запускается в отдельном процессе; выводятся строки/с, p50/p99 задержки запроса, CPU по этапам и пиковый RSS.
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from input_readers import read_txt_rows, read_input_rows
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_FILE_NAME = os.path.join(BASE_DIR, "Формат передачи_100.txt")
+
+# Этапы, для которых считается процессорное время
+STAGES = ("read", "tokenize", "parse", "write")
+
+
+# Функция для пикового RSS текущего процесса в МБ (None, если модуль resource недоступен, например на Windows)
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux возвращает КБ, macOS - байты
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+# Функция для перцентиля в миллисекундах
+def percentile_ms(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))] * 1000
+
+
+# Функция для записи входного XLSX (вопрос и ответы в столбцах, без заголовка)
+def write_input_xlsx(path, rows):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    for question, answers in rows:
+        sheet.append([question, *answers])
+    workbook.save(path)
+
+
+# Функция для подготовки входных файлов: выборка 100 строк и синтетический файл на rows строк.
+# Синтетические строки собираются из вопросов и ответов выборки; готовые файлы переиспользуются.
+def prepare_inputs(data_dir, rows):
+    os.makedirs(data_dir, exist_ok=True)
+    sample = [(question, answers) for question, answers in read_txt_rows(SAMPLE_FILE_NAME)]
+    sample_path = os.path.join(data_dir, "sample_100.xlsx")
+    if not os.path.exists(sample_path):
+        write_input_xlsx(sample_path, sample)
+    inputs = [("100 строк", sample_path)]
+    if rows:
+        synthetic_path = os.path.join(data_dir, f"synthetic_{rows}.xlsx")
+        if not os.path.exists(synthetic_path):
+            rng = random.Random(rows)
+            all_answers = [answer for _, answers in sample for answer in answers]
+
+            def synthetic_rows():
+                for number in range(rows):
+                    question, answers = rng.choice(sample)
+                    extra = rng.sample(all_answers, k=min(len(all_answers), rng.randint(0, 2)))
+                    yield f"{question} (вариант {number})", (answers + extra)[:rng.randint(1, 6)]
+
+            print(f"Генерация синтетического входа на {rows} строк: {synthetic_path}")
+            write_input_xlsx(synthetic_path, synthetic_rows())
+        inputs.append((f"{rows} строк", synthetic_path))
+    return inputs
+
+
+# Функция для свободного TCP-порта
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+# Функция для запуска fake_openai_server.py в отдельном процессе (чтобы его CPU не смешивался с CPU конвейера)
+def start_fake_server(port, server_args):
+    process = subprocess.Popen([sys.executable, os.path.join(BASE_DIR, "fake_openai_server.py"),
+                                "--port", str(port), *server_args], stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("fake_openai_server.py не запустился")
+
+
+# Учёт процессорного времени по этапам: функции модуля обработчика оборачиваются без изменения его кода
+class StageTimer:
+    def __init__(self):
+        self.cpu = dict.fromkeys(STAGES, 0.0)
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            started = time.process_time()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.cpu[stage] += time.process_time() - started
+        return timed
+
+
+# Обёртка sink, учитывающая время записи строк
+class TimedSink:
+    def __init__(self, sink, timer):
+        self.sink = sink
+        self.write_rows = timer.wrap("write", sink.write_rows)
+        self.close = timer.wrap("write", sink.close)
+
+
+# Функция для прогона одного входа в текущем процессе; возвращает отчёт (dict)
+def run_scenario(input_path, api_base, max_in_flight, output_path, parse_workers):
+    import openai
+    import qna_async
+    import qna_processor_50k as processor
+    from output_sinks import open_sink
+    from result_journal import ResultJournal
+
+    openai.api_base = api_base
+    # Ограничитель скорости не должен влиять на замер накладных расходов конвейера
+    processor.requests_per_minute = 10 ** 9
+    processor.tokens_per_minute = 10 ** 12
+
+    timer = StageTimer()
+    processor.parse_html_response = timer.wrap("parse", processor.parse_html_response)
+    if not parse_workers:
+        # Разбор в основном процессе; при разборе в пуле его CPU не входит в этапы основного процесса
+        import parse_pool
+        parse_pool.parse_and_validate = timer.wrap("parse", parse_pool.parse_and_validate)
+    processor.count_tokens = timer.wrap("tokenize", processor.count_tokens)
+    processor.count_tokens_batch = timer.wrap("tokenize", processor.count_tokens_batch)
+
+    latencies = []
+    original_create = qna_async.create_chat_completion
+
+    async def timed_create(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await original_create(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - started)
+
+    qna_async.create_chat_completion = timed_create
+
+    with open(os.path.join(BASE_DIR, processor.prompt_file_name), "r", encoding="windows-1251") as prompt_file:
+        prompt_template = prompt_file.read()
+
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    # Входной файл читается напрямую, без колоночного кэша - замеряется сам читатель
+    data = timer.wrap("read", lambda path: list(read_input_rows(path)))(input_path)
+    journal = ResultJournal(output_path + ".journal.sqlite")
+    journal.reset()
+    journal.record = timer.wrap("write", journal.record)
+    sink = TimedSink(open_sink(output_path + ".jsonl"), timer)
+    try:
+        results, total_tokens, _ = processor.process_qna_with_ai(prompt_template, data, journal, sink,
+                                                                  max_in_flight=max_in_flight, cache=None,
+                                                                  parse_workers=parse_workers)
+    finally:
+        journal.commit()
+        sink.close()
+    timer.wrap("write", processor.export_to_xlsx)(journal.rows(), output_path + ".xlsx")
+    journal.close()
+    wall = time.perf_counter() - wall_started
+
+    return {
+        "rows": len(results),
+        "errors": sum(1 for result in results if result[1] == "Ошибка"),
+        "requests": len(latencies),
+        "seconds": wall,
+        "rows_per_sec": len(results) / wall if wall else 0.0,
+        "p50_ms": percentile_ms(latencies, 0.50),
+        "p99_ms": percentile_ms(latencies, 0.99),
+        "mean_ms": statistics.mean(latencies) * 1000 if latencies else 0.0,
+        "cpu_seconds": {**timer.cpu, "total": time.process_time() - cpu_started},
+        "peak_rss_mb": peak_rss_mb(),
+        "total_tokens": total_tokens,
+    }
+
+
+# Функция для вывода отчёта по одному входу
+def print_report(name, report):
+    cpu = report["cpu_seconds"]
+    rss = f"{report['peak_rss_mb']:.0f} МБ" if report["peak_rss_mb"] is not None else "н/д"
+    print(f"{name}: {report['rows']} строк за {report['seconds']:.1f} с ({report['rows_per_sec']:.1f} строк/с), "
+          f"ошибок {report['errors']}")
+    print(f"  задержка запроса: p50 {report['p50_ms']:.0f} мс, p99 {report['p99_ms']:.0f} мс "
+          f"({report['requests']} запросов)")
+    print(f"  CPU: чтение {cpu['read']:.2f} с, токенизация {cpu['tokenize']:.2f} с, разбор {cpu['parse']:.2f} с, "
+          f"запись {cpu['write']:.2f} с, всего {cpu['total']:.2f} с")
+    print(f"  пиковый RSS: {rss}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк конвейера на локальном fake API")
+    parser.add_argument("--rows", type=int, default=50_000, help="строк в синтетическом входе (0 - только выборка)")
+    parser.add_argument("--data-dir", default=os.path.join(BASE_DIR, "bench_data"), help="каталог входных файлов")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="число одновременных запросов")
+    parser.add_argument("--parse-workers", type=int, default=0,
+                        help="процессов разбора ответов (0 - разбор в основном процессе)")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="средняя задержка fake API, мс")
+    parser.add_argument("--latency-jitter-ms", type=float, default=25.0, help="разброс задержки, мс")
+    parser.add_argument("--latency-dist", default="lognormal", help="распределение задержки fake API")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--json-out", help="сохранить отчёт в JSON (базовая линия для сравнения)")
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # Внутренний режим: прогон одного входа
+    parser.add_argument("--api-base", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        with tempfile.TemporaryDirectory() as work_dir:
+            report = run_scenario(args.run, args.api_base, args.max_in_flight, os.path.join(work_dir, "out"),
+                                  args.parse_workers)
+        print(json.dumps(report))
+        return
+
+    inputs = prepare_inputs(args.data_dir, args.rows)
+    port = free_port()
+    server = start_fake_server(port, ["--latency-ms", str(args.latency_ms),
+                                      "--latency-jitter-ms", str(args.latency_jitter_ms),
+                                      "--latency-dist", args.latency_dist,
+                                      "--rate-limit-rate", str(args.rate_limit_rate),
+                                      "--error-rate", str(args.error_rate)])
+    reports = {}
+    try:
+        for name, path in inputs:
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", path,
+                                        "--api-base", f"http://127.0.0.1:{port}/v1",
+                                        "--max-in-flight", str(args.max_in_flight),
+                                        "--parse-workers", str(args.parse_workers)],
+                                       capture_output=True, text=True, encoding="utf-8")
+            if completed.returncode != 0:
+                print(f"{name}: ошибка прогона\n{completed.stderr}")
+                continue
+            reports[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+            print_report(name, reports[name])
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as report_file:
+            json.dump(reports, report_file, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import re
+
+# Функция для извлечения списка категорий из промпта ("1. Холодильники" ... "30. Окна").
+# Возвращает словарь {номер: название}.
+def load_categories(prompt_text):
+    section = prompt_text
+    if "Список категорий" in prompt_text:
+        section = prompt_text.split("Список категорий", 1)[1]
+    categories = {}
+    for line in section.splitlines():
+        match = re.match(r"^\s*(\d+)\.\s+(.+?)\s*$", line)
+        if match:
+            categories[int(match.group(1))] = match.group(2)
+        elif categories and line.strip():
+            break  # Список закончился
+    return categories
+
+
+# Функция для промпта без раздела категорий: убираются абзац о классификации, список категорий
+# и блок «Категория:» из формата ответа. Используется, когда категория определена локально.
+def strip_category_section(prompt_text):
+    text = re.sub(r"[^\n]*классифицир[^\n]*\n(?:[ \t]*\n)*", "", prompt_text)
+    text = re.sub(r"[^\n]*Список категорий[^\n]*\n(?:[ \t]*\d+\.[^\n]*\n)+(?:[ \t]*\n)*", "", text)
+    return re.sub(r"[ \t]*<h3>\s*Категория:\s*</h3>\s*<p>[^<]*</p>[ \t]*\n?", "", text)
+
+
+# Функция для построения короткого промпта, который просит вернуть только номер категории
+def build_category_prompt(categories):
+    category_lines = "\n".join(f"{number}. {name}" for number, name in sorted(categories.items()))
+    return (
+        "Определи категорию вопроса о ремонте техники по списку ниже.\n"
+        "Ответь только одним числом - номером категории, без пояснений.\n\n"
+        f"Список категорий:\n{category_lines}"
+    )
+
+
+# Функция для разбора ответа классификатора: номер категории строкой или "Не определена"
+def parse_category_reply(reply, categories):
+    match = re.search(r"\d+", reply or "")
+    if match and int(match.group(0)) in categories:
+        return match.group(0)
+    return "Не определена"
+
+
+# Функция для проверки, что категория - число из списка категорий (1..30)
+def is_valid_category(category, categories):
+    category = str(category).strip()
+    if category.endswith(".0"):  # Числа из Excel читаются как float
+        category = category[:-2]
+    return category.isdigit() and int(category) in categories
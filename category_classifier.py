@@ -0,0 +1,412 @@
+# Локальное определение категории вопроса без запроса к API.
+# Два источника: словари ключевых слов и брендов (работают сразу, без обучения) и линейная модель
+# (TF-IDF по основам слов + многоклассовая логистическая регрессия на numpy), обученная на прошлых результатах
+# со столбцом «категория». Классификатор возвращает категорию и уверенность 0..1; при уверенности не ниже порога
+# категория берётся локальной, а модели отправляется промпт без раздела категорий.
+#
+# Обучение и проверка на отложенной выборке:
+#   python category_classifier.py train --results Combined_QnA.xlsx --input "50 000 вопросов.xlsx"
+# Проверка одного вопроса:
+#   python category_classifier.py predict "Холодильник Atlant не морозит"
+import argparse
+import hashlib
+import math
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+from categories import is_valid_category
+
+# Файл обученной модели по умолчанию
+DEFAULT_MODEL_FILE = "category_model.npz"
+
+# Порог уверенности, с которого категория определяется локально
+DEFAULT_CONFIDENCE_THRESHOLD = 0.9
+
+# Ключевые слова категорий: регулярные выражения начала слова (текст в нижнем регистре, ё -> е).
+# Слабые признаки (могут относиться и к другим категориям) - в WEAK_CATEGORY_KEYWORDS.
+CATEGORY_KEYWORDS = {
+    1: [r"холодильн", r"морозил", r"ноу[ -]?фрост", r"no ?frost"],
+    3: [r"телевизор", r"телик", r"тв\b", r"tv\b", r"кинескоп", r"смарт[ -]?тв"],
+    4: [r"компьютер", r"ноутбук", r"ноут\b", r"системн\w* блок", r"пк\b", r"монитор", r"видеокарт",
+        r"материнск\w* плат", r"процессор", r"windows", r"виндовс", r"ssd\b", r"жестк\w* диск", r"клавиатур"],
+    5: [r"кондиционер", r"кондей", r"кондер", r"сплит", r"наружн\w* блок", r"внутренн\w* блок"],
+    6: [r"чайник", r"утюг", r"фен\b", r"блендер", r"мультиварк", r"тостер", r"миксер", r"мясорубк",
+        r"хлебопечк", r"соковыжимал", r"электробритв", r"бритв", r"эпилятор", r"увлажнител", r"аэрогрил"],
+    7: [r"плит(?:а|ы|е|у|ой)\b", r"электроплит", r"варочн", r"духовк", r"духов(?:ой|ого|ом) шкаф", r"конфорк",
+        r"стеклокерамик"],
+    8: [r"холодильн\w* (?:оборудован|установк|витрин)", r"витрин", r"льдогенератор", r"чиллер",
+        r"компрессорно-конденсаторн", r"промышленн\w* холод"],
+    9: [r"пылесос", r"робот[ -]пылесос"],
+    10: [r"микроволнов", r"микроволк", r"свч\b", r"магнетрон"],
+    11: [r"стиральн", r"стиралк", r"стирк", r"отжим"],
+    13: [r"ремонт\w* квартир", r"плитк", r"обо(?:и|ев)\b", r"штукатур", r"шпакл[её]?в", r"ламинат", r"стяжк",
+         r"гипсокартон"],
+    14: [r"смесител", r"унитаз", r"бач[оке]", r"сифон", r"канализац", r"засор", r"раковин", r"душев", r"полотенцесуш",
+         r"водонагревател", r"бойлер"],
+    15: [r"швейн", r"оверлок", r"распошивал"],
+    16: [r"кофемашин", r"кофеварк", r"капучинатор", r"кофе\b", r"эспрессо"],
+    17: [r"уборк"],
+    18: [r"телефон", r"смартфон", r"планшет", r"айфон", r"iphone", r"андроид", r"android", r"наушник",
+         r"смарт[ -]?час", r"электронн\w* книг"],
+    19: [r"посудомо", r"пмм\b"],
+    20: [r"проводк", r"розетк", r"выключател", r"электрощит", r"щиток", r"узо\b", r"дифавтомат", r"люстр",
+         r"светильник"],
+    21: [r"клининг", r"химчистк"],
+    22: [r"вскры", r"замок", r"замк[аеиу]", r"личинк", r"цилиндров\w* механизм"],
+    23: [r"натяжн\w* потол"],
+    24: [r"вывоз", r"мусор"],
+    25: [r"газов\w* колонк", r"колонк\w* (?:нева|neva)"],
+    26: [r"вытяжк"],
+    27: [r"дезинсекц", r"дезинфекц", r"таракан", r"клоп", r"муравь", r"грызун", r"крыс[аыу]?\b", r"блох"],
+    28: [r"самокат", r"гироскутер", r"моноколес", r"электровелосипед", r"сигвей", r"сегвей"],
+    29: [r"дрел", r"перфоратор", r"шуруповерт", r"шуруповёрт", r"болгарк", r"ушм\b", r"лобзик", r"бензопил",
+         r"электропил", r"триммер", r"газонокосил", r"циркулярн", r"сварочн", r"электроинструмент"],
+    30: [r"окн[аоуе]\b", r"окон\b", r"стеклопакет", r"подоконник", r"москитн", r"оконн"],
+}
+
+WEAK_CATEGORY_KEYWORDS = {
+    2: [r"установ", r"подключ", r"монтаж", r"повесить", r"навес"],
+    6: [r"обогревател", r"весы\b"],
+    14: [r"кран\b", r"труб[аыу]\b", r"ванн"],
+    20: [r"электрик", r"автомат\b"],
+    25: [r"колонк", r"котел", r"котл[аеу]"],
+}
+
+# Бренды, которые выпускают технику только одной категории из списка
+BRAND_CATEGORIES = {
+    1: ["атлант", "atlant", "liebherr", "либхер", "стинол", "stinol", "бирюса", "позис", "pozis"],
+    4: ["acer", "асер", "msi", "dell", "делл", "macbook", "макбук"],
+    5: ["daikin", "дайкин"],
+    6: ["redmond", "редмонд", "scarlett", "скарлетт"],
+    7: ["гефест", "gefest", "дарина", "darina", "лысьва"],
+    9: ["irobot", "roomba", "кирби", "kirby"],
+    15: ["janome", "джаноме", "singer", "зингер", "juki", "джуки", "pfaff", "пфафф", "bernina", "бернина"],
+    16: ["delonghi", "de'longhi", "делонги", "делонджи", "saeco", "саеко", "jura", "nespresso", "неспрессо",
+         "krups", "крупс", "melitta", "мелитта", "dolce gusto"],
+    18: ["ipad", "айпад", "huawei", "хуавей", "honor", "хонор", "redmi", "редми"],
+    25: ["neva", "нева"],
+    28: ["ninebot", "найнбот", "kugoo", "куго", "m365"],
+    29: ["makita", "макита", "dewalt", "девольт", "metabo", "метабо", "hilti", "хилти", "интерскол", "ryobi",
+         "stihl", "штиль"],
+    30: ["rehau", "рехау", "kbe"],
+}
+
+# Вес совпадений в ответах относительно совпадений в вопросе (ответы часто упоминают соседние темы)
+ANSWER_KEYWORD_WEIGHT = 0.25
+
+# Вес слабых ключевых слов и брендов
+WEAK_KEYWORD_WEIGHT = 0.5
+BRAND_WEIGHT = 1.5
+
+# Признаки линейной модели: основа слова - первые STEM_LENGTH букв, плюс пары соседних основ
+STEM_LENGTH = 6
+MAX_FEATURES = 50_000
+MIN_DOCUMENT_FREQUENCY = 2
+
+# Сколько символов ответов учитывается моделью (вопрос - целиком)
+MAX_ANSWER_CHARS = 1500
+
+
+# Функция для приведения текста к виду, в котором записаны словари
+def normalize_text(text):
+    return str(text).lower().replace("ё", "е")
+
+
+def _compile(patterns):
+    return re.compile(r"(?<![a-zа-я0-9])(?:" + "|".join(patterns) + ")")
+
+
+_KEYWORD_RES = {number: _compile(patterns) for number, patterns in CATEGORY_KEYWORDS.items()}
+_WEAK_KEYWORD_RES = {number: _compile(patterns) for number, patterns in WEAK_CATEGORY_KEYWORDS.items()}
+_BRAND_RES = {number: _compile([re.escape(brand) + r"(?![a-zа-я])" for brand in brands])
+              for number, brands in BRAND_CATEGORIES.items()}
+
+
+# Функция для баллов категорий по словарям: {номер категории: балл}.
+# Каждое разное совпадение в вопросе даёт вес словаря, в ответах - вес, умноженный на ANSWER_KEYWORD_WEIGHT.
+def keyword_scores(question, answers=()):
+    scores = Counter()
+    for text, factor in [(question, 1.0)] + [(answer, ANSWER_KEYWORD_WEIGHT) for answer in answers]:
+        text = normalize_text(text)
+        for expressions, weight in ((_KEYWORD_RES, 1.0), (_WEAK_KEYWORD_RES, WEAK_KEYWORD_WEIGHT),
+                                    (_BRAND_RES, BRAND_WEIGHT)):
+            for number, expression in expressions.items():
+                matches = set(expression.findall(text))
+                if matches:
+                    scores[number] += len(matches) * weight * factor
+    return scores
+
+
+# Функция для категории по словарям: (номер, уверенность) или (None, 0.0).
+# Уверенность - доля балла лучшей категории с поправкой на малое число совпадений:
+# одно совпадение без конкурентов даёт 0.8, два - 0.89, три - 0.92.
+def keyword_category(question, answers=()):
+    scores = keyword_scores(question, answers)
+    if not scores:
+        return None, 0.0
+    number, top = scores.most_common(1)[0]
+    return number, top / (sum(scores.values()) + 0.25)
+
+
+# Функция для текста, по которому модель определяет категорию
+def classification_text(question, answers=()):
+    return f"{question} {' '.join(map(str, answers))[:MAX_ANSWER_CHARS]}"
+
+
+# Функция для строк классификатора по id (нумерация с 1): исходные вопрос и ответы из входного файла.
+# Классификатор обучается (load_training_rows с входным файлом) и применяется при обработке на исходных строках,
+# поэтому при исправлении ошибок он получает тот же текст, а не переформулированный вопрос и HTML-ответ.
+# input_rows - строки входного файла по номеру с 0 (open_row_lookup).
+def classifier_rows(input_rows, row_ids):
+    return [tuple(input_rows[int(row_id) - 1]) for row_id in row_ids]
+
+
+# Функция для признаков текста: основы слов и пары соседних основ
+def text_features(text):
+    stems = [word[:STEM_LENGTH] for word in re.findall(r"[a-zа-я][a-zа-я0-9]+", normalize_text(text))]
+    return stems + [f"{first} {second}" for first, second in zip(stems, stems[1:])]
+
+
+# Линейная модель: TF-IDF (сублинейная частота, нормировка L2) + многоклассовая логистическая регрессия,
+# обучаемая мини-пакетным градиентным спуском. Словарь, IDF и веса хранятся в одном .npz.
+class LinearCategoryModel:
+    def __init__(self, vocabulary, idf, weights, bias, classes):
+        self.vocabulary = vocabulary  # признак -> номер столбца
+        self.idf = idf
+        self.weights = weights
+        self.bias = bias
+        self.classes = classes  # номера категорий по столбцам весов
+
+    # Функция для разреженного вектора текста: (номера признаков, веса)
+    def vectorize(self, text):
+        counts = Counter(feature for feature in text_features(text) if feature in self.vocabulary)
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter((self.vocabulary[feature] for feature in counts), dtype=np.int64, count=len(counts))
+        values = np.fromiter((1.0 + math.log(count) for count in counts.values()), dtype=np.float32,
+                             count=len(counts)) * self.idf[indices]
+        return indices, values / np.linalg.norm(values)
+
+    # Функция для оценок классов пачки векторов (до softmax)
+    def _scores(self, vectors):
+        scores = np.tile(self.bias, (len(vectors), 1))
+        if vectors:
+            indices = np.concatenate([indices for indices, _ in vectors])
+            values = np.concatenate([values for _, values in vectors])
+            rows = np.repeat(np.arange(len(vectors)), [len(indices) for indices, _ in vectors])
+            np.add.at(scores, rows, values[:, None] * self.weights[indices])
+        return scores
+
+    # Функция для вероятностей категорий: массив (число текстов, число категорий)
+    def predict_proba(self, texts):
+        return _softmax(self._scores([self.vectorize(text) for text in texts]))
+
+    # Функция для категории и вероятности по каждому тексту: [(номер, вероятность)]
+    def predict(self, texts):
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [(int(self.classes[column]), float(probabilities[row, column])) for row, column in enumerate(best)]
+
+    # Обучение на списке текстов и номеров категорий
+    @classmethod
+    def train(cls, texts, labels, epochs=8, batch_size=256, learning_rate=0.5, l2=1e-5, seed=0):
+        document_frequency = Counter()
+        for text in texts:
+            document_frequency.update(set(text_features(text)))
+        features = [feature for feature, frequency in document_frequency.most_common(MAX_FEATURES)
+                    if frequency >= MIN_DOCUMENT_FREQUENCY]
+        vocabulary = {feature: column for column, feature in enumerate(features)}
+        idf = np.array([math.log((1 + len(texts)) / (1 + document_frequency[feature])) + 1.0 for feature in features],
+                       dtype=np.float32)
+        classes = np.array(sorted(set(labels)), dtype=np.int64)
+        model = cls(vocabulary, idf, np.zeros((len(features), len(classes)), dtype=np.float32),
+                    np.zeros(len(classes), dtype=np.float32), classes)
+        vectors = [model.vectorize(text) for text in texts]
+        targets = np.searchsorted(classes, np.array(labels, dtype=np.int64))
+        random = np.random.default_rng(seed)
+        for epoch in range(epochs):
+            step = learning_rate / (1 + epoch)
+            order = random.permutation(len(vectors))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                batch_vectors = [vectors[position] for position in batch]
+                gradient = _softmax(model._scores(batch_vectors))
+                gradient[np.arange(len(batch)), targets[batch]] -= 1.0
+                indices = np.concatenate([indices for indices, _ in batch_vectors])
+                values = np.concatenate([values for _, values in batch_vectors])
+                rows = np.repeat(np.arange(len(batch)), [len(indices) for indices, _ in batch_vectors])
+                np.add.at(model.weights, indices, -step * (values[:, None] * gradient[rows]
+                                                           + l2 * model.weights[indices]))
+                model.bias -= step * gradient.mean(axis=0)
+        return model
+
+    def save(self, path):
+        features = np.array(sorted(self.vocabulary, key=self.vocabulary.get), dtype=str)
+        np.savez_compressed(path, features=features, idf=self.idf, weights=self.weights, bias=self.bias,
+                            classes=self.classes)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            vocabulary = {feature: column for column, feature in enumerate(data["features"].tolist())}
+            return cls(vocabulary, data["idf"], data["weights"], data["bias"], data["classes"])
+
+
+def _softmax(scores):
+    scores = scores - scores.max(axis=1, keepdims=True)
+    exponents = np.exp(scores)
+    return exponents / exponents.sum(axis=1, keepdims=True)
+
+
+# Классификатор категорий: словари + линейная модель (если файл модели есть).
+# Если словари и модель согласны, уверенность выше каждой из них (1 - (1 - p1) * (1 - p2));
+# если расходятся - выбирается более уверенный источник, а его уверенность снижается на уверенность другого.
+class CategoryClassifier:
+    def __init__(self, categories, model=None, threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+        self.categories = categories
+        self.model = model
+        self.threshold = threshold
+
+    # Функция для загрузки классификатора; без файла модели работают только словари
+    @classmethod
+    def load(cls, categories, model_path=DEFAULT_MODEL_FILE, threshold=DEFAULT_CONFIDENCE_THRESHOLD):
+        model = LinearCategoryModel.load(model_path) if model_path and os.path.exists(model_path) else None
+        return cls(categories, model, threshold)
+
+    # Отпечаток классификатора для манифеста: порог и содержимое файла модели
+    def fingerprint(self, model_path=DEFAULT_MODEL_FILE):
+        digest = "словари"
+        if self.model is not None:
+            with open(model_path, "rb") as model_file:
+                digest = hashlib.sha256(model_file.read()).hexdigest()[:12]
+        return f"локальная категория от {self.threshold} ({digest})"
+
+    # Функция для категорий списка вопросов: [(номер или None, уверенность)] - rows = [(вопрос, ответы)]
+    def classify_rows(self, rows):
+        rows = list(rows)
+        keyword_results = [keyword_category(question, answers) for question, answers in rows]
+        if self.model is None:
+            model_results = [(None, 0.0)] * len(rows)
+        else:
+            model_results = self.model.predict([classification_text(question, answers) for question, answers in rows])
+        results = []
+        for (keyword_number, keyword_confidence), (model_number, model_confidence) in zip(keyword_results,
+                                                                                         model_results):
+            if keyword_number == model_number:
+                number, confidence = keyword_number, 1 - (1 - keyword_confidence) * (1 - model_confidence)
+            elif keyword_confidence >= model_confidence:
+                number, confidence = keyword_number, keyword_confidence * (1 - model_confidence)
+            else:
+                number, confidence = model_number, model_confidence * (1 - keyword_confidence)
+            if number is None or number not in self.categories:
+                number, confidence = None, 0.0
+            results.append((number, confidence))
+        return results
+
+    # Функция для категории одного вопроса
+    def classify(self, question, answers=()):
+        return self.classify_rows([(question, answers)])[0]
+
+    # Функция для категорий, в которых классификатор уверен: [номер или None]
+    def confident_categories(self, rows):
+        return [number if number is not None and confidence >= self.threshold else None
+                for number, confidence in self.classify_rows(rows)]
+
+
+# Функция для строк обучения из прошлых результатов (xlsx/csv/jsonl/parquet со столбцами id и «категория»).
+# Если передан исходный входной файл, текстом служат исходные вопрос и ответы (как при обработке),
+# иначе - переформулированный вопрос и текст ответа из результатов.
+# Возвращает [(вопрос, ответы, номер категории)] - только строки с категорией из списка.
+def load_training_rows(results_path, categories, input_path=None):
+    import pandas as pd
+
+    extension = os.path.splitext(results_path)[1].lower()
+    if extension == ".xlsx":
+        results = pd.read_excel(results_path)
+    elif extension == ".csv":
+        results = pd.read_csv(results_path)
+    elif extension == ".jsonl":
+        results = pd.read_json(results_path, lines=True)
+    elif extension == ".parquet":
+        results = pd.read_parquet(results_path)
+    else:
+        raise ValueError(f"Неподдерживаемый формат результатов: {results_path}")
+    inputs = None
+    if input_path:
+        from input_readers import open_input_rows
+        inputs = list(open_input_rows(input_path))
+    rows = []
+    for row_id, question, answer, category in results[["id", "переформулированный вопрос", "ответ",
+                                                       "категория"]].itertuples(index=False):
+        if not is_valid_category(category, categories):
+            continue
+        number = int(float(category))
+        if inputs is not None:
+            if not 1 <= int(row_id) <= len(inputs):
+                continue
+            rows.append((*inputs[int(row_id) - 1], number))
+        else:
+            rows.append((str(question), [re.sub(r"<[^>]*>", " ", str(answer))], number))
+    return rows
+
+
+# Функция для отчёта о точности на отложенной выборке: доля верных категорий и покрытие при разных порогах
+def evaluate(classifier, rows, thresholds=(0.5, 0.7, 0.8, 0.9, 0.95)):
+    predictions = classifier.classify_rows([(question, answers) for question, answers, _ in rows])
+    lines = [f"Отложенная выборка: {len(rows)} вопросов"]
+    for threshold in thresholds:
+        chosen = [(number, label) for (number, confidence), (_, _, label) in zip(predictions, rows)
+                  if number is not None and confidence >= threshold]
+        correct = sum(number == label for number, label in chosen)
+        accuracy = correct / len(chosen) * 100 if chosen else 0.0
+        lines.append(f"  порог {threshold:.2f}: определено локально {len(chosen)} "
+                     f"({len(chosen) / max(1, len(rows)) * 100:.1f}%), верно {accuracy:.1f}%")
+    return "\n".join(lines)
+
+
+def main():
+    from categories import load_categories
+
+    parser = argparse.ArgumentParser(description="Локальный классификатор категорий вопросов")
+    parser.add_argument("--prompt", default="Промпт_with_category.txt", help="промпт со списком категорий")
+    parser.add_argument("--model", default=DEFAULT_MODEL_FILE, help="файл модели (.npz)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    train_parser = commands.add_parser("train", help="обучить модель на прошлых результатах")
+    train_parser.add_argument("--results", required=True, help="прошлые результаты со столбцом «категория»")
+    train_parser.add_argument("--input", help="исходный входной файл тех же результатов (тексты по id)")
+    train_parser.add_argument("--holdout", type=float, default=0.1, help="доля строк для проверки")
+    train_parser.add_argument("--epochs", type=int, default=8, help="число проходов обучения")
+    predict_parser = commands.add_parser("predict", help="определить категорию вопроса")
+    predict_parser.add_argument("question")
+    args = parser.parse_args()
+
+    with open(args.prompt, "r", encoding="windows-1251") as prompt_file:
+        categories = load_categories(prompt_file.read())
+
+    if args.command == "predict":
+        classifier = CategoryClassifier.load(categories, args.model)
+        number, confidence = classifier.classify(args.question)
+        name = categories.get(number, "Не определена")
+        print(f"{number} ({name}), уверенность {confidence:.2f}"
+              f"{'' if classifier.model is not None else ' - только словари, модель не обучена'}")
+        return
+
+    rows = load_training_rows(args.results, categories, args.input)
+    order = np.random.default_rng(0).permutation(len(rows))
+    holdout_size = int(len(rows) * args.holdout)
+    holdout = [rows[position] for position in order[:holdout_size]]
+    training = [rows[position] for position in order[holdout_size:]]
+    print(f"Строк с категорией: {len(rows)}, обучение {len(training)}, проверка {len(holdout)}")
+    print(evaluate(CategoryClassifier(categories), holdout).replace("Отложенная", "Только словари. Отложенная"))
+    model = LinearCategoryModel.train([classification_text(question, answers) for question, answers, _ in training],
+                                      [label for _, _, label in training], epochs=args.epochs)
+    print(evaluate(CategoryClassifier(categories, model), holdout))
+    model.save(args.model)
+    print(f"Модель сохранена в {args.model} ({len(model.vocabulary)} признаков)")
+
+
+if __name__ == "__main__":
+    main()
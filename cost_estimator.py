@@ -0,0 +1,121 @@
+import os
+import time
+
+from input_compaction import compact_rows
+from input_readers import open_input_rows
+from micro_batching import DEFAULT_BATCH_TOKEN_BUDGET, build_batch_prompt, question_header, pack_batches
+from model_routing import choose_model, model_cost
+from token_accounting import count_tokens, count_tokens_batch
+
+# Размер пачки строк, которые токенизируются параллельно
+ESTIMATE_CHUNK_SIZE = 5000
+
+
+# Функция для перцентиля по отсортированному списку
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+# Функция для предварительной оценки токенов и стоимости по входному файлу без обращения к API.
+# Файл читается потоково, тексты токенизируются пачками в несколько потоков (tiktoken отпускает GIL).
+# output_tokens_range - предположения о длине ответа (мин., макс.) для диапазона стоимости.
+# При batch_size > 1 дополнительно считается расход входных токенов при пакетной отправке вопросов.
+# routes - маршруты (максимум входных токенов, модель): каждый вопрос дополнительно оценивается по ценам модели
+# своего маршрута (MODEL_PRICES), как при обработке. input_budget - бюджет токенов строки для сжатия входа:
+# строки сжимаются одним вызовом compact_rows на пачку, а не по одной.
+def estimate_cost(input_path, prompt_template, model, build_input_text,
+                  input_cost_per_m, output_cost_per_m, output_tokens_range=(400, 1500),
+                  batch_size=1, batch_tokens=DEFAULT_BATCH_TOKEN_BUDGET, routes=(), input_budget=None):
+    started = time.perf_counter()
+    prompt_tokens = count_tokens(prompt_template, model)
+    num_threads = os.cpu_count() or 1
+    text_tokens = []
+    chunk = []
+
+    def flush():
+        rows = compact_rows(chunk, input_budget, model)[0] if input_budget else chunk
+        texts = [build_input_text(question, answers) for question, answers in rows]
+        text_tokens.extend(count_tokens_batch(texts, model, num_threads=num_threads))
+        chunk.clear()
+
+    for question, answers in open_input_rows(input_path):
+        chunk.append((question, answers))
+        if len(chunk) >= ESTIMATE_CHUNK_SIZE:
+            flush()
+    if chunk:
+        flush()
+
+    request_tokens = sorted(prompt_tokens + tokens for tokens in text_tokens)
+    total_input = sum(request_tokens)
+    rows = len(request_tokens)
+    low_output, high_output = output_tokens_range
+    input_cost = total_input * input_cost_per_m / 1_000_000
+    report = {
+        "rows": rows,
+        "prompt_tokens": prompt_tokens,
+        "total_input_tokens": total_input,
+        "p50_input_tokens": percentile(request_tokens, 0.50),
+        "p95_input_tokens": percentile(request_tokens, 0.95),
+        "max_input_tokens": request_tokens[-1] if request_tokens else 0,
+        "cost_low": input_cost + rows * low_output * output_cost_per_m / 1_000_000,
+        "cost_high": input_cost + rows * high_output * output_cost_per_m / 1_000_000,
+        "input_cost": input_cost,
+        "output_tokens_range": output_tokens_range,
+    }
+    if routes:
+        # Вопрос идёт в модель маршрута по своим входным токенам (без промпта), как в choose_model при обработке
+        route_rows = {}
+        routed_low = routed_high = 0.0
+        for tokens in text_tokens:
+            route = choose_model(tokens, routes, model)
+            route_rows[route] = route_rows.get(route, 0) + 1
+            routed_low += model_cost(route, prompt_tokens + tokens, low_output)
+            routed_high += model_cost(route, prompt_tokens + tokens, high_output)
+        report.update({
+            "model": model,
+            "route_rows": route_rows,
+            "routed_cost_low": routed_low,
+            "routed_cost_high": routed_high,
+        })
+    if batch_size > 1:
+        # Пакет: системный промпт с инструкцией пакетного режима + вопросы с заголовками id
+        batch_prompt_tokens = count_tokens(build_batch_prompt(prompt_template), model)
+        header_tokens = count_tokens(question_header(rows) + "\n\n", model)
+        batches = pack_batches(text_tokens, lambda tokens: tokens, batch_size, batch_tokens,
+                               output_tokens_per_item=high_output)
+        batched_input = sum(batch_prompt_tokens + sum(tokens + header_tokens for tokens in batch) for batch in batches)
+        report.update({
+            "batch_requests": len(batches),
+            "batched_input_tokens": batched_input,
+            "batched_input_cost": batched_input * input_cost_per_m / 1_000_000,
+        })
+    report["seconds"] = time.perf_counter() - started
+    return report
+
+
+# Функция для вывода отчёта оценки
+def print_estimate(report):
+    low_output, high_output = report["output_tokens_range"]
+    print(f"Строк: {report['rows']}")
+    print(f"Системный промпт: {report['prompt_tokens']} токенов на запрос")
+    print(f"Входящие токены всего: {report['total_input_tokens']}")
+    print(f"Входящие токены на запрос: p50 {report['p50_input_tokens']}, "
+          f"p95 {report['p95_input_tokens']}, max {report['max_input_tokens']}")
+    print(f"Стоимость входящих токенов: ${report['input_cost']:.2f}")
+    print(f"Прогноз стоимости (ответ {low_output}-{high_output} токенов): "
+          f"${report['cost_low']:.2f} - ${report['cost_high']:.2f}")
+    if "route_rows" in report:
+        models = ", ".join(f"{route} {rows}" for route, rows in sorted(report["route_rows"].items()))
+        print(f"С маршрутизацией (вопросов: {models}): ${report['routed_cost_low']:.2f} - "
+              f"${report['routed_cost_high']:.2f}, без маршрутизации (все в {report['model']}): "
+              f"${report['cost_low']:.2f} - ${report['cost_high']:.2f}")
+    if "batch_requests" in report:
+        saved = report["total_input_tokens"] - report["batched_input_tokens"]
+        print(f"Пакетный режим: {report['batch_requests']} запросов вместо {report['rows']}, "
+              f"входящие токены {report['batched_input_tokens']} "
+              f"(экономия {saved} токенов, {saved / max(1, report['total_input_tokens']) * 100:.1f}%, "
+              f"${saved * report['input_cost'] / max(1, report['total_input_tokens']):.2f})")
+    print(f"Оценка выполнена за {report['seconds']:.1f} с")
@@ -0,0 +1,404 @@
+# Локальная замена API OpenAI для проверки без сети: chat/completions, файлы и Batch API.
+# Запуск: python fake_openai_server.py [--port 8765] [--latency-ms 300 --latency-dist lognormal]
+#         [--rate-limit-rate 0.01] [--error-rate 0.005] [--batch-delay 2] [--fail-rate 0.0]
+#         [--off-format-rate 0.05] [--ramble-rate 0.1] [--token-delay-ms 2] [--missing-block-rate 0.05]
+# При "stream": true ответ chat/completions отдаётся потоком (server-sent events), как у настоящего API.
+# Клиент: python qna_processor_50k.py --api-base http://127.0.0.1:8765/v1 [--batch-api]
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Шаблон ответа модели (формат из Промпт_with_category.txt)
+RESPONSE_TEMPLATE = """<div>
+  <h2>Вопрос:</h2>
+  <p>{question}</p>
+  <h2>Ответ:</h2>
+  <div>
+    <h3>Что сделать в первую очередь:</h3>
+    <p>Отключите технику от сети и проверьте питание.</p>
+  </div>
+  <div>
+    <h3>Диагностика:</h3>
+    <ol>
+      <li>Проверьте предохранитель.</li>
+      <li>Осмотрите разъёмы платы.</li>
+    </ol>
+  </div>
+  <div>
+    <h3>Возможное решение:</h3>
+    <p>Замените неисправный элемент.</p>
+  </div>
+  <div>
+    <h3>Когда обращаться к мастеру:</h3>
+    <p>Если неисправность не устраняется самостоятельно.</p>
+  </div>
+  <h3>Категория:</h3>
+  <p>{category}</p>
+</div>"""
+
+
+# Ответ не по шаблону (простой текст вместо HTML) - для проверки прерывания потока и повторов
+OFF_FORMAT_TEMPLATE = """Конечно! Вот переформулированный вопрос и подробный ответ.
+
+Вопрос: {question}
+
+Ответ: прежде всего отключите технику от сети и проверьте питание. """ + "Затем проверьте предохранитель и разъёмы. " * 40
+
+# Лишний текст, который модель дописывает после блока категории
+RAMBLE_TAIL = "\n<p>Дополнительные пояснения к ответу и общие рекомендации по эксплуатации.</p>" * 30
+
+# Сколько символов ответа передаётся в одном фрагменте потока (примерно 3-4 токена)
+STREAM_CHUNK_CHARS = 12
+
+
+# Функция для приблизительного подсчёта токенов (без tiktoken, чтобы сервер не зависел от загрузки кодировок)
+def approximate_tokens(text):
+    return max(1, len(text) // 3)
+
+
+# Заголовок вопроса в пакетном запросе (micro_batching.question_header)
+BATCH_QUESTION_RE = re.compile(r"^=== ВОПРОС id=(\d+) ===$", re.MULTILINE)
+
+
+# Функция для ответа на один вопрос: вопрос - начало текста запроса, категория - по хэшу текста
+def fake_answer(input_text, shape="ok"):
+    question = re.sub(r"\s+", " ", input_text.split("\n", 1)[-1].split("#", 1)[0]).strip()[:200]
+    category = int(hashlib.sha256(input_text.encode("utf-8")).hexdigest(), 16) % 30 + 1
+    if shape == "off_format":
+        return OFF_FORMAT_TEMPLATE.format(question=question)
+    content = RESPONSE_TEMPLATE.format(question=question.replace("<", "&lt;"), category=category)
+    if shape == "ramble":
+        content = content[:-len("</div>")] + RAMBLE_TAIL + "\n</div>"
+    return content
+
+
+# Функция для детерминированного ответа на запрос chat/completions. shape - "ok", "off_format" (текст не по
+# шаблону) или "ramble" (лишний текст после блока категории).
+# Пакетный запрос (вопросы с заголовками «=== ВОПРОС id=N ===») получает блок <!-- QNA id=N --> на вопрос;
+# если skip_block() вернул True, блок вопроса в ответ не попадает (модель пропустила вопрос).
+def fake_completion(body, shape="ok", skip_block=None):
+    messages = body.get("messages", [])
+    user_text = messages[-1]["content"] if messages else ""
+    parts = BATCH_QUESTION_RE.split(user_text)
+    if len(parts) > 1 and shape != "off_format":
+        blocks = [f"<!-- QNA id={row_id} -->\n{fake_answer(text.strip(), shape)}\n<!-- /QNA -->"
+                  for row_id, text in zip(parts[1::2], parts[2::2]) if not (skip_block and skip_block())]
+        content = "\n".join(blocks)
+    else:
+        content = fake_answer(user_text, shape)
+    prompt_tokens = sum(approximate_tokens(message["content"]) for message in messages)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": approximate_tokens(content),
+                  "total_tokens": prompt_tokens + approximate_tokens(content)},
+    }
+
+
+# Распределения задержки ответа chat/completions
+LATENCY_DISTRIBUTIONS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+# Состояние сервера: настройки задержек и ошибок, загруженные файлы и пакетные задания.
+# latency_ms - средняя задержка ответа, latency_jitter_ms - разброс (для uniform - половина ширины,
+# для lognormal - стандартное отклонение). rate_limit_rate / error_rate - доли ответов 429 и 500.
+# off_format_rate / ramble_rate - доли ответов не по шаблону и с лишним текстом после категории,
+# token_delay_ms - пауза между фрагментами потокового ответа.
+# missing_block_rate - доля вопросов пакетного запроса, блок которых отсутствует в ответе.
+class FakeOpenAIState:
+    def __init__(self, batch_delay=2.0, fail_rate=0.0, seed=0, latency_ms=0.0, latency_jitter_ms=0.0,
+                 latency_dist="fixed", rate_limit_rate=0.0, error_rate=0.0, retry_after=1.0,
+                 off_format_rate=0.0, ramble_rate=0.0, token_delay_ms=0.0, missing_block_rate=0.0):
+        if latency_dist not in LATENCY_DISTRIBUTIONS:
+            raise ValueError(f"Неизвестное распределение задержки: {latency_dist}")
+        self.files = {}
+        self.batches = {}
+        self.batch_delay = batch_delay
+        self.fail_rate = fail_rate
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_dist = latency_dist
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.off_format_rate = off_format_rate
+        self.ramble_rate = ramble_rate
+        self.token_delay_ms = token_delay_ms
+        self.missing_block_rate = missing_block_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {"requests": 0, "rate_limited": 0, "errors": 0, "streams": 0, "streams_closed_early": 0,
+                         "missing_blocks": 0}
+
+    # Функция для случайной задержки ответа в секундах
+    def sample_latency(self):
+        mean, jitter = self.latency_ms, self.latency_jitter_ms
+        with self.lock:
+            if self.latency_dist == "uniform":
+                value = self.random.uniform(mean - jitter, mean + jitter)
+            elif self.latency_dist == "exponential":
+                value = self.random.expovariate(1 / mean) if mean > 0 else 0.0
+            elif self.latency_dist == "lognormal" and mean > 0:
+                # Параметры логнормального распределения по среднему и стандартному отклонению
+                sigma = math.sqrt(math.log(1 + (jitter / mean) ** 2))
+                value = self.random.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)
+            else:
+                value = mean
+        return max(0.0, value) / 1000
+
+    # Функция для выбора исхода запроса chat/completions: "ok", "rate_limited" или "error"
+    def sample_outcome(self):
+        with self.lock:
+            self.counters["requests"] += 1
+            draw = self.random.random()
+            if draw < self.rate_limit_rate:
+                self.counters["rate_limited"] += 1
+                return "rate_limited"
+            if draw < self.rate_limit_rate + self.error_rate:
+                self.counters["errors"] += 1
+                return "error"
+        return "ok"
+
+    # Функция для выбора вида ответа: "ok", "off_format" или "ramble"
+    def sample_shape(self):
+        with self.lock:
+            draw = self.random.random()
+        if draw < self.off_format_rate:
+            return "off_format"
+        if draw < self.off_format_rate + self.ramble_rate:
+            return "ramble"
+        return "ok"
+
+    # Функция для решения, пропустить ли блок вопроса в ответе на пакетный запрос
+    def sample_missing_block(self):
+        with self.lock:
+            missing = self.random.random() < self.missing_block_rate
+            if missing:
+                self.counters["missing_blocks"] += 1
+        return missing
+
+    def add_file(self, content, purpose):
+        file_id = f"file-{uuid.uuid4().hex[:24]}"
+        with self.lock:
+            self.files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "purpose": purpose,
+                "created_at": int(time.time())}
+
+    def create_batch(self, input_file_id, endpoint):
+        batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+        batch = {"id": batch_id, "object": "batch", "endpoint": endpoint, "input_file_id": input_file_id,
+                 "status": "validating", "output_file_id": None, "error_file_id": None,
+                 "created_at": int(time.time()), "request_counts": {"total": 0, "completed": 0, "failed": 0}}
+        with self.lock:
+            self.batches[batch_id] = batch
+        threading.Thread(target=self._run_batch, args=(batch_id,), daemon=True).start()
+        return dict(batch)
+
+    # Выполнение задания в фоне: через batch_delay секунд появляются файлы результатов и ошибок
+    def _run_batch(self, batch_id):
+        with self.lock:
+            batch = self.batches[batch_id]
+            input_content = self.files.get(batch["input_file_id"])
+        if input_content is None:
+            with self.lock:
+                batch["status"] = "failed"
+            return
+        lines = [json.loads(line) for line in input_content.decode("utf-8").splitlines() if line.strip()]
+        with self.lock:
+            batch["status"] = "in_progress"
+            batch["request_counts"]["total"] = len(lines)
+        time.sleep(self.batch_delay)
+
+        outputs, errors = [], []
+        for request in lines:
+            record = {"id": f"batch_req_{uuid.uuid4().hex[:12]}", "custom_id": request["custom_id"]}
+            with self.lock:
+                failed = self.random.random() < self.fail_rate
+            if failed:
+                record.update(response={"status_code": 500, "body": {"error": {"message": "fake server error"}}},
+                              error=None)
+                errors.append(record)
+            else:
+                # Вид ответа выбирается так же, как для обычных запросов (off_format_rate / ramble_rate)
+                body = fake_completion(request["body"], self.sample_shape())
+                record.update(response={"status_code": 200, "body": body}, error=None)
+                outputs.append(record)
+        output_file = self.add_file("".join(json.dumps(record, ensure_ascii=False) + "\n"
+                                            for record in outputs).encode("utf-8"), "batch_output")
+        error_file = self.add_file("".join(json.dumps(record, ensure_ascii=False) + "\n"
+                                           for record in errors).encode("utf-8"), "batch_output") if errors else None
+        with self.lock:
+            batch.update(status="completed", output_file_id=output_file["id"],
+                         error_file_id=error_file["id"] if error_file else None, completed_at=int(time.time()))
+            batch["request_counts"].update(completed=len(outputs), failed=len(errors))
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего API
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.path == "/v1/files":
+            # multipart/form-data: поля purpose и file
+            message = BytesParser(policy=default_policy).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body)
+            fields = {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                      for part in message.iter_parts()}
+            if "file" not in fields:
+                return self._send_json({"error": {"message": "file is required"}}, 400)
+            purpose = (fields.get("purpose") or b"batch").decode("utf-8")
+            return self._send_json(self.state.add_file(fields["file"], purpose))
+        if self.path == "/v1/batches":
+            payload = json.loads(body or b"{}")
+            if payload.get("input_file_id") not in self.state.files:
+                return self._send_json({"error": {"message": "input file not found"}}, 404)
+            return self._send_json(self.state.create_batch(payload["input_file_id"], payload.get("endpoint")))
+        if self.path == "/v1/chat/completions":
+            return self._chat_completion(json.loads(body or b"{}"))
+        self._send_json({"error": {"message": f"unknown path {self.path}"}}, 404)
+
+    def _chat_completion(self, payload):
+        outcome = self.state.sample_outcome()
+        if outcome == "rate_limited":
+            return self._send_json({"error": {"message": "Rate limit reached (fake server)", "type": "requests",
+                                              "code": "rate_limit_exceeded"}}, 429,
+                                   {"retry-after": str(self.state.retry_after)})
+        time.sleep(self.state.sample_latency())
+        if outcome == "error":
+            return self._send_json({"error": {"message": "The server had an error (fake server)",
+                                              "type": "server_error"}}, 500)
+        completion = fake_completion(payload, self.state.sample_shape(), skip_block=self.state.sample_missing_block)
+        if payload.get("stream"):
+            return self._stream_completion(payload, completion)
+        self._send_json(completion)
+
+    # Потоковый ответ: фрагменты по STREAM_CHUNK_CHARS символов, в конце usage (если запрошен) и [DONE].
+    # Соединение закрывается после ответа; если клиент закрыл его раньше, генерация прекращается.
+    def _stream_completion(self, payload, completion):
+        with self.state.lock:
+            self.state.counters["streams"] += 1
+        content = completion["choices"][0]["message"]["content"]
+        base = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"],
+                "model": completion["model"]}
+        events = [{**base, "choices": [{"index": 0, "delta": {"role": "assistant", "content": ""},
+                                        "finish_reason": None}]}]
+        for start in range(0, len(content), STREAM_CHUNK_CHARS):
+            delta = {"content": content[start:start + STREAM_CHUNK_CHARS]}
+            events.append({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        events.append({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            events.append({**base, "choices": [], "usage": completion["usage"]})
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for event in events:
+                self.wfile.write(b"data: " + json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                self.wfile.flush()
+                if self.state.token_delay_ms:
+                    time.sleep(self.state.token_delay_ms / 1000)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            with self.state.lock:
+                self.state.counters["streams_closed_early"] += 1
+
+    def do_GET(self):
+        match = re.fullmatch(r"/v1/batches/([\w-]+)", self.path)
+        if match:
+            with self.state.lock:
+                batch = self.state.batches.get(match.group(1))
+                batch = json.loads(json.dumps(batch)) if batch else None
+            return self._send_json(batch) if batch else self._send_json({"error": {"message": "not found"}}, 404)
+        match = re.fullmatch(r"/v1/files/([\w-]+)/content", self.path)
+        if match and match.group(1) in self.state.files:
+            content = self.state.files[match.group(1)]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        if self.path == "/v1/stats":
+            with self.state.lock:
+                return self._send_json(dict(self.state.counters))
+        self._send_json({"error": {"message": f"unknown path {self.path}"}}, 404)
+
+
+# Функция для запуска сервера; возвращает объект сервера (serve_forever вызывается отдельно или в потоке).
+# state_options - параметры FakeOpenAIState (задержки, доли ошибок).
+def make_server(host="127.0.0.1", port=8765, **state_options):
+    handler = type("Handler", (FakeOpenAIHandler,), {"state": FakeOpenAIState(**state_options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена API OpenAI (файлы, Batch API, chat/completions)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-delay", type=float, default=2.0, help="через сколько секунд задание завершается")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="доля запросов пакета, завершающихся ошибкой")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="средняя задержка ответа chat/completions, мс")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0, help="разброс задержки, мс")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTRIBUTIONS, default="fixed",
+                        help="распределение задержки")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="доля ответов 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="доля ответов 500")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="значение заголовка retry-after для 429, с")
+    parser.add_argument("--off-format-rate", type=float, default=0.0, help="доля ответов не по шаблону")
+    parser.add_argument("--ramble-rate", type=float, default=0.0, help="доля ответов с лишним текстом после категории")
+    parser.add_argument("--missing-block-rate", type=float, default=0.0,
+                        help="доля вопросов пакетного запроса, блок которых пропущен в ответе")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="пауза между фрагментами потока, мс")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, batch_delay=args.batch_delay, fail_rate=args.fail_rate,
+                         seed=args.seed, latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+                         latency_dist=args.latency_dist, rate_limit_rate=args.rate_limit_rate,
+                         error_rate=args.error_rate, retry_after=args.retry_after,
+                         off_format_rate=args.off_format_rate, ramble_rate=args.ramble_rate,
+                         token_delay_ms=args.token_delay_ms, missing_block_rate=args.missing_block_rate)
+    print(f"Fake OpenAI API: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,15 @@
+import asyncio
 import openai
 import pandas as pd
-import tiktoken
-from bs4 import BeautifulSoup
-import re
+import token_accounting
 from tqdm import tqdm
+from html_response_parser import parse_html_response, extract_category_from_html
+from qna_async import run_in_order, request_cached_model_response
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache
+from input_readers import open_row_lookup
+from categories import load_categories
+from category_classifier import CategoryClassifier, classifier_rows, DEFAULT_MODEL_FILE, DEFAULT_CONFIDENCE_THRESHOLD
 
 # API-ключ OpenAI
 openai.api_key = "api-key"
@@ -15,79 +21,71 @@ model_name = "gpt-4o"
 prompt_file_name = "Промпт_with_category.txt"  # Файл с промптом для обработки вопроса
 input_file_name = "50 000 вопросов.xlsx"  # Файл с входными данными
 processed_file_name = "Combined_QnA.xlsx"  # Итоговый файл
+cache_file_name = "responses_cache.sqlite"  # Локальный кэш ответов модели
 
-# Функция для подсчёта токенов
+# Локальный классификатор категорий (category_classifier.py): строки с готовым ответом, категорию которых
+# он определяет с уверенностью не ниже порога, исправляются без запроса к API
+classifier_model_file_name = DEFAULT_MODEL_FILE
+classifier_threshold = DEFAULT_CONFIDENCE_THRESHOLD
+
+# Ответы, по которым видно, что строка не обработана - для таких строк нужна повторная генерация
+failed_answers = ["Ошибка", "Ошибка при разборе ответа", "Заголовок 'Ответ:' не найден", ""]
+
+# Число одновременных запросов к OpenAI
+max_in_flight = 16
+
+# Лимиты аккаунта OpenAI для клиентского ограничителя скорости
+requests_per_minute = 500
+tokens_per_minute = 300_000
+max_output_tokens = 1500  # Резерв токенов ответа (max_tokens)
+
+# Функция для подсчёта токенов (кодировщик создаётся один раз)
 def count_tokens(text, model=model_name):
-    encoder = tiktoken.encoding_for_model(model)
-    return len(encoder.encode(text))
-
-# Функция для извлечения ID категории из HTML-ответа
-def extract_category_from_html(html_response):
-    try:
-        soup = BeautifulSoup(html_response, "html.parser")
-        category_p = soup.find("h3", string="Категория:").find_next("p")
-        if category_p:
-            category_text = category_p.get_text(strip=True)
-            category_match = re.match(r"^(\d+)$", category_text)
-            return category_match.group(1) if category_match else "Не определена"
-        return "Не определена"
-    except Exception:
-        return "Ошибка"
-
-def parse_html_response(html_response):
-    try:
-        soup = BeautifulSoup(html_response, "html.parser")
-        question_h2 = soup.find("h2", string="Вопрос:")
-        question = question_h2.find_next("p").get_text(strip=True) if question_h2 else "Вопрос не найден"
-        answer_h2 = soup.find("h2", string="Ответ:")
-        answer_elements = []
-        if answer_h2:
-            for sibling in answer_h2.find_next_siblings():
-                if sibling.name == "h2":
-                    break
-                answer_elements.append(str(sibling))
-            answer = ''.join(answer_elements)
-        else:
-            answer = "Заголовок 'Ответ:' не найден"
-        answer = re.sub(r"<h3>Категория:</h3>\s*<p>\d+</p>", "", answer, flags=re.DOTALL).strip()
-        category = extract_category_from_html(html_response)
-        return question, answer, category
-    except Exception:
-        return "Ошибка при разборе вопроса", "Ошибка при разборе ответа", "Ошибка"
+    return token_accounting.count_tokens(text, model)
+
+# Функция для проверки, что в ответе есть числовая категория, отличная от 0
+def has_valid_category(html_response):
+    category = extract_category_from_html(html_response)
+    return category.isdigit() and int(category) != 0
 
 # Функция для обработки вопросов через OpenAI
-def process_qna_with_ai(prompt_template, input_data):
-    results = []
-    with tqdm(total=len(input_data), desc="Обработка вопросов", unit="вопрос") as pbar:
-        for idx, row in input_data.iterrows():
-            question_id = idx  # Используем номер строки как ID
-            question = row[0]
-            answers = row[1:].dropna().tolist()
-            input_text = f"Спаршенный вопрос с ответами (ID {question_id}):\n{question}#{'#'.join(map(str, answers))}"
-            try:
-                response = openai.ChatCompletion.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": prompt_template},
-                        {"role": "user", "content": input_text}
-                    ],
-                    max_tokens=1500,
-                    temperature=0.7
-                )
-                model_response = response['choices'][0]['message']['content'].strip()
-                reformulated_question, answer, category_id = parse_html_response(model_response)
-                results.append([question_id, reformulated_question, answer, category_id])
-                pbar.update(1)
-                print(f"Обработан вопрос ID {question_id}")
-            except Exception as e:
-                print(f"Ошибка при обработке вопроса ID {question_id}: {question}\n{str(e)}")
-                results.append([question_id, "Ошибка", "Ошибка", "Ошибка"])
+# rows - список (номер строки, вопрос, ответы); результаты возвращаются в том же порядке.
+# Ответ из кэша используется только если в нём корректная категория, иначе запрос отправляется заново.
+def process_qna_with_ai(prompt_template, rows, max_in_flight=max_in_flight, cache=None):
+    rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    prompt_tokens = count_tokens(prompt_template, model=model_name)
+
+    async def process_row(item):
+        question_id, question, answers = item  # Используем номер строки как ID
+        input_text = f"Спаршенный вопрос с ответами (ID {question_id}):\n{question}#{'#'.join(map(str, answers))}"
+        input_tokens = count_tokens(input_text, model=model_name)
+        try:
+            model_response, _, _ = await request_cached_model_response(
+                prompt_template, input_text, model_name, max_tokens=max_output_tokens,
+                cache=cache, accept=has_valid_category,
+                rate_limiter=rate_limiter, reserved_tokens=prompt_tokens + input_tokens + max_output_tokens)
+            reformulated_question, answer, category_id = parse_html_response(model_response)
+            return [question_id, reformulated_question, answer, category_id]
+        except Exception as e:
+            print(f"Ошибка при обработке вопроса ID {question_id}: {question}\n{str(e)}")
+            return [question_id, "Ошибка", "Ошибка", "Ошибка"]
+
+    with tqdm(total=len(rows), desc="Обработка вопросов", unit="вопрос") as pbar:
+        def on_done(position, result):
+            pbar.update(1)
+            question_id = result[0]
+            print(f"Обработан вопрос ID {question_id}")
+
+        results = asyncio.run(run_in_order(rows, process_row, max_in_flight, on_done=on_done))
     return results
 
 # Загрузка шаблона промпта
 with open(prompt_file_name, "r", encoding="windows-1251") as prompt_file:
     prompt_template = prompt_file.read()
 
+# Кэш ответов модели
+cache = ResponseCache(cache_file_name)
+
 # Шаг 1: Загрузка данных
 processed_data = pd.read_excel(processed_file_name)
 
@@ -104,18 +102,31 @@ print(f"Нечисловые значения или значения 0: {non_nu
 
 # Шаг 2: Если есть нечисловые категории или нули — обрабатываем их
 if non_numeric_or_zero_count > 0:
-    input_data = pd.read_excel(input_file_name, header=None)  # Без заголовков
+    input_rows = open_row_lookup(input_file_name)  # Выборка строк по номеру (txt - через индекс смещений)
+
+    # Строки с готовым ответом: категория определяется локально по исходному вопросу, без запроса к API
+    classifier = CategoryClassifier.load(load_categories(prompt_template), classifier_model_file_name,
+                                         classifier_threshold)
+    answers = non_numeric_or_zero_rows['ответ']
+    has_answer = ~(answers.isna() | answers.astype(str).str.strip().isin(failed_answers))
+    answered_rows = non_numeric_or_zero_rows[has_answer]
+    local_categories = pd.Series(classifier.confident_categories(classifier_rows(input_rows, answered_rows['id'])),
+                                 index=answered_rows.index, dtype=object).dropna()
+    processed_data.loc[local_categories.index, 'категория'] = [str(number) for number in local_categories]
+    print(f"Категория определена локально: {len(local_categories)}")
+    rows_to_fix = non_numeric_or_zero_rows.drop(local_categories.index)
 
     # Получение строк для повторной обработки с учетом смещения на -1
-    ids_to_reprocess = non_numeric_or_zero_rows['id'] - 1  # Уменьшаем ID на 1
-    rows_to_reprocess = input_data.iloc[ids_to_reprocess]
+    ids_to_reprocess = rows_to_fix['id'] - 1  # Уменьшаем ID на 1
+    rows_to_reprocess = [(idx, *input_rows[idx]) for idx in ids_to_reprocess]
 
     # Повторная обработка
-    reprocessed_results = process_qna_with_ai(prompt_template, rows_to_reprocess)
+    reprocessed_results = process_qna_with_ai(prompt_template, rows_to_reprocess, cache=cache)
 
-    # Замена строк в итоговом файле
-    for i, id_value in enumerate(non_numeric_or_zero_rows['id']):
-        processed_data.loc[processed_data['id'] == id_value, ['переформулированный вопрос', 'ответ', 'категория']] = reprocessed_results[i][1:]
+    # Замена строк в итоговом файле одним присваиванием по индексу (без поиска каждого id по всей таблице)
+    if reprocessed_results:
+        processed_data.loc[rows_to_fix.index, ['переформулированный вопрос', 'ответ', 'категория']] = \
+            [result[1:] for result in reprocessed_results]
 
     # Сохранение обновленного файла
     processed_data.to_excel(processed_file_name, index=False)
@@ -128,3 +139,6 @@ final_non_numeric_or_zero_count = processed_data[
 ].shape[0]
 
 print(f"Оставшиеся нечисловые значения или значения 0: {final_non_numeric_or_zero_count}")
+cache.close()
+stats = cache.stats()
+print(f"Кэш ответов: попаданий {stats['hits']}, промахов {stats['misses']} ({stats['hit_rate'] * 100:.1f}%)")
@@ -1,9 +1,18 @@
+import asyncio
 import openai
 import pandas as pd
-import tiktoken
+import token_accounting
 from bs4 import BeautifulSoup
-import re
 from tqdm import tqdm
+from html_response_parser import parse_html_response, extract_category_from_html
+from qna_async import run_in_order, request_cached_model_response
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache
+from categories import load_categories, build_category_prompt, parse_category_reply
+from result_journal import ResultJournal
+from output_sinks import OUTPUT_COLUMNS, export_to_xlsx
+from input_readers import open_row_lookup
+from category_classifier import CategoryClassifier, classifier_rows, DEFAULT_MODEL_FILE, DEFAULT_CONFIDENCE_THRESHOLD
 
 # API-ключ OpenAI
 openai.api_key = "api-key"
@@ -15,94 +24,156 @@ model_name = "gpt-4o"
 prompt_file_name = "Промпт_with_category.txt"  # Файл с промптом для обработки вопроса
 input_file_name = "50 000 вопросов.xlsx"  # Файл с входными данными
 processed_file_name = "Combined_QnA.xlsx"  # Итоговый файл
+cache_file_name = "responses_cache.sqlite"  # Локальный кэш ответов модели
+repair_journal_file_name = "Combined_QnA.repair.sqlite"  # Журнал исправленных строк
 
-# Функция для подсчёта токенов
+# Режим исправления: "category" - по готовым вопросу и ответу переспрашиваем только номер категории,
+# "full" - заново генерируем весь HTML-ответ
+repair_mode = "category"
+category_max_tokens = 3  # Ответ классификатора - одно число
+
+# Локальный классификатор категорий (category_classifier.py): в режиме "category" строки, категорию которых
+# он определяет с уверенностью не ниже порога, исправляются без запроса к API
+classifier_model_file_name = DEFAULT_MODEL_FILE
+classifier_threshold = DEFAULT_CONFIDENCE_THRESHOLD
+
+# Ответы, по которым категорию не определить - для таких строк нужна полная повторная генерация
+failed_answers = ["Ошибка", "Ошибка при разборе ответа", "Заголовок 'Ответ:' не найден", ""]
+
+# Число одновременных запросов к OpenAI
+max_in_flight = 16
+
+# Лимиты аккаунта OpenAI для клиентского ограничителя скорости
+requests_per_minute = 500
+tokens_per_minute = 300_000
+max_output_tokens = 1500  # Резерв токенов ответа (max_tokens)
+
+# Функция для подсчёта токенов (кодировщик создаётся один раз)
 def count_tokens(text, model=model_name):
-    encoder = tiktoken.encoding_for_model(model)
-    return len(encoder.encode(text))
+    return token_accounting.count_tokens(text, model)
 
 # Функция для расчета стоимости токенов
 def calculate_cost(tokens, input=True):
     tokens_in_millions = tokens / 1_000_000
     return tokens_in_millions * (2.50 if input else 10.00)
 
-# Функция для извлечения ID категории из HTML-ответа
-def extract_category_from_html(html_response):
-    try:
-        soup = BeautifulSoup(html_response, "html.parser")
-        category_p = soup.find("h3", string="Категория:").find_next("p")
-        if category_p:
-            category_text = category_p.get_text(strip=True)
-            category_match = re.match(r"^(\d+)$", category_text)
-            return category_match.group(1) if category_match else "Не определена"
-        return "Не определена"
-    except Exception:
-        return "Ошибка"
-
-def parse_html_response(html_response):
-    try:
-        soup = BeautifulSoup(html_response, "html.parser")
-        question_h2 = soup.find("h2", string="Вопрос:")
-        question = question_h2.find_next("p").get_text(strip=True) if question_h2 else "Вопрос не найден"
-        answer_h2 = soup.find("h2", string="Ответ:")
-        answer_elements = []
-        if answer_h2:
-            for sibling in answer_h2.find_next_siblings():
-                if sibling.name == "h2":
-                    break
-                answer_elements.append(str(sibling))
-            answer = ''.join(answer_elements)
-        else:
-            answer = "Заголовок 'Ответ:' не найден"
-        answer = re.sub(r"<h3>Категория:</h3>\s*<p>\d+</p>", "", answer, flags=re.DOTALL).strip()
-        category = extract_category_from_html(html_response)
-        return question, answer, category
-    except Exception:
-        return "Ошибка при разборе вопроса", "Ошибка при разборе ответа", "Ошибка"
+# Функция для проверки, что в ответе есть числовая категория, отличная от 0
+def has_valid_category(html_response):
+    category = extract_category_from_html(html_response)
+    return category.isdigit() and int(category) != 0
 
 # Функция для обработки вопросов через OpenAI
-def process_qna_with_ai(prompt_template, input_data):
-    results = []
-    with tqdm(total=len(input_data), desc="Обработка вопросов", unit="вопрос") as pbar:
-        for idx, row in input_data.iterrows():
-            question_id = idx  # Используем номер строки как ID
-            question = row[0]
-            answers = row[1:].dropna().tolist()
-            input_text = f"Спаршенный вопрос с ответами (ID {question_id}):\n{question}#{'#'.join(map(str, answers))}"
-            try:
-                response = openai.ChatCompletion.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": prompt_template},
-                        {"role": "user", "content": input_text}
-                    ],
-                    max_tokens=1500,
-                    temperature=0.7
-                )
-                model_response = response['choices'][0]['message']['content'].strip()
-                reformulated_question, answer, category_id = parse_html_response(model_response)
-                results.append([question_id, reformulated_question, answer, category_id])
-                pbar.update(1)
-                #print(f"Обработан вопрос ID {question_id}")
-            except Exception as e:
-                print(f"Ошибка при обработке вопроса ID {question_id}: {question}\n{str(e)}")
-                results.append([question_id, "Ошибка", "Ошибка", "Ошибка"])
+# rows - список (номер строки, вопрос, ответы); результаты возвращаются в том же порядке.
+# Ответ из кэша используется только если в нём корректная категория, иначе запрос отправляется заново.
+def process_qna_with_ai(prompt_template, rows, max_in_flight=max_in_flight, cache=None):
+    rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    prompt_tokens = count_tokens(prompt_template, model=model_name)
+
+    async def process_row(item):
+        question_id, question, answers = item  # Используем номер строки как ID
+        input_text = f"Спаршенный вопрос с ответами (ID {question_id}):\n{question}#{'#'.join(map(str, answers))}"
+        input_tokens = count_tokens(input_text, model=model_name)
+        try:
+            model_response, _, _ = await request_cached_model_response(
+                prompt_template, input_text, model_name, max_tokens=max_output_tokens,
+                cache=cache, accept=has_valid_category,
+                rate_limiter=rate_limiter, reserved_tokens=prompt_tokens + input_tokens + max_output_tokens)
+            reformulated_question, answer, category_id = parse_html_response(model_response)
+            return [question_id, reformulated_question, answer, category_id]
+        except Exception as e:
+            print(f"Ошибка при обработке вопроса ID {question_id}: {question}\n{str(e)}")
+            return [question_id, "Ошибка", "Ошибка", "Ошибка"]
+
+    with tqdm(total=len(rows), desc="Обработка вопросов", unit="вопрос") as pbar:
+        def on_done(position, result):
+            pbar.update(1)
+            question_id = result[0]
+            #print(f"Обработан вопрос ID {question_id}")
+
+        results = asyncio.run(run_in_order(rows, process_row, max_in_flight, on_done=on_done))
     return results
 
+# Функция для маски строк с нечисловой категорией или категорией 0
+def invalid_category_mask(category_column):
+    numeric = pd.to_numeric(category_column, errors='coerce')
+    return numeric.isna() | (numeric == 0)
+
+# Функция для массового применения исправленных строк [id, вопрос, ответ, категория] к данным, индексированным по id
+def apply_updates(processed_data, rows):
+    updates = pd.DataFrame(rows, columns=OUTPUT_COLUMNS).set_index('id')
+    updates = updates[updates.index.isin(processed_data.index)]
+    processed_data.loc[updates.index, OUTPUT_COLUMNS[1:]] = updates[OUTPUT_COLUMNS[1:]].values
+
+# Функция для получения текста без HTML-разметки
+def html_to_text(html):
+    return BeautifulSoup(str(html), "html.parser").get_text(" ", strip=True)
+
+# Функция для определения категории по уже готовым вопросу и ответу.
+# Короткий промпт со списком категорий, в ответ - одно число, поэтому запрос в разы дешевле полной генерации.
+def classify_categories_with_ai(category_prompt, categories, rows, max_in_flight=max_in_flight, cache=None):
+    rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    prompt_tokens = count_tokens(category_prompt, model=model_name)
+
+    def is_category_reply(reply):
+        return parse_category_reply(reply, categories) != "Не определена"
+
+    async def classify_row(item):
+        question_id, question, answer = item
+        input_text = f"Вопрос: {question}\nОтвет: {html_to_text(answer)}"
+        input_tokens = count_tokens(input_text, model=model_name)
+        try:
+            reply, _, _ = await request_cached_model_response(
+                category_prompt, input_text, model_name, max_tokens=category_max_tokens, temperature=0,
+                cache=cache, accept=is_category_reply,
+                rate_limiter=rate_limiter, reserved_tokens=prompt_tokens + input_tokens + category_max_tokens)
+            return parse_category_reply(reply, categories)
+        except Exception as e:
+            print(f"Ошибка при определении категории вопроса ID {question_id}: {question}\n{str(e)}")
+            return "Ошибка"
+
+    with tqdm(total=len(rows), desc="Определение категорий", unit="вопрос") as pbar:
+        def on_done(position, result):
+            pbar.update(1)
+
+        return asyncio.run(run_in_order(rows, classify_row, max_in_flight, on_done=on_done))
+
 # Загрузка шаблона промпта
 with open(prompt_file_name, "r", encoding="windows-1251") as prompt_file:
     prompt_template = prompt_file.read()
 
+# Короткий промпт для определения категории по списку категорий из основного промпта
+categories = load_categories(prompt_template)
+category_prompt = build_category_prompt(categories)
+classifier = CategoryClassifier.load(categories, classifier_model_file_name, classifier_threshold)
+
+# Кэш ответов модели
+cache = ResponseCache(cache_file_name)
+
+# id, для которых уже пробовали определить только категорию: если не помогло, генерируем ответ целиком
+category_attempted_ids = set()
+
+# Шаг 1: Загрузка данных - один раз на весь запуск, строки индексируются по id
+processed_data = pd.read_excel(processed_file_name)
+processed_data.index = processed_data['id']
+input_rows = None  # Входной файл читается только если понадобятся исходные строки (классификатор или генерация)
+
+# Журнал исправленных строк: на каждом проходе на диск пишутся только изменённые строки,
+# а после прерванного запуска они применяются поверх итогового файла
+repair_journal = ResultJournal(repair_journal_file_name)
+journaled_rows = repair_journal.rows()
+if journaled_rows:
+    apply_updates(processed_data, journaled_rows)
+    print(f"Восстановлено исправленных строк из журнала: {len(journaled_rows)}")
+
+# Полная проверка - только один раз, дальше проверяются лишь строки, исправленные на прошлом проходе
+total_rows = len(processed_data)
+pending_ids = processed_data.index[invalid_category_mask(processed_data['категория'])]
+rows_changed = bool(journaled_rows)
+
 while True:
-    # Шаг 1: Загрузка данных
-    processed_data = pd.read_excel(processed_file_name)
-    non_numeric_or_zero_rows = processed_data[
-        pd.to_numeric(processed_data['категория'], errors='coerce').isna() |  # Нечисловые значения
-        (pd.to_numeric(processed_data['категория'], errors='coerce') == 0)   # Значения равны 0
-    ]
+    non_numeric_or_zero_rows = processed_data.loc[pending_ids]
 
     # Вывод количества и процента таких строк
-    total_rows = len(processed_data)
     non_numeric_or_zero_count = len(non_numeric_or_zero_rows)
     print(f"Нечисловые значения или значения 0: {non_numeric_or_zero_count} ({(non_numeric_or_zero_count / total_rows) * 100:.2f}%)")
 
@@ -110,31 +181,74 @@ while True:
     if non_numeric_or_zero_count == 0:
         break
 
-    # Шаг 2: Повторная обработка вопросов с нечисловыми категориями
-    input_data = pd.read_excel(input_file_name, header=None)  # Без заголовков
-
-    # Получение строк для повторной обработки с учетом смещения на -1
-    ids_to_reprocess = non_numeric_or_zero_rows['id'] - 1  # Уменьшаем ID на 1
-    rows_to_reprocess = input_data.iloc[ids_to_reprocess]
-
-    # Повторная обработка
-    reprocessed_results = process_qna_with_ai(prompt_template, rows_to_reprocess)
-
-    # Замена строк в исходном файле
-    for i, id_value in enumerate(non_numeric_or_zero_rows['id']):
-        processed_data.loc[processed_data['id'] == id_value, ['переформулированный вопрос', 'ответ', 'категория']] = reprocessed_results[i][1:]
-
-    # Сохранение обновленного файла
-    processed_data.to_excel(processed_file_name, index=False)
+    # Шаг 2: Строки с готовыми вопросом и ответом - переспрашиваем только категорию
+    if repair_mode == "category":
+        answers = non_numeric_or_zero_rows['ответ']
+        category_only = ~(answers.isna() | answers.astype(str).str.strip().isin(failed_answers)) & \
+            ~non_numeric_or_zero_rows['id'].isin(category_attempted_ids)
+    else:
+        category_only = pd.Series(False, index=non_numeric_or_zero_rows.index)
+    category_rows = non_numeric_or_zero_rows[category_only]
+    full_rows = non_numeric_or_zero_rows[~category_only]
+
+    if len(category_rows) > 0:
+        # Сначала категория определяется локально по исходной строке (как при обработке);
+        # к модели уходят только строки, в которых классификатор не уверен
+        if input_rows is None:
+            input_rows = open_row_lookup(input_file_name)  # Выборка строк по номеру (txt - через индекс смещений)
+        local_categories = classifier.confident_categories(classifier_rows(input_rows, category_rows['id']))
+        local_mask = pd.Series([number is not None for number in local_categories], index=category_rows.index)
+        processed_data.loc[category_rows.index[local_mask], 'категория'] = \
+            [str(number) for number in local_categories if number is not None]
+        print(f"Категория определена локально: {int(local_mask.sum())} из {len(category_rows)}")
+        category_attempted_ids.update(category_rows['id'])
+
+        ai_rows = category_rows[~local_mask]
+        if len(ai_rows) > 0:
+            items = list(zip(ai_rows['id'], ai_rows['переформулированный вопрос'], ai_rows['ответ']))
+            new_categories = classify_categories_with_ai(category_prompt, categories, items, cache=cache)
+
+            # Заменяем только категорию (одним присваиванием по индексу id), вопрос и ответ остаются прежними
+            processed_data.loc[ai_rows.index, 'категория'] = new_categories
+
+    # Шаг 3: Повторная обработка вопросов, для которых нужен новый ответ целиком
+    if len(full_rows) > 0:
+        if input_rows is None:
+            input_rows = open_row_lookup(input_file_name)  # Выборка строк по номеру (txt - через индекс смещений)
+
+        # Получение строк для повторной обработки с учетом смещения на -1
+        ids_to_reprocess = full_rows['id'] - 1  # Уменьшаем ID на 1
+        rows_to_reprocess = [(idx, *input_rows[idx]) for idx in ids_to_reprocess]
+
+        # Повторная обработка
+        reprocessed_results = process_qna_with_ai(prompt_template, rows_to_reprocess, cache=cache)
+
+        # Замена строк одним присваиванием по индексу id
+        processed_data.loc[full_rows.index, OUTPUT_COLUMNS[1:]] = [result[1:] for result in reprocessed_results]
+
+    # Сохраняем в журнал только строки, изменённые на этом проходе
+    changed_ids = non_numeric_or_zero_rows.index
+    for row in processed_data.loc[changed_ids, OUTPUT_COLUMNS].itertuples(index=False):
+        repair_journal.record(list(row))
+    repair_journal.commit()
+    rows_changed = True
+
+    # На следующем проходе проверяем только изменённые строки
+    pending_ids = changed_ids[invalid_category_mask(processed_data.loc[changed_ids, 'категория'])]
 
 # Итоговая проверка
 print("Все строки обработаны корректно.")
 
+# Сохранение обновленного файла - один раз в конце, после чего журнал исправлений больше не нужен
+if rows_changed:
+    export_to_xlsx(processed_data[OUTPUT_COLUMNS].itertuples(index=False), processed_file_name)
+repair_journal.reset()
+repair_journal.close()
+
 # Итоговая проверка (нечисловые значения или 0)
-processed_data = pd.read_excel(processed_file_name)
-final_non_numeric_or_zero_count = processed_data[
-    pd.to_numeric(processed_data['категория'], errors='coerce').isna() |  
-    (pd.to_numeric(processed_data['категория'], errors='coerce') == 0)   
-].shape[0]
+final_non_numeric_or_zero_count = int(invalid_category_mask(processed_data['категория']).sum())
 
 print(f"Оставшиеся нечисловые значения или значения 0: {final_non_numeric_or_zero_count}")
+cache.close()
+stats = cache.stats()
+print(f"Кэш ответов: попаданий {stats['hits']}, промахов {stats['misses']} ({stats['hit_rate'] * 100:.1f}%)")
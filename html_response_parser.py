@@ -0,0 +1,177 @@
+import re
+from html.parser import HTMLParser
+
+# Теги без закрывающей пары - не попадают в стек открытых тегов
+VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+
+
+# Функция для экранирования текста так же, как это делает BeautifulSoup при выводе HTML
+def _escape(text):
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+# Функция для значения атрибута в кавычках по правилам BeautifulSoup: значение с двойной кавычкой
+# берётся в одинарные, а если в нём есть оба вида кавычек - двойные заменяются на &quot;
+def _quote_attribute(value):
+    value = _escape(value or "")
+    if '"' in value:
+        if "'" in value:
+            return '"' + value.replace('"', "&quot;") + '"'
+        return "'" + value + "'"
+    return '"' + value + '"'
+
+
+# Разбор ответа модели за один проход событий html.parser:
+# вопрос - текст первого <p> после <h2>Вопрос:</h2>,
+# ответ - HTML элементов-соседей <h2>Ответ:</h2> до следующего <h2> (без блока категории),
+# категория - текст первого <p> после <h3>Категория:</h3>.
+# HTML ответа собирается по тем же правилам, что и str() в BeautifulSoup, поэтому результат совпадает с прежним.
+class _ResponseParser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        # Открытые заголовки h2/h3: [тег, глубина, текст, число прямых потомков, число строк, позиция в HTML ответа].
+        # Заголовок совпадает с "Вопрос:" и т. п., только если внутри одна строка без соседей (как .string в bs4)
+        self.headings = []
+        # Вопрос и категория - текст следующего <p> после своего заголовка (как find_next("p") в BeautifulSoup),
+        # поэтому ищутся независимо: waiting - кто ждёт следующего <p>, paragraphs - открытые <p> [кто, глубина, текст]
+        self.waiting = set()
+        self.paragraphs = []
+        self.question = None
+        self.category_text = None
+        self.question_heading_seen = False
+        self.category_heading_seen = False
+        self.answer_depth = None  # Глубина заголовка "Ответ:" - его соседи составляют ответ
+        self.answer_done = False
+        self.pieces = []  # Части HTML ответа
+        self.category_block = None  # (начало блока в pieces, состояние) для вырезания <h3>Категория:</h3><p>N</p>
+
+    def _collecting(self):
+        return self.answer_depth is not None and not self.answer_done
+
+    def handle_starttag(self, tag, attrs):
+        depth = len(self.stack)
+        self._count_heading_child(depth)
+        if self._collecting():
+            if depth == self.answer_depth and tag == "h2":
+                self.answer_done = True
+            else:
+                self._emit_starttag(tag, attrs)
+        if tag in ("h2", "h3"):
+            piece = len(self.pieces) - 1 if self._collecting() and not attrs else None
+            self.headings.append([tag, depth, [], 0, 0, piece])
+        if tag == "p" and self.waiting:
+            self.paragraphs.extend([target, depth, []] for target in self.waiting)
+            self.waiting.clear()
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def _emit_starttag(self, tag, attrs):
+        # BeautifulSoup выводит атрибуты по алфавиту, у повторённого атрибута остаётся последнее значение
+        attributes = "".join(f" {name}={_quote_attribute(value)}" for name, value in sorted(dict(attrs).items()))
+        self.pieces.append(f"<{tag}{attributes}/>" if tag in VOID_TAGS else f"<{tag}{attributes}>")
+        if self.category_block is not None:
+            start, state = self.category_block
+            self.category_block = (start, "p") if state == "h3" and tag == "p" and not attrs else None
+
+    def handle_endtag(self, tag):
+        if tag not in self.stack:
+            return  # Лишний закрывающий тег
+        while self.stack:
+            opened = self.stack.pop()
+            self._close(opened)
+            if opened == tag:
+                break
+
+    def _close(self, tag):
+        depth = len(self.stack)
+        if self._collecting():
+            if depth < self.answer_depth:
+                self.answer_done = True  # Закрылся родитель заголовка "Ответ:"
+            else:
+                self.pieces.append(f"</{tag}>")
+                if self.category_block is not None:
+                    start, state = self.category_block
+                    if tag == "p" and state == "digits":
+                        del self.pieces[start:]
+                    if not (tag == "h3" and state == "h3"):
+                        self.category_block = None
+        if self.headings and self.headings[-1][1] == depth:
+            _, _, text, children, strings, piece = self.headings.pop()
+            if children == 1 and strings == 1:
+                self._close_heading(tag, "".join(text), piece)
+        for target, _, text in [paragraph for paragraph in self.paragraphs if paragraph[1] == depth]:
+            if target == "question" and self.question is None:
+                self.question = "".join(text)
+            elif target == "category" and self.category_text is None:
+                self.category_text = "".join(text)
+        self.paragraphs = [paragraph for paragraph in self.paragraphs if paragraph[1] != depth]
+
+    def _close_heading(self, tag, text, piece):
+        if tag == "h2" and text == "Вопрос:" and not self.question_heading_seen:
+            self.question_heading_seen = True
+            self.waiting.add("question")
+        elif tag == "h2" and text == "Ответ:" and self.answer_depth is None:
+            self.answer_depth = len(self.stack)
+        elif tag == "h3" and text == "Категория:":
+            if not self.category_heading_seen:
+                self.category_heading_seen = True
+                self.waiting.add("category")
+            if piece is not None and self._collecting():
+                self.category_block = (piece, "h3")
+
+    # Функция для учёта прямого потомка (тега или строки) открытых заголовков на глубине depth
+    def _count_heading_child(self, depth):
+        for heading in self.headings:
+            if heading[1] + 1 == depth:
+                heading[3] += 1
+
+    def handle_data(self, data):
+        self._count_heading_child(len(self.stack))
+        for heading in self.headings:
+            heading[2].append(data)
+            heading[4] += 1
+        for _, _, text in self.paragraphs:
+            text.append(data.strip())
+        if self._collecting() and len(self.stack) > self.answer_depth:
+            if data.strip():
+                self.pieces.append(_escape(data))
+                if self.category_block is not None:
+                    start, state = self.category_block
+                    self.category_block = (start, "digits") if state == "p" and data.isdigit() else None
+            else:
+                # BeautifulSoup сворачивает пробельные строки до одного символа
+                self.pieces.append("\n" if "\n" in data else " ")
+
+    # Закрытие тегов, оставшихся открытыми к концу ответа
+    def finish(self):
+        self.close()
+        while self.stack:
+            self._close(self.stack.pop())
+
+
+# Функция для извлечения вопроса, ответа и ID категории из HTML-ответа за один проход
+def parse_html_response(html_response):
+    try:
+        parser = _ResponseParser()
+        parser.feed(html_response)
+        parser.finish()
+        question = parser.question if parser.question is not None else "Вопрос не найден"
+        if parser.answer_depth is not None:
+            answer = "".join(parser.pieces).strip()
+        else:
+            answer = "Заголовок 'Ответ:' не найден"
+        if not parser.category_heading_seen:
+            category = "Ошибка"  # Нет блока категории
+        elif parser.category_text is not None and re.fullmatch(r"\d+", parser.category_text):
+            category = parser.category_text
+        else:
+            category = "Не определена"
+        return question, answer, category
+    except Exception:
+        return "Ошибка при разборе вопроса", "Ошибка при разборе ответа", "Ошибка"
+
+
+# Функция для извлечения ID категории из HTML-ответа
+def extract_category_from_html(html_response):
+    return parse_html_response(html_response)[2]
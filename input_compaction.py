@@ -0,0 +1,175 @@
+# Сжатие входа под бюджет токенов: в длинных ветках с десятками ответов запрос растёт без ограничений.
+# Для каждой строки: приветствия и подписи убираются, пробелы схлопываются, одинаковые и почти одинаковые ответы
+# (Жаккар по шинглам, как в near_duplicates.py) отбрасываются, оставшиеся ранжируются по информативности
+# и берутся по рангу, пока вопрос и ответы укладываются в бюджет. Ответы остаются в исходном порядке.
+# По каждой строке сохраняется, сколько токенов и ответов убрано, - чтобы сравнить экономию с качеством ответов.
+# Проверка на файле: python input_compaction.py "Формат передачи_100.txt" --budget 600 [--report compaction.csv]
+import argparse
+import csv
+import re
+
+from near_duplicates import jaccard, shingle_hashes
+from token_accounting import count_tokens_batch
+
+# Бюджет токенов вопроса и ответов одной строки по умолчанию
+DEFAULT_INPUT_BUDGET = 1200
+
+# Порог сходства, начиная с которого ответ считается повтором уже взятого
+DEFAULT_ANSWER_SIMILARITY = 0.8
+
+# Приветствие в начале текста (вместе с обращением «друзья», «мастера» и т. п.)
+GREETING_RE = re.compile(
+    r"^\s*(?:(?:здравствуйте|здраствуйте|здравствуй|добрый\s+(?:день|вечер)|доброе\s+утро|доброй\s+ночи"
+    r"|доброго\s+(?:времени\s+суток|дня|вечера|здоровья)|доброе\s+время\s+суток|вечер\s+добрый|день\s+добрый"
+    r"|приветствую|приветики|привет|моё\s+почтение|мое\s+почтение|hello|hi)"
+    r"(?:[\s,]+(?:всем|друзья|уважаемые|уважаемый|мастера|спецы|коллеги))*[\s,.!)]*)+"
+    r"(?:(?-i:[A-ZА-ЯЁ])[\w-]*\s*!\s*)?",  # Имя сразу после приветствия: «Здравствуйте, Иван!»
+    re.IGNORECASE)
+
+# Подпись в конце текста: «С уважением» и всё, что после него (имя, телефон, сайт),
+# или вежливое завершение последней фразы
+SIGNATURE_RE = re.compile(
+    r"(?:^|(?<=[.!?)\s]))(?:с\s+уважением.{0,80}|(?:всего\s+(?:доброго|хорошего)|удачи|удачного\s+ремонта|успехов"
+    r"|спасибо(?:\s+за\s+(?:вопрос|внимание|понимание))?)\b[^.!?]{0,80}[.!?)\s]*)$",
+    re.IGNORECASE)
+
+# Слова, не влияющие на информативность ответа
+STOP_WORDS = set("""
+это как так что чтобы если когда где тоже также только уже ещё еще очень можно нужно надо быть было будет есть
+или либо для при без под над про через после перед его её ее их она они оно вас вам ваш ваша ваше вы мне меня
+там тут здесь этот эта эти этого этой тот той того все всё всего всех себя свой своя свои который которая которые
+""".split())
+
+
+# Функция для очистки текста: без приветствия и подписи, пробелы схлопнуты
+def clean_text(text):
+    text = re.sub(r"\s+", " ", str(text)).strip()
+    text = GREETING_RE.sub("", text)
+    text = SIGNATURE_RE.sub("", text).strip()
+    return text
+
+
+# Функция для информативности ответа: число разных содержательных слов плюс бонус за модели, коды ошибок,
+# числа и единицы измерения (конкретика полезнее общих фраз)
+def informativeness(text):
+    words = set(re.findall(r"\w+", text.lower().replace("ё", "е")))
+    content = [word for word in words if len(word) >= 4 and word not in STOP_WORDS and not word.isdigit()]
+    specifics = sum(1 for word in words if any(char.isdigit() for char in word) or re.fullmatch(r"[a-z]+\d*", word))
+    return len(content) + 2 * specifics
+
+
+# Учёт сжатия за запуск: по каждой строке токены и ответы до и после, причины удаления ответов
+class CompactionStats:
+    FIELDS = ["id", "tokens_before", "tokens_after", "answers_before", "answers_after",
+              "duplicates", "near_duplicates", "empty", "over_budget"]
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.records = []
+
+    def summary(self):
+        if not self.records:
+            return "Сжатие входа: строк не было"
+        before = sum(record["tokens_before"] for record in self.records)
+        after = sum(record["tokens_after"] for record in self.records)
+        changed = sum(1 for record in self.records if record["tokens_after"] < record["tokens_before"])
+        removed = {field: sum(record[field] for record in self.records)
+                   for field in ("duplicates", "near_duplicates", "empty", "over_budget")}
+        over = sum(1 for record in self.records if record["tokens_after"] > self.budget)
+        share = (before - after) / before * 100 if before else 0.0
+        return (f"Сжатие входа (бюджет {self.budget} токенов): токенов {before} -> {after} (-{share:.1f}%), "
+                f"сжато строк {changed} из {len(self.records)}; убрано ответов: повторов {removed['duplicates']}, "
+                f"почти повторов {removed['near_duplicates']}, пустых после очистки {removed['empty']}, "
+                f"сверх бюджета {removed['over_budget']}; строк выше бюджета (вопрос и лучший ответ) {over}")
+
+    # Функция для сохранения данных по каждой строке в CSV
+    def write_csv(self, path):
+        with open(path, "w", encoding="utf-8-sig", newline="") as report_file:
+            writer = csv.DictWriter(report_file, fieldnames=self.FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+
+# Функция для сжатия строк [(вопрос, ответы)] под бюджет budget токенов на строку.
+# ids - номера строк для отчёта (по умолчанию 1, 2, ...). Токены всех текстов считаются одним пакетом.
+# Лучший по информативности ответ сохраняется всегда, даже если вместе с вопросом он выше бюджета.
+# Возвращает (сжатые строки [(вопрос, ответы)], CompactionStats).
+def compact_rows(rows, budget, model, ids=None, similarity=DEFAULT_ANSWER_SIMILARITY):
+    rows = list(rows)
+    stats = CompactionStats(budget)
+    raw_texts = [str(text) for question, answers in rows for text in (question, *answers)]
+    cleaned_texts = [clean_text(text) for text in raw_texts]
+    raw_tokens = iter(count_tokens_batch(raw_texts, model))
+    cleaned_tokens = iter(count_tokens_batch(cleaned_texts, model))
+    cleaned_iter = iter(cleaned_texts)
+    compacted = []
+    for position, (question, answers) in enumerate(rows):
+        tokens_before = sum(next(raw_tokens) for _ in range(len(answers) + 1))
+        question = next(cleaned_iter) or str(question)
+        question_tokens = next(cleaned_tokens)
+        record = dict.fromkeys(CompactionStats.FIELDS, 0)
+        record.update(id=ids[position] if ids is not None else position + 1, tokens_before=tokens_before,
+                      answers_before=len(answers))
+
+        # Повторы: сначала точные (после очистки и без учёта регистра), затем почти одинаковые
+        candidates = []
+        seen = set()
+        for _ in answers:
+            text, tokens = next(cleaned_iter), next(cleaned_tokens)
+            key = text.lower()
+            if not text:
+                record["empty"] += 1
+            elif key in seen:
+                record["duplicates"] += 1
+            else:
+                seen.add(key)
+                candidates.append([len(candidates), text, tokens, shingle_hashes(text)])
+        unique = []
+        for candidate in candidates:
+            if candidate[3].size and any(jaccard(candidate[3], kept[3]) >= similarity
+                                         for kept in unique if kept[3].size):
+                record["near_duplicates"] += 1
+            else:
+                unique.append(candidate)
+
+        # Ответы берутся по убыванию информативности, пока укладываются в бюджет
+        ranked = sorted(unique, key=lambda candidate: -informativeness(candidate[1]))
+        used = question_tokens
+        chosen = []
+        for candidate in ranked:
+            if not chosen or used + candidate[2] <= budget:
+                chosen.append(candidate)
+                used += candidate[2]
+            else:
+                record["over_budget"] += 1
+        chosen.sort(key=lambda candidate: candidate[0])
+        record.update(tokens_after=used, answers_after=len(chosen))
+        stats.records.append(record)
+        compacted.append((question, [candidate[1] for candidate in chosen]))
+    return compacted, stats
+
+
+def main():
+    from input_readers import open_input_rows
+
+    parser = argparse.ArgumentParser(description="Сжатие вопросов и ответов под бюджет токенов")
+    parser.add_argument("input", help="входной файл: .xlsx, .csv, .jsonl, .parquet или txt с разделителем #")
+    parser.add_argument("--budget", type=int, default=DEFAULT_INPUT_BUDGET, help="бюджет токенов на строку")
+    parser.add_argument("--model", default="gpt-4o", help="модель для подсчёта токенов")
+    parser.add_argument("--report", help="CSV со статистикой по каждой строке")
+    parser.add_argument("--show", type=int, default=0, help="вывести N строк до и после сжатия")
+    args = parser.parse_args()
+
+    rows = list(open_input_rows(args.input, use_cache=False))
+    compacted, stats = compact_rows(rows, args.budget, args.model)
+    for (question, answers), (new_question, new_answers) in list(zip(rows, compacted))[:args.show]:
+        print(f"ДО:    {question} # {' # '.join(map(str, answers))}")
+        print(f"ПОСЛЕ: {new_question} # {' # '.join(new_answers)}\n")
+    print(stats.summary())
+    if args.report:
+        stats.write_csv(args.report)
+        print(f"Статистика по строкам: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import csv
+import json
+import os
+import zipfile
+from xml.etree import ElementTree
+
+from offset_index import IndexedTxtRows
+
+
+# Пространства имён XML внутри XLSX
+SPREADSHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+
+
+# Функция для чтения таблицы общих строк XLSX (sharedStrings.xml)
+def _read_shared_strings(archive):
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as strings_file:
+        for _, element in ElementTree.iterparse(strings_file):
+            if element.tag == SPREADSHEET_NS + "si":
+                # Текст ячейки может быть разбит на фрагменты форматирования (<r><t>), фонетика (<rPh>) не нужна
+                strings.append("".join(text.text or "" for text in element.iter(SPREADSHEET_NS + "t")
+                                       if text not in _phonetic_texts(element)))
+                element.clear()
+    return strings
+
+
+def _phonetic_texts(element):
+    return {text for phonetic in element.iter(SPREADSHEET_NS + "rPh") for text in phonetic.iter(SPREADSHEET_NS + "t")}
+
+
+# Функция для пути к XML первого листа книги
+def _first_sheet_path(archive):
+    workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+    sheet = workbook.find(f"{SPREADSHEET_NS}sheets/{SPREADSHEET_NS}sheet")
+    relation_id = sheet.get(RELATIONSHIP_NS + "id")
+    relations = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    for relation in relations:
+        if relation.get("Id") == relation_id:
+            target = relation.get("Target").lstrip("/")
+            return target if target.startswith("xl/") else "xl/" + target
+    return "xl/worksheets/sheet1.xml"
+
+
+# Функция для номера столбца по адресу ячейки ("B12" -> 1)
+def _column_index(reference):
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+# Функция для значения ячейки XLSX в том же виде, что и у pandas (строка, число или bool)
+def _cell_value(cell, shared_strings):
+    cell_type = cell.get("t")
+    if cell_type == "inlineStr":
+        return "".join(text.text or "" for text in cell.iter(SPREADSHEET_NS + "t"))
+    value = cell.findtext(SPREADSHEET_NS + "v")
+    if value is None:
+        return None
+    if cell_type == "s":
+        return shared_strings[int(value)]
+    if cell_type == "b":
+        return value == "1"
+    if cell_type in ("str", "e"):
+        return value
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+# Функция для потокового чтения XLSX: XML листа разбирается по одной строке, в памяти только таблица общих строк.
+# Возвращает кортежи (вопрос, [ответы]); пустые ячейки ответов пропускаются.
+# Пустые строки в середине сохраняются (как в pd.read_excel), чтобы номера строк совпадали с id.
+def read_xlsx_rows(path):
+    with zipfile.ZipFile(path) as archive:
+        shared_strings = _read_shared_strings(archive)
+        empty_rows = 0
+        expected_row = 1
+        with archive.open(_first_sheet_path(archive)) as sheet_file:
+            for _, element in ElementTree.iterparse(sheet_file):
+                if element.tag != SPREADSHEET_NS + "row":
+                    continue
+                # Строки, которых нет в XML, тоже пустые
+                row_number = int(element.get("r", expected_row))
+                empty_rows += row_number - expected_row
+                expected_row = row_number + 1
+                values = {}
+                for position, cell in enumerate(element.iter(SPREADSHEET_NS + "c")):
+                    value = _cell_value(cell, shared_strings)
+                    if value is not None and value != "":
+                        reference = cell.get("r")
+                        values[_column_index(reference) if reference else position] = value
+                element.clear()
+                if not values:
+                    empty_rows += 1  # Выдаются, только если дальше есть непустые строки
+                    continue
+                for _ in range(empty_rows):
+                    yield None, []
+                empty_rows = 0
+                answers = [values[column] for column in sorted(values) if column > 0]
+                yield values.get(0), answers
+
+
+# Функция для потокового чтения txt-файла, где вопрос и ответы разделены "#" (как в Формат передачи_100.txt)
+def read_txt_rows(path):
+    with open(path, "r", encoding="utf-8", newline="") as input_file:
+        for row in csv.reader(input_file, delimiter="#"):
+            if row:
+                yield row[0], row[1:]
+
+
+# Функция для потокового чтения CSV: первый столбец - вопрос, остальные непустые - ответы
+def read_csv_rows(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as input_file:
+        for row in csv.reader(input_file):
+            if row:
+                yield row[0], [answer for answer in row[1:] if answer != ""]
+
+
+# Функция для потокового чтения JSONL: объект {"question": ..., "answers": [...]} или список [вопрос, ответ, ...]
+def read_jsonl_rows(path):
+    with open(path, "r", encoding="utf-8") as input_file:
+        for line in input_file:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict):
+                yield record.get("question"), [answer for answer in record.get("answers") or [] if answer is not None]
+            else:
+                yield record[0], [answer for answer in record[1:] if answer is not None]
+
+
+# Функция для потокового чтения Parquet по пакетам строк.
+# Формат кэша (столбцы question и answers-список) или произвольная таблица: первый столбец - вопрос, остальные - ответы.
+def read_parquet_rows(path, batch_size=10_000):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(path)
+    names = parquet_file.schema_arrow.names
+    for batch in parquet_file.iter_batches(batch_size=batch_size):
+        if names[:2] == ["question", "answers"]:
+            yield from zip(batch.column(0).to_pylist(), (answers or [] for answers in batch.column(1).to_pylist()))
+        else:
+            columns = [batch.column(index).to_pylist() for index in range(len(names))]
+            for values in zip(*columns):
+                yield values[0], [answer for answer in values[1:] if answer is not None]
+
+
+# Читатели по расширению файла
+READERS = {
+    ".xlsx": read_xlsx_rows,
+    ".xlsm": read_xlsx_rows,
+    ".txt": read_txt_rows,
+    ".csv": read_csv_rows,
+    ".jsonl": read_jsonl_rows,
+    ".parquet": read_parquet_rows,
+}
+
+
+# Функция для чтения входных данных по расширению файла
+def read_input_rows(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in READERS:
+        raise ValueError(f"Неподдерживаемый формат входных данных: {extension}")
+    return READERS[extension](path)
+
+
+# Суффикс файла колоночного кэша входных данных (рядом с исходным файлом)
+INPUT_CACHE_SUFFIX = ".rows.parquet"
+
+# Строк в одной группе строк кэша
+INPUT_CACHE_ROW_GROUP = 10_000
+
+
+# Функция для подписи исходного файла: кэш действителен, пока не изменились размер и время изменения
+def _source_signature(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8")
+
+
+# Функция для проверки, что кэш построен по текущей версии исходного файла
+def _input_cache_is_fresh(cache_path, path):
+    import pyarrow.parquet as pq
+
+    if not os.path.exists(cache_path):
+        return False
+    try:
+        metadata = pq.read_schema(cache_path).metadata or {}
+    except Exception:
+        return False
+    return metadata.get(b"source_signature") == _source_signature(path)
+
+
+# Функция для значения ячейки в виде строки для кэша (None остаётся None)
+def _cache_text(value):
+    return None if value is None else str(value)
+
+
+# Функция для чтения исходного файла с одновременной записью колоночного кэша.
+# Кэш пишется во временный файл и становится действительным только после полного прочтения источника.
+def _read_and_cache_rows(path, cache_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([("question", pa.string()), ("answers", pa.list_(pa.string()))],
+                       metadata={"source_signature": _source_signature(path)})
+    temp_path = cache_path + ".tmp"
+    writer = pq.ParquetWriter(temp_path, schema)
+    completed = False
+    questions, answer_lists = [], []
+
+    def flush():
+        writer.write_table(pa.table([questions, answer_lists], schema=schema))
+        questions.clear()
+        answer_lists.clear()
+
+    try:
+        for question, answers in read_input_rows(path):
+            questions.append(_cache_text(question))
+            answer_lists.append([str(answer) for answer in answers])
+            if len(questions) >= INPUT_CACHE_ROW_GROUP:
+                flush()
+            yield question, answers
+        if questions:
+            flush()
+        completed = True
+    finally:
+        writer.close()
+        if completed:
+            os.replace(temp_path, cache_path)
+        elif os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+# Функция для чтения входных данных через колоночный кэш.
+# Первый запуск читает исходный файл и одновременно сохраняет кэш <файл>.rows.parquet,
+# последующие читают кэш (пока исходный файл не изменился). Без pyarrow кэш не используется.
+def open_input_rows(path, use_cache=True):
+    extension = os.path.splitext(path)[1].lower()
+    if not use_cache or extension == ".parquet":
+        return read_input_rows(path)
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return read_input_rows(path)
+    cache_path = path + INPUT_CACHE_SUFFIX
+    if _input_cache_is_fresh(cache_path, path):
+        return read_parquet_rows(cache_path)
+    if extension not in READERS:
+        raise ValueError(f"Неподдерживаемый формат входных данных: {extension}")
+    return _read_and_cache_rows(path, cache_path)
+
+
+# Функция для доступа к строкам входного файла по номеру (с 0), например для выборки по id при исправлении ошибок.
+# Для txt с разделителем "#" - индекс смещений и mmap (читаются только нужные строки),
+# для остальных форматов - список строк, прочитанный через колоночный кэш.
+def open_row_lookup(path, use_cache=True):
+    if os.path.splitext(path)[1].lower() == ".txt":
+        return IndexedTxtRows(path)
+    return list(open_input_rows(path, use_cache=use_cache))
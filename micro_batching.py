@@ -0,0 +1,80 @@
+import re
+
+# Инструкция, которая добавляется к системному промпту в режиме пакетной отправки вопросов
+BATCH_INSTRUCTIONS = """
+
+**Пакетный режим:**
+В сообщении пользователя несколько вопросов, каждый начинается со строки вида «=== ВОПРОС id=N ===».
+Обработай каждый вопрос отдельно по формату ответа выше и оберни HTML-блок каждого вопроса маркерами с тем же id:
+<!-- QNA id=N -->
+<div>...</div>
+<!-- /QNA -->
+Не пропускай вопросы, не объединяй их и не добавляй текст вне маркеров."""
+
+# Блок ответа на один вопрос пакета
+BATCH_BLOCK_RE = re.compile(r"<!--\s*QNA\s+id=(\d+)\s*-->(.*?)<!--\s*/QNA\s*-->", re.DOTALL)
+
+# Максимум выходных токенов на пакетный запрос (ограничение модели на длину ответа)
+MAX_BATCH_OUTPUT_TOKENS = 16_000
+
+# Бюджет входных токенов вопросов в одном пакете (без системного промпта)
+DEFAULT_BATCH_TOKEN_BUDGET = 6_000
+
+
+# Функция для системного промпта пакетного режима
+def build_batch_prompt(prompt_template):
+    return prompt_template + BATCH_INSTRUCTIONS
+
+
+# Функция для заголовка вопроса внутри пакета
+def question_header(row_id):
+    return f"=== ВОПРОС id={row_id} ==="
+
+
+# Функция для текста пакетного запроса: entries - список (id, текст запроса)
+def build_batch_input(entries):
+    return "\n\n".join(f"{question_header(row_id)}\n{input_text}" for row_id, input_text in entries)
+
+
+# Функция для раскладки элементов по пакетам с сохранением порядка.
+# В пакете не больше batch_size элементов, сумма их токенов (tokens_of) не больше token_budget,
+# а суммарный резерв ответа (output_tokens_per_item на вопрос) не больше max_output_tokens.
+# Элемент, который один превышает бюджет, уходит отдельным пакетом.
+def pack_batches(items, tokens_of, batch_size, token_budget=DEFAULT_BATCH_TOKEN_BUDGET,
+                 output_tokens_per_item=1500, max_output_tokens=MAX_BATCH_OUTPUT_TOKENS):
+    batch_size = max(1, min(batch_size, max_output_tokens // max(1, output_tokens_per_item)))
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for item in items:
+        tokens = tokens_of(item)
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > token_budget):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(item)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+# Функция для разбиения ответа модели на блоки: {id: HTML блока}. При повторе id берётся первый блок.
+def split_batch_response(model_response):
+    blocks = {}
+    for match in BATCH_BLOCK_RE.finditer(model_response):
+        blocks.setdefault(int(match.group(1)), match.group(2).strip())
+    return blocks
+
+
+# Функция для распределения токенов пакетного запроса по вопросам пропорционально весам (сумма сохраняется)
+def split_tokens(total, weights):
+    weight_sum = sum(weights)
+    if not weights:
+        return []
+    if weight_sum <= 0:
+        weights = [1] * len(weights)
+        weight_sum = len(weights)
+    shares = [total * weight // weight_sum for weight in weights]
+    shares[0] += total - sum(shares)
+    return shares
@@ -0,0 +1,100 @@
+# Маршрутизация вопросов по моделям с учётом цены.
+# Вопрос с небольшим числом входных токенов сначала отправляется в дешёвую модель; если её ответ не прошёл
+# проверку (разделы ответа, категория), вопрос повторяется на основной модели.
+# Итоговый отчёт сравнивает стоимость каждого маршрута с отправкой тех же вопросов сразу в основную модель.
+from token_accounting import TokenUsage
+
+# Цены моделей в долларах за 1M токенов: (входные, выходные)
+MODEL_PRICES = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+
+# Маршруты по умолчанию: (максимум входных токенов вопроса, модель), проверяются по порядку
+DEFAULT_ROUTES = [(1000, "gpt-4o-mini")]
+
+
+# Функция для цен модели за 1M токенов (входные, выходные)
+def model_prices(model):
+    if model not in MODEL_PRICES:
+        raise ValueError(f"Нет цены для модели {model} - добавьте её в MODEL_PRICES")
+    return MODEL_PRICES[model]
+
+
+# Функция для стоимости запроса в долларах (price_factor - например, скидка Batch API)
+def model_cost(model, input_tokens, output_tokens, price_factor=1.0):
+    input_price, output_price = model_prices(model)
+    return (input_tokens * input_price + output_tokens * output_price) * price_factor / 1_000_000
+
+
+# Функция для разбора маршрута из командной строки: "gpt-4o-mini:1000" -> (1000, "gpt-4o-mini")
+def parse_route(text):
+    model, _, max_tokens = text.rpartition(":")
+    if not model or not max_tokens.isdigit():
+        raise ValueError(f"Маршрут задаётся как МОДЕЛЬ:МАКС_ТОКЕНОВ, получено: {text}")
+    model_prices(model)
+    return int(max_tokens), model
+
+
+# Функция для выбора первой модели вопроса по числу его входных токенов
+def choose_model(input_tokens, routes, default_model):
+    for max_tokens, model in routes:
+        if input_tokens <= max_tokens:
+            return model
+    return default_model
+
+
+# Функция для описания маршрутов (для отпечатка настроек обработки и вывода)
+def describe_routes(routes, default_model):
+    parts = [f"до {max_tokens} токенов -> {model}" for max_tokens, model in routes]
+    return ", ".join(parts + [f"иначе {default_model}"])
+
+
+# Учёт маршрутизации за запуск: токены и стоимость по моделям, а по маршрутам (первой модели вопроса) -
+# число вопросов, эскалаций на основную модель и стоимость в сравнении с отправкой сразу в основную модель.
+class RoutingStats:
+    def __init__(self, default_model, price_factor=1.0):
+        self.default_model = default_model
+        self.price_factor = price_factor
+        self.usage = {}  # модель -> TokenUsage
+        self.routes = {}  # первая модель -> {"rows", "escalated", "cost", "baseline_cost"}
+
+    # Функция для учёта запросов вопроса (или пакета вопросов): attempts - список
+    # (модель, входные токены, выходные токены, оценка ли) по попыткам, rows - сколько вопросов они покрывают
+    # (0 - повтор вопроса, уже учтённого в пакете). Эскалация - попытка в модели, отличной от route
+    # (после ответа, не прошедшего проверку).
+    def record_row(self, route, attempts, rows=1):
+        stats = self.routes.setdefault(route, {"rows": 0, "escalated": 0, "cost": 0.0, "baseline_cost": 0.0})
+        stats["rows"] += rows
+        if any(model != route for model, _, _, _ in attempts):
+            stats["escalated"] += 1
+        for model, input_tokens, output_tokens, estimated in attempts:
+            self.usage.setdefault(model, TokenUsage()).add(input_tokens, output_tokens, estimated=estimated)
+            stats["cost"] += model_cost(model, input_tokens, output_tokens, self.price_factor)
+        # Без маршрутизации остались бы только запросы к основной модели; если их не было,
+        # первый запрос ушёл бы в основную модель с теми же токенами (в том числе повтор вопроса из пакета)
+        default_attempts = [attempt for attempt in attempts if attempt[0] == self.default_model]
+        if not default_attempts:
+            default_attempts = attempts[:1]
+        for _, input_tokens, output_tokens, _ in default_attempts:
+            stats["baseline_cost"] += model_cost(self.default_model, input_tokens, output_tokens, self.price_factor)
+
+    # Стоимость всех запросов в долларах
+    def cost(self):
+        return sum(stats["cost"] for stats in self.routes.values())
+
+    def report(self):
+        lines = ["Маршрутизация по моделям:"]
+        for route, stats in sorted(self.routes.items()):
+            saved = stats["baseline_cost"] - stats["cost"]
+            share = saved / stats["baseline_cost"] * 100 if stats["baseline_cost"] else 0.0
+            lines.append(f"  {route}: вопросов {stats['rows']}, эскалаций {stats['escalated']}, "
+                         f"стоимость ${stats['cost']:.4f}, сразу в {self.default_model} ${stats['baseline_cost']:.4f}, "
+                         f"экономия ${saved:.4f} ({share:.1f}%)")
+        for model, usage in sorted(self.usage.items()):
+            lines.append(f"  {model}: запросов {usage.requests}, токенов {usage.total_tokens}, "
+                         f"${usage.cost(*model_prices(model)) * self.price_factor:.4f}")
+        return "\n".join(lines)
@@ -0,0 +1,141 @@
+# Схлопывание почти одинаковых вопросов перед отправкой в модель (MinHash + LSH по шинглам текста вопроса).
+# Каждая строка сравнивается только с представителями кластеров, попавшими с ней в одну LSH-корзину,
+# поэтому время растёт почти линейно с числом строк, а не квадратично.
+# Проверка на файле: python near_duplicates.py "Формат передачи_100.txt" [--threshold 0.8] [--report dedup.csv]
+import argparse
+import csv
+import re
+import zlib
+
+import numpy as np
+
+# Порог сходства (коэффициент Жаккара по шинглам), начиная с которого вопросы считаются дубликатами
+DEFAULT_SIMILARITY_THRESHOLD = 0.8
+
+# Число хэш-функций MinHash
+DEFAULT_NUM_PERM = 128
+
+# Длина шингла в словах
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+# Функция для множества хэшей шинглов вопроса (слова в нижнем регистре, ё -> е)
+def shingle_hashes(text, shingle_size=SHINGLE_SIZE):
+    words = re.findall(r"\w+", str(text).lower().replace("ё", "е"))
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[start:start + shingle_size]) for start in range(len(words) - shingle_size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                                 dtype=np.uint64, count=len(shingles)))
+
+
+# Функция для коэффициента Жаккара двух отсортированных множеств хэшей
+def jaccard(first, second):
+    common = np.intersect1d(first, second, assume_unique=True).size
+    return common / (first.size + second.size - common)
+
+
+# Функция для параметров LSH (число полос, строк в полосе), минимизирующих сумму ложных срабатываний
+# и пропусков вокруг порога (как в datasketch, численным интегрированием)
+def lsh_params(threshold, num_perm=DEFAULT_NUM_PERM):
+    points = [step / 200 for step in range(201)]
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        probabilities = [1 - (1 - similarity ** rows) ** bands for similarity in points]
+        false_positive = sum(p for s, p in zip(points, probabilities) if s < threshold)
+        false_negative = sum(1 - p for s, p in zip(points, probabilities) if s >= threshold)
+        error = false_positive + false_negative
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+# Кластеризация по лидеру: строка присоединяется к самому похожему представителю из общих LSH-корзин,
+# если сходство не ниже threshold, иначе сама становится представителем. Представитель - первая строка кластера,
+# и каждая строка кластера похожа именно на него (без цепочек через промежуточные строки).
+# texts - тексты вопросов по порядку; возвращает (позиция представителя, сходство с ним) для каждой строки.
+def cluster_texts(texts, threshold=DEFAULT_SIMILARITY_THRESHOLD, num_perm=DEFAULT_NUM_PERM, seed=1):
+    bands, rows_per_band = lsh_params(threshold, num_perm)
+    generator = np.random.default_rng(seed)
+    perm_a = generator.integers(1, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+    perm_b = generator.integers(0, 1 << 32, size=num_perm, dtype=np.uint64)[:, None]
+    buckets = [{} for _ in range(bands)]
+    leader_shingles = {}
+    assignments = []
+    for position, text in enumerate(texts):
+        shingles = shingle_hashes(text) if text is not None else np.empty(0, dtype=np.uint64)
+        if shingles.size == 0:
+            assignments.append((position, 1.0))  # Пустой вопрос не объединяется с другими
+            continue
+        signature = (((perm_a * shingles[None, :] + perm_b) % _MERSENNE_PRIME) & _MAX_HASH).min(axis=1)
+        keys = [signature[band * rows_per_band:(band + 1) * rows_per_band].tobytes() for band in range(bands)]
+        best, best_similarity = None, 0.0
+        checked = set()
+        for band, key in enumerate(keys):
+            for leader in buckets[band].get(key, ()):
+                if leader in checked:
+                    continue
+                checked.add(leader)
+                similarity = jaccard(shingles, leader_shingles[leader])
+                if similarity >= threshold and similarity > best_similarity:
+                    best, best_similarity = leader, similarity
+        if best is None:
+            leader_shingles[position] = shingles
+            for band, key in enumerate(keys):
+                buckets[band].setdefault(key, []).append(position)
+            assignments.append((position, 1.0))
+        else:
+            assignments.append((best, best_similarity))
+    return assignments
+
+
+# Функция для поиска дубликатов среди строк: rows - список (id, вопрос).
+# Возвращает {id дубликата: (id представителя, сходство)}; представители и уникальные строки в словарь не входят.
+def find_near_duplicates(rows, threshold=DEFAULT_SIMILARITY_THRESHOLD, num_perm=DEFAULT_NUM_PERM):
+    ids = [row_id for row_id, _ in rows]
+    assignments = cluster_texts([question for _, question in rows], threshold, num_perm)
+    return {ids[position]: (ids[leader], similarity)
+            for position, (leader, similarity) in enumerate(assignments) if leader != position}
+
+
+# Функция для отчёта о схлопнутых вопросах (CSV): кластер (id представителя), id, сходство, вопрос.
+# Представитель идёт первой строкой кластера со сходством 1.
+def write_dedup_report(path, duplicates, questions):
+    clusters = {}
+    for row_id, (representative_id, similarity) in sorted(duplicates.items()):
+        clusters.setdefault(representative_id, []).append((row_id, similarity))
+    with open(path, "w", encoding="utf-8-sig", newline="") as report_file:
+        writer = csv.writer(report_file)
+        writer.writerow(["кластер", "id", "сходство", "вопрос"])
+        for representative_id in sorted(clusters):
+            writer.writerow([representative_id, representative_id, "1.000", questions.get(representative_id)])
+            for row_id, similarity in clusters[representative_id]:
+                writer.writerow([representative_id, row_id, f"{similarity:.3f}", questions.get(row_id)])
+
+
+def main():
+    from input_readers import read_input_rows
+
+    parser = argparse.ArgumentParser(description="Поиск почти одинаковых вопросов (MinHash + LSH)")
+    parser.add_argument("input", help="входной файл")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_SIMILARITY_THRESHOLD, help="порог сходства")
+    parser.add_argument("--report", default="dedup_report.csv", help="файл отчёта (CSV)")
+    args = parser.parse_args()
+
+    rows = [(row_id, question) for row_id, (question, _) in enumerate(read_input_rows(args.input), start=1)]
+    duplicates = find_near_duplicates(rows, args.threshold)
+    write_dedup_report(args.report, duplicates, dict(rows))
+    print(f"Строк: {len(rows)}, дубликатов: {len(duplicates)} "
+          f"({len(duplicates) / max(1, len(rows)) * 100:.1f}%), кластеров: {len(set(r for r, _ in duplicates.values()))}")
+    print(f"Отчёт: {args.report}")
+
+
+if __name__ == "__main__":
+    main()
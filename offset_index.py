@@ -0,0 +1,165 @@
+# Индекс смещений строк для txt-файлов с разделителем "#" (формат Формат передачи_100.txt).
+# Рядом с файлом сохраняется <файл>.idx: смещения начала каждой записи в байтах.
+# Строки читаются из файла, отображённого в память (mmap), - выборка по id не требует разбора всего файла.
+# Проверка: python offset_index.py "Формат передачи_100.txt" 5 17 42
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import sys
+from array import array
+
+# Сигнатура формата файла индекса
+INDEX_MAGIC = b"QNAIDX1\n"
+
+# Суффикс файла индекса
+INDEX_SUFFIX = ".idx"
+
+
+# Функция для SHA-256 содержимого файла (читается блоками)
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source_file:
+        for block in iter(lambda: source_file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Функция для смещений записей в data (bytes или mmap): начало каждой непустой записи и конец файла последним элементом.
+# Строки подаются в csv.reader по одной, поэтому поле в кавычках с переводом строки остаётся одной записью,
+# а пустые записи пропускаются так же, как в read_txt_rows.
+def _record_offsets(data):
+    offsets = array("Q")
+    line_starts = []
+    position = 0
+
+    def lines():
+        nonlocal position
+        while position < len(data):
+            end = data.find(b"\n", position)
+            end = len(data) if end == -1 else end + 1
+            line_starts.append(position)
+            chunk = data[position:end]
+            position = end
+            yield chunk.decode("utf-8")
+
+    consumed = 0
+    for row in csv.reader(lines(), delimiter="#"):
+        start = line_starts[consumed]
+        consumed = len(line_starts)
+        if row:
+            offsets.append(start)
+    offsets.append(len(data))
+    return offsets
+
+
+# Функция для построения индекса и записи его в файл (через временный файл)
+def build_offset_index(path, index_path=None):
+    index_path = index_path or path + INDEX_SUFFIX
+    stat = os.stat(path)
+    with open(path, "rb") as source_file:
+        # Файл отображается в память, а не читается целиком (mmap не работает с файлом нулевой длины)
+        data = mmap.mmap(source_file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+        try:
+            offsets = _record_offsets(data)
+            sha256 = hashlib.sha256(data).hexdigest()
+        finally:
+            if isinstance(data, mmap.mmap):
+                data.close()
+    header = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256, "rows": len(offsets) - 1}
+    _write_index(index_path, header, offsets)
+    return header, offsets
+
+
+def _write_index(index_path, header, offsets):
+    temp_path = index_path + ".tmp"
+    with open(temp_path, "wb") as index_file:
+        index_file.write(INDEX_MAGIC)
+        index_file.write(json.dumps(header).encode("utf-8") + b"\n")
+        offsets.tofile(index_file)
+    os.replace(temp_path, index_path)
+
+
+# Функция для чтения индекса: (заголовок, смещения) или None, если файла нет или он повреждён
+def _read_index(index_path):
+    try:
+        with open(index_path, "rb") as index_file:
+            if index_file.read(len(INDEX_MAGIC)) != INDEX_MAGIC:
+                return None
+            header = json.loads(index_file.readline())
+            offsets = array("Q")
+            offsets.frombytes(index_file.read())
+    except (OSError, ValueError):
+        return None
+    if len(offsets) != header.get("rows", -1) + 1:
+        return None
+    return header, offsets
+
+
+# Функция для загрузки индекса с проверкой актуальности.
+# Если размер и время изменения файла совпадают с записанными - индекс используется сразу.
+# Если изменилось только время (содержимое с тем же хэшем) - обновляется заголовок, иначе индекс строится заново.
+def load_offset_index(path, index_path=None):
+    index_path = index_path or path + INDEX_SUFFIX
+    stored = _read_index(index_path)
+    stat = os.stat(path)
+    if stored is not None:
+        header, offsets = stored
+        if header["size"] == stat.st_size and header["mtime_ns"] == stat.st_mtime_ns:
+            return offsets
+        if header["size"] == stat.st_size and header["sha256"] == file_sha256(path):
+            header["mtime_ns"] = stat.st_mtime_ns
+            _write_index(index_path, header, offsets)
+            return offsets
+    return build_offset_index(path, index_path)[1]
+
+
+# Доступ к записям txt-файла по номеру (с 0) через индекс смещений и mmap.
+# Возвращает кортежи (вопрос, [ответы]) - как read_txt_rows.
+class IndexedTxtRows:
+    def __init__(self, path, index_path=None):
+        self.path = path
+        self.offsets = load_offset_index(path, index_path)
+        self.file = open(path, "rb")
+        # mmap не работает с файлом нулевой длины
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.offsets[-1] else b""
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row_number):
+        if row_number < 0:
+            row_number += len(self)
+        if not 0 <= row_number < len(self):
+            raise IndexError(row_number)
+        text = self.data[self.offsets[row_number]:self.offsets[row_number + 1]].decode("utf-8")
+        row = next(csv.reader(io.StringIO(text, newline=""), delimiter="#"))
+        return row[0], row[1:]
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Выборочная проверка: вывод записей по id (нумерация с 1, как в итоговых файлах)
+def main():
+    if len(sys.argv) < 3:
+        print('Использование: python offset_index.py "файл.txt" id [id ...]')
+        return
+    with IndexedTxtRows(sys.argv[1]) as rows:
+        for row_id in map(int, sys.argv[2:]):
+            question, answers = rows[row_id - 1]
+            print(f"{row_id}: {question[:200]} ({len(answers)} ответов)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import csv
+import json
+import os
+
+# Колонки итоговых данных
+OUTPUT_COLUMNS = ["id", "переформулированный вопрос", "ответ", "категория"]
+
+
+# Запись строк в JSONL: одна строка - один JSON-объект, добавление за O(1)
+class JsonlSink:
+    def __init__(self, path, append=False):
+        self.path = path
+        self.file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(dict(zip(OUTPUT_COLUMNS, row)), ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# Запись строк в CSV, заголовок пишется только в новый файл
+class CsvSink:
+    def __init__(self, path, append=False):
+        self.path = path
+        write_header = not (append and os.path.exists(path) and os.path.getsize(path) > 0)
+        self.file = open(path, "a" if append else "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file)
+        if write_header:
+            self.writer.writerow(OUTPUT_COLUMNS)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+# Запись строк в Parquet: строки копятся в буфере и сбрасываются группами по row_group_size.
+# Parquet нельзя дописывать на месте, поэтому при append существующие данные один раз
+# переносятся во временный файл, который в конце заменяет исходный.
+class ParquetSink:
+    def __init__(self, path, append=False, row_group_size=1000):
+        import pyarrow as pa  # Установить: pip install pyarrow
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.path = path
+        self.row_group_size = row_group_size
+        self.buffer = []
+        self.schema = pa.schema([("id", pa.int64())] + [(name, pa.string()) for name in OUTPUT_COLUMNS[1:]])
+        self.temp_path = path + ".tmp"
+        self.writer = pq.ParquetWriter(self.temp_path, self.schema)
+        if append and os.path.exists(path):
+            self.writer.write_table(pq.read_table(path).cast(self.schema))
+
+    def write_rows(self, rows):
+        self.buffer.extend(rows)
+        if len(self.buffer) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        columns = list(zip(*self.buffer))
+        arrays = [self.pa.array([int(value) for value in columns[0]], self.pa.int64())]
+        arrays += [self.pa.array([str(value) for value in column], self.pa.string()) for column in columns[1:]]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.buffer.clear()
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+        os.replace(self.temp_path, self.path)
+
+
+# Sink без записи - когда результаты берутся только из журнала (например, журнала шарда очереди)
+class NullSink:
+    def write_rows(self, rows):
+        pass
+
+    def close(self):
+        pass
+
+
+SINKS = {".jsonl": JsonlSink, ".csv": CsvSink, ".parquet": ParquetSink}
+
+
+# Функция для открытия приёмника результатов по расширению файла
+def open_sink(path, append=False):
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in SINKS:
+        raise ValueError(f"Неподдерживаемый формат вывода: {extension} (доступны: {', '.join(SINKS)})")
+    return SINKS[extension](path, append=append)
+
+
+# Функция для пересборки файла результатов из rows (например, из журнала - по одной строке на id):
+# строки пишутся во временный файл того же формата, который затем заменяет исходный
+def rewrite_sink(path, rows):
+    base, extension = os.path.splitext(path)
+    temp_path = f"{base}.rewrite{extension}"
+    sink = open_sink(temp_path)
+    try:
+        sink.write_rows(rows)
+    finally:
+        sink.close()
+    os.replace(temp_path, path)
+
+
+# Функция для однократной выгрузки строк в XLSX потоковой (write-only) книгой openpyxl
+def export_to_xlsx(rows, file_name):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    sheet.append(OUTPUT_COLUMNS)
+    for row in rows:
+        sheet.append(list(row))
+    workbook.save(file_name)
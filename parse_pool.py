@@ -0,0 +1,112 @@
+# Разбор ответов модели в пуле процессов: разбор HTML и проверка ответа не занимают поток,
+# который отправляет запросы и принимает ответы.
+# Ответы копятся в порции (chunk_size ответов или chunk_delay секунд) и уходят в пул одной задачей -
+# так затраты на передачу между процессами делятся на всю порцию.
+# Одновременно в пуле не больше max_pending_chunks порций. Если разбор отстаёт от сети, корутины запросов
+# ждут своего результата и не берут новые вопросы, поэтому в памяти не больше max_in_flight ответов
+# плюс max_pending_chunks * chunk_size ответов в пуле.
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from html_response_parser import parse_html_response
+from response_validation import validate_response
+
+# Число процессов разбора по умолчанию (одно ядро остаётся за циклом запросов)
+DEFAULT_PARSE_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+
+# Ответов в одной порции
+DEFAULT_CHUNK_SIZE = 32
+
+# Сколько ждать заполнения порции, прежде чем отправить неполную (секунды)
+DEFAULT_CHUNK_DELAY = 0.005
+
+
+# Функция для разбора и проверки порции ответов (выполняется в процессе пула).
+# check_category - по каждому ответу, проверять ли категорию (None - проверять у всех).
+# Возвращает список (разобранный ответ, тип ошибки проверки или None).
+def parse_and_validate(texts, categories, check_category=None):
+    results = []
+    for position, text in enumerate(texts):
+        parsed = parse_html_response(text)
+        check = check_category is None or check_category[position]
+        results.append((parsed, validate_response(parsed, categories if check else None)))
+    return results
+
+
+# Пул разбора ответов. При workers = 0 ответы разбираются в текущем процессе (без пула).
+# categories - словарь категорий для проверки (None - категория не проверяется).
+class ParsePool:
+    def __init__(self, categories, workers=DEFAULT_PARSE_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE,
+                 chunk_delay=DEFAULT_CHUNK_DELAY, max_pending_chunks=None):
+        self.categories = categories
+        self.chunk_size = max(1, chunk_size)
+        self.chunk_delay = chunk_delay
+        self.max_pending_chunks = max_pending_chunks or 2 * max(1, workers)
+        self.executor = ProcessPoolExecutor(workers) if workers > 0 else None
+        self.buffer = []
+        self.slots = None
+        self.flush_timer = None
+        self.flush_tasks = set()
+
+    # Функция для разбора одного ответа: (разобранный ответ, тип ошибки или None).
+    # check_category=False - ответ без блока категории (категория определена локально).
+    async def parse(self, text, check_category=True):
+        if self.executor is None:
+            return parse_and_validate([text], self.categories, [check_category])[0]
+        loop = asyncio.get_running_loop()
+        if self.slots is None:
+            self.slots = asyncio.Semaphore(self.max_pending_chunks)
+        future = loop.create_future()
+        self.buffer.append((text, check_category, future))
+        if len(self.buffer) >= self.chunk_size:
+            await self._flush()
+        elif self.flush_timer is None:
+            self.flush_timer = loop.call_later(self.chunk_delay, self._flush_by_timer)
+        return await future
+
+    def _flush_by_timer(self):
+        self.flush_timer = None
+        task = asyncio.ensure_future(self._flush())
+        self.flush_tasks.add(task)
+        task.add_done_callback(self.flush_tasks.discard)
+
+    # Функция для отправки порции в пул; ждёт, пока в пуле освободится место (обратное давление)
+    async def _flush(self):
+        await self.slots.acquire()
+        chunk, self.buffer = self.buffer[:self.chunk_size], self.buffer[self.chunk_size:]
+        if not chunk:
+            self.slots.release()
+            return
+        loop = asyncio.get_running_loop()
+        pool_future = loop.run_in_executor(self.executor, parse_and_validate,
+                                           [text for text, _, _ in chunk], self.categories,
+                                           [check for _, check, _ in chunk])
+        pool_future.add_done_callback(lambda done: self._deliver(chunk, done))
+        if self.buffer and self.flush_timer is None:
+            self.flush_timer = loop.call_later(self.chunk_delay, self._flush_by_timer)
+
+    def _deliver(self, chunk, done):
+        self.slots.release()
+        error = done.exception()
+        results = done.result() if error is None else [None] * len(chunk)
+        for (_, _, future), result in zip(chunk, results):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
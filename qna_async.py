@@ -0,0 +1,176 @@
+import asyncio
+import time
+
+import openai
+
+from rate_limiter import retry_after_from_error
+from streaming import StreamMonitor, STOP_OFF_FORMAT
+from token_accounting import usage_from_response
+
+# Число одновременных запросов к OpenAI по умолчанию
+DEFAULT_MAX_IN_FLIGHT = 16
+
+
+# Функция для асинхронной обработки элементов с ограниченным окном одновременных запросов.
+# worker - корутина, обрабатывающая один элемент.
+# on_done вызывается по мере завершения (порядок произвольный) - для прогресс-бара и подсчёта стоимости.
+# on_ordered вызывается строго в порядке входных данных - для сохранения результатов партиями.
+# order - позиции элементов в порядке запуска (например, самые долгие первыми); по умолчанию - порядок входа.
+# Возвращает список результатов в порядке входных данных.
+async def run_in_order(items, worker, max_in_flight=DEFAULT_MAX_IN_FLIGHT, on_done=None, on_ordered=None,
+                       order=None):
+    items = list(items)
+    results = [None] * len(items)
+    finished = [False] * len(items)
+    next_ordered = 0
+    pending = iter(enumerate(items)) if order is None else ((position, items[position]) for position in order)
+
+    def release_ordered():
+        nonlocal next_ordered
+        while next_ordered < len(items) and finished[next_ordered]:
+            if on_ordered is not None:
+                on_ordered(next_ordered, results[next_ordered])
+            next_ordered += 1
+
+    async def consume():
+        # Общий итератор: каждый из max_in_flight обработчиков забирает следующий элемент,
+        # поэтому одновременно выполняется не больше max_in_flight запросов
+        for position, item in pending:
+            result = await worker(item)
+            results[position] = result
+            finished[position] = True
+            if on_done is not None:
+                on_done(position, result)
+            release_ordered()
+
+    window = max(1, min(max_in_flight, len(items)))
+    await asyncio.gather(*(consume() for _ in range(window)))
+    return results
+
+
+# Максимальное число повторов запроса после ответа 429
+MAX_RATE_LIMIT_RETRIES = 8
+
+
+# Функция для запроса chat/completions так же, как openai.ChatCompletion.acreate, но вместе с заголовками ответа:
+# acreate в openai==0.28 их отбрасывает, а по x-ratelimit-remaining-* ограничитель скорости замедляется заранее.
+# Возвращает (ответ, заголовки); при stream=True ответ - асинхронный генератор фрагментов, заголовки - None
+# (они приходят с каждым фрагментом, см. stream_model_completion).
+async def create_chat_completion(**params):
+    requestor = openai.api_requestor.APIRequestor()
+    stream = params.get("stream", False)
+    response, _, api_key = await requestor.arequest("post", "/chat/completions", params=params, stream=stream)
+    if stream:
+        return response, None
+    return openai.util.convert_to_openai_object(response, api_key), response_headers(response)
+
+
+# Функция для заголовков ответа OpenAIResponse (в openai==0.28 у него нет публичного свойства для них)
+def response_headers(response):
+    return getattr(response, "_headers", None)
+
+
+# Функция для потокового запроса к OpenAI: ответ читается по мере генерации и проверяется StreamMonitor,
+# поток закрывается, как только монитор вернул причину остановки.
+# Возвращает (текст ответа, usage, время до первого фрагмента в секундах, причина остановки или None,
+# заголовки ответа).
+async def stream_model_completion(messages, model, max_tokens, temperature):
+    started = time.perf_counter()
+    chunks, _ = await create_chat_completion(
+        model=model,
+        messages=messages,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
+        stream_options={"include_usage": True}  # usage приходит последним фрагментом, если поток дочитан
+    )
+    monitor = StreamMonitor()
+    ttfb = None
+    usage = None
+    stop_reason = None
+    headers = None
+    try:
+        async for line in chunks:
+            headers = headers or response_headers(line)
+            chunk = openai.util.convert_to_openai_object(line)
+            usage = usage_from_response(chunk) or usage
+            choices = chunk.get("choices") or []
+            delta = choices[0].get("delta", {}).get("content") if choices else None
+            if not delta:
+                continue
+            if ttfb is None:
+                ttfb = time.perf_counter() - started
+            stop_reason = monitor.feed(delta)
+            if stop_reason is not None:
+                break
+    finally:
+        await chunks.aclose()
+    return monitor.text.strip(), usage, ttfb, stop_reason, headers
+
+
+# Функция для асинхронного запроса к OpenAI, возвращает (текст ответа модели, usage, причина остановки).
+# usage - фактические (входные, выходные) токены из ответа API или None, если API их не вернул.
+# Причина остановки - STOP_COMPLETE / STOP_OFF_FORMAT для потока, остановленного StreamMonitor, иначе None.
+# Если передан rate_limiter, запрос ждёт бюджета (reserved_tokens = входные токены + max_tokens),
+# а при ответе 429 скорость снижается и запрос повторяется; заголовки x-ratelimit-* каждого ответа
+# передаются ограничителю (observe_headers), чтобы он замедлялся до 429.
+# Если передан stream_stats (StreamStats), ответ запрашивается потоком с ранней остановкой,
+# а время до первого фрагмента и сэкономленные токены записываются в stream_stats.
+async def request_model_completion(prompt_template, input_text, model, max_tokens=1500, temperature=0.7,
+                                   rate_limiter=None, reserved_tokens=0, stream_stats=None):
+    messages = [{"role": "system", "content": prompt_template},
+                {"role": "user", "content": input_text}]
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        if rate_limiter is not None:
+            await rate_limiter.acquire(reserved_tokens)
+        try:
+            if stream_stats is not None:
+                model_response, usage, ttfb, stop_reason, headers = await stream_model_completion(
+                    messages, model, max_tokens, temperature)
+            else:
+                response, headers = await create_chat_completion(
+                    model=model,
+                    messages=messages,
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
+        except openai.error.RateLimitError as e:
+            if rate_limiter is None or attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            rate_limiter.on_rate_limited(retry_after_from_error(e))
+            continue
+        if rate_limiter is not None:
+            rate_limiter.on_success()
+            rate_limiter.observe_headers(headers)
+        if stream_stats is not None:
+            stream_stats.record(model_response, usage, ttfb, stop_reason, max_tokens)
+            return model_response, usage, stop_reason
+        return response['choices'][0]['message']['content'].strip(), usage_from_response(response), None
+
+
+# Функция для асинхронного запроса к OpenAI, возвращает текст ответа модели
+async def request_model_response(prompt_template, input_text, model, **request_options):
+    model_response, _, _ = await request_model_completion(prompt_template, input_text, model, **request_options)
+    return model_response
+
+
+# Функция для запроса с учётом локального кэша ответов.
+# Ответ из кэша используется, если он проходит проверку accept (например, содержит корректную категорию),
+# иначе запрос отправляется заново и кэш перезаписывается.
+# Возвращает (текст ответа, взят_ли_ответ_из_кэша, usage); для ответа из кэша usage = (0, 0).
+# cache_max_tokens - max_tokens для ключа кэша, если max_tokens запроса уменьшен по длине ожидаемого ответа:
+# полный ответ не зависит от лимита, а ответ, упёршийся в уменьшенный лимит, в кэш не записывается.
+# Поток, прерванный из-за ответа не по шаблону (STOP_OFF_FORMAT), тоже не кэшируется - это не полный ответ.
+async def request_cached_model_response(prompt_template, input_text, model, max_tokens=1500, temperature=0.7,
+                                        cache=None, accept=None, cache_max_tokens=None, **request_options):
+    cache_tokens = cache_max_tokens or max_tokens
+    if cache is not None:
+        cached = cache.get(model, prompt_template, input_text, temperature, cache_tokens)
+        if cached is not None and (accept is None or accept(cached)):
+            return cached, True, (0, 0)
+    model_response, usage, stop_reason = await request_model_completion(
+        prompt_template, input_text, model, max_tokens=max_tokens, temperature=temperature, **request_options)
+    truncated = max_tokens < cache_tokens and usage is not None and usage[1] >= max_tokens
+    if cache is not None and not truncated and stop_reason != STOP_OFF_FORMAT:
+        cache.put(model, prompt_template, input_text, temperature, cache_tokens, model_response)
+    return model_response, False, usage
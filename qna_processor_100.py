@@ -1,8 +1,10 @@
 # pip install openai==0.28
 # pip install tiktoken
+import asyncio
 import openai
 import csv
 import tiktoken
+from qna_async import run_in_order, request_model_response
 from bs4 import BeautifulSoup  # Установить: pip install beautifulsoup4
 
 # API-ключ OpenAI
@@ -16,6 +18,9 @@ prompt_file_name = "Промпт3_html2.txt"  # Файл с промптом
 input_file_name = "Формат передачи.txt"  # Файл с входными данными
 output_file_name = "Processed_QnA3_html2.csv"  # Имя итогового CSV-файла
 
+# Число одновременных запросов к OpenAI
+max_in_flight = 16
+
 # Цены для модели gpt-4o
 INPUT_COST_PER_M = 2.50  # для 1M входящих токенов
 OUTPUT_COST_PER_M = 10.00  # для 1M выходящих токенов
@@ -73,12 +78,14 @@ def parse_html_response(html_response):
         return "Ошибка при разборе вопроса", "Ошибка при разборе ответа"
 
 # Функция для обработки вопросов и ответов через OpenAI
-def process_qna_with_ai(prompt_template, input_data):
+# Запросы выполняются асинхронно, одновременно в работе не больше max_in_flight вопросов
+def process_qna_with_ai(prompt_template, input_data, max_in_flight=max_in_flight):
     total_tokens = 0  # Итоговая сумма токенов
     total_cost = 0  # Итоговая стоимость
-    results = []
+    rows = list(enumerate(input_data, start=1))  # Добавляем индекс для отслеживания номера вопроса
 
-    for idx, row in enumerate(input_data, start=1):  # Добавляем индекс для отслеживания номера вопроса
+    async def process_row(item):
+        idx, row = item
         question = row[0]  # Извлекаем вопрос
         answers = row[1:]  # Извлекаем ответы
         # Формируем текст для отправки в OpenAI
@@ -89,43 +96,43 @@ def process_qna_with_ai(prompt_template, input_data):
 
         try:
             # Отправляем запрос к OpenAI
-            response = openai.ChatCompletion.create(
-                model=model_name,
-                messages=[
-                    {"role": "system", "content": prompt_template},
-                    {"role": "user", "content": input_text}
-                ],
-                max_tokens=1500,  # Устанавливаем лимит токенов
-                temperature=0.7  # Настраиваем креативность модели
-            )
-            # Получаем ответ модели
-            model_response = response['choices'][0]['message']['content'].strip()
+            model_response = await request_model_response(prompt_template, input_text, model_name)
 
             # Подсчитываем выходящие токены
             output_tokens = count_tokens(model_response, model=model_name)
 
-            # Обновляем итоговую сумму токенов
-            total_tokens += input_tokens + output_tokens
-
-            # Рассчитываем стоимость для входящих и выходящих токенов
-            input_cost = calculate_cost(input_tokens, input=True)
-            output_cost = calculate_cost(output_tokens, input=False)
-            total_cost += input_cost + output_cost
-
             # Разбираем HTML-ответ
             reformulated_question, answer = parse_html_response(model_response)
-
-            # Сохраняем результат
-            results.append([idx, reformulated_question, answer])
-
-            # Выводим токены и стоимость после обработки каждого вопроса
-            print(f"Вопрос {idx} обработан.")
-            print(f"Входящие токены: {input_tokens}, Выходящие токены: {output_tokens}, Всего токенов: {total_tokens}")
-            print(f"Стоимость для вопроса {idx}: Вход: ${input_cost:.4f}, Выход: ${output_cost:.4f}, Всего: ${input_cost + output_cost:.4f}")
+            return [idx, reformulated_question, answer], input_tokens, output_tokens
         except Exception as e:
             # Обработка ошибок
             print(f"Ошибка при обработке вопроса {idx}: {question}\n{str(e)}")
-            results.append([idx, "Ошибка", "Ошибка"])
+            return [idx, "Ошибка", "Ошибка"], None, None
+
+    # Итоги считаются по мере завершения запросов, порядок завершения произвольный
+    def on_done(position, outcome):
+        nonlocal total_tokens, total_cost
+        result, input_tokens, output_tokens = outcome
+        if input_tokens is None:
+            return
+        idx = result[0]
+
+        # Обновляем итоговую сумму токенов
+        total_tokens += input_tokens + output_tokens
+
+        # Рассчитываем стоимость для входящих и выходящих токенов
+        input_cost = calculate_cost(input_tokens, input=True)
+        output_cost = calculate_cost(output_tokens, input=False)
+        total_cost += input_cost + output_cost
+
+        # Выводим токены и стоимость после обработки каждого вопроса
+        print(f"Вопрос {idx} обработан.")
+        print(f"Входящие токены: {input_tokens}, Выходящие токены: {output_tokens}, Всего токенов: {total_tokens}")
+        print(f"Стоимость для вопроса {idx}: Вход: ${input_cost:.4f}, Выход: ${output_cost:.4f}, Всего: ${input_cost + output_cost:.4f}")
+
+    # Результаты возвращаются в порядке входных данных
+    outcomes = asyncio.run(run_in_order(rows, process_row, max_in_flight, on_done=on_done))
+    results = [result for result, _, _ in outcomes]
 
     return results, total_tokens, total_cost
 
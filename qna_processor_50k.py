@@ -1,9 +1,38 @@
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
 import openai
-import pandas as pd
-import tiktoken
-from bs4 import BeautifulSoup
-import re
 from tqdm import tqdm  # Для отображения прогресс-бара
+from html_response_parser import parse_html_response
+from qna_async import run_in_order, request_cached_model_response
+from rate_limiter import RateLimiter
+from result_journal import ResultJournal, STATUS_OK, STATUS_ERROR, STATUS_INVALID
+from output_sinks import open_sink, rewrite_sink, export_to_xlsx, NullSink
+from response_cache import ResponseCache
+from token_accounting import TokenUsage, count_tokens, count_tokens_batch
+from cost_estimator import estimate_cost, print_estimate
+from input_readers import open_input_rows
+from run_manifest import RunManifest, row_content_hash, processing_fingerprint
+from input_compaction import compact_rows
+from near_duplicates import DEFAULT_SIMILARITY_THRESHOLD, find_near_duplicates, write_dedup_report
+from categories import load_categories, strip_category_section
+from category_classifier import CategoryClassifier, DEFAULT_MODEL_FILE, DEFAULT_CONFIDENCE_THRESHOLD
+from parse_pool import ParsePool, DEFAULT_PARSE_WORKERS
+from streaming import StreamStats
+from model_routing import (DEFAULT_ROUTES, RoutingStats, choose_model, model_cost, model_prices, parse_route,
+                           describe_routes)
+from work_queue import (WorkQueue, LeaseKeeper, merge_shards, input_fingerprint, DEFAULT_SHARD_SIZE,
+                        DEFAULT_LEASE_SECONDS, SHARD_PENDING, SHARD_LEASED)
+from response_validation import validate_response, ValidationStats, DEFAULT_VALIDATION_RETRIES, DEFAULT_RETRY_SHARE
+from micro_batching import (DEFAULT_BATCH_TOKEN_BUDGET, MAX_BATCH_OUTPUT_TOKENS, build_batch_prompt,
+                            build_batch_input, pack_batches, split_batch_response, split_tokens)
+from scheduling import (SCHEDULE_FILE, SCHEDULE_LONGEST, OutputLengthModel, ScheduleStats, longest_first_order)
+from batch_api import (BATCH_PRICE_FACTOR, OpenAIBatchProvider, write_batch_files, submit_batch, wait_for_batch,
+                       download_batch_results)
 
 # API-ключ OpenAI
 openai.api_key = "api-key"
@@ -14,129 +43,766 @@ model_name = "gpt-4o"
 # Задание файлов
 prompt_file_name = "Промпт_with_category.txt"  # Файл с промптом для обработки вопроса
 input_file_name = "50 000 вопросов.xlsx"  # Файл с входными данными
-output_file_name = "Processed_QnA.xlsx"  # Имя итогового файла
-
-# Цены для модели gpt-4o
-INPUT_COST_PER_M = 2.50  # для 1M входящих токенов
-OUTPUT_COST_PER_M = 10.00  # для 1M выходящих токенов
-
-# Функция для подсчёта токенов
-def count_tokens(text, model=model_name):
-    encoder = tiktoken.encoding_for_model(model)
-    return len(encoder.encode(text))
-
-# Функция для расчета стоимости токенов
-def calculate_cost(tokens, input=True):
-    tokens_in_millions = tokens / 1_000_000
-    if input:
-        return tokens_in_millions * INPUT_COST_PER_M
+output_file_name = "Processed_QnA.xlsx"  # Имя итогового файла (выгружается один раз в конце)
+sink_file_name = "Processed_QnA.jsonl"  # Рабочий файл, куда строки дописываются по мере обработки
+journal_file_name = "Processed_QnA.journal.sqlite"  # Журнал обработанных строк для --resume
+cache_file_name = "responses_cache.sqlite"  # Локальный кэш ответов модели
+manifest_file_name = "Processed_QnA.manifest.sqlite"  # Хэши исходных строк и результаты прошлого запуска
+dedup_report_file_name = "Processed_QnA.dedup.csv"  # Отчёт о схлопнутых почти одинаковых вопросах
+batch_requests_file_name = "Processed_QnA.batch_requests.jsonl"  # Файл запросов для Batch API
+stream_log_file_name = "Processed_QnA.stream_log.csv"  # TTFB и сэкономленные токены по каждому потоковому запросу
+queue_file_name = "Processed_QnA.queue.sqlite"  # Очередь шардов для --coordinator / --worker
+compaction_report_file_name = "Processed_QnA.compaction.csv"  # Токены, убранные сжатием входа, по каждой строке
+
+# Число одновременных запросов к OpenAI
+max_in_flight = 16
+
+# Лимиты аккаунта OpenAI для клиентского ограничителя скорости
+requests_per_minute = 500
+tokens_per_minute = 300_000
+max_output_tokens = 1500  # Резерв токенов ответа (max_tokens)
+
+# Проверка ответов: сколько раз повторять вопрос, ответ на который не прошёл проверку,
+# и какая доля вопросов запуска может быть повторена
+validation_retries = DEFAULT_VALIDATION_RETRIES
+retry_budget_share = DEFAULT_RETRY_SHARE
+
+# Число процессов для разбора ответов (0 - разбор в основном процессе)
+parse_workers = DEFAULT_PARSE_WORKERS
+
+# Маршрутизация: вопросы до N входных токенов сначала отправляются в более дешёвую модель,
+# а если её ответ не прошёл проверку - в model_name. Цены моделей - в MODEL_PRICES (model_routing.py)
+routes = DEFAULT_ROUTES
+
+# Локальное определение категории (--pre-classify): модель, обученная category_classifier.py, и порог уверенности.
+# Вопросам с уверенно определённой категорией отправляется промпт без раздела категорий.
+classifier_model_file_name = DEFAULT_MODEL_FILE
+classifier_threshold = DEFAULT_CONFIDENCE_THRESHOLD
+
+# Бюджет входных токенов вопроса и ответов одной строки (--input-budget): повторы ответов, приветствия
+# и подписи убираются, а наименее информативные ответы отбрасываются. None - вход отправляется целиком
+input_token_budget = None
+
+# Порядок запуска запросов: SCHEDULE_LONGEST - самые длинные вопросы первыми (результаты всё равно в порядке id),
+# SCHEDULE_FILE - в порядке входного файла
+schedule_order = SCHEDULE_LONGEST
+
+# max_tokens одиночного запроса по длине уже полученных ответов для входа того же размера (scheduling.py);
+# False - всегда max_output_tokens
+dynamic_max_tokens = True
+
+# Функция для построения текста запроса по вопросу и ответам
+def build_input_text(question, answers):
+    return f"Спаршенный вопрос с ответами:\n{question}#{'#'.join(map(str, answers))}"
+
+# Функция для сжатия входа под бюджет токенов на строку (input_compaction.py); без бюджета строки не меняются.
+# Статистика по каждой строке сохраняется в report_path (CSV).
+def compact_input(data, budget, report_path=None):
+    if not budget:
+        return data
+    compacted, stats = compact_rows(data, budget, model_name)
+    print(stats.summary())
+    if report_path:
+        stats.write_csv(report_path)
+    return compacted
+
+# Функция для обработки вопросов и ответов через OpenAI
+# Запросы выполняются асинхронно, одновременно в работе не больше max_in_flight запросов.
+# Каждая завершённая строка сразу записывается в журнал, уже обработанные id пропускаются.
+# Готовые строки в порядке входных данных дописываются в sink (JSONL/CSV/Parquet).
+# Если передан cache, повторные запросы берутся из локального кэша без обращения к API.
+# При batch_size > 1 до batch_size вопросов (не больше batch_tokens входных токенов) отправляются одним запросом;
+# вопросы, блок которых в ответе отсутствует или не разобран, повторяются по одному.
+# skip_ids - id, которые не отправляются (например, дубликаты, получающие ответ своего представителя).
+# Каждый ответ сразу проверяется (разделы, категория 1..30, непустой ответ); не прошедший проверку вопрос
+# повторяется до validation_retries раз в этом же запуске (всего не больше retry_budget_share вопросов),
+# а если так и не исправился - записывается со статусом invalid и отправляется снова при --resume.
+# Разбор и проверка ответов выполняются в пуле из parse_workers процессов (ParsePool).
+# При stream=True одиночные запросы читаются потоком и останавливаются после блока категории или
+# прерываются при ответе не по шаблону; данные по каждому запросу сохраняются в stream_log (CSV).
+# Если передан classifier (CategoryClassifier), вопросы, отправляемые по одному, с уверенно определённой
+# категорией получают промпт без раздела категорий, а категория записывается локальная.
+# schedule - порядок запуска (SCHEDULE_LONGEST - по убыванию входных токенов), в sink строки по-прежнему
+# пишутся в порядке id. При dynamic_max_tokens одиночные запросы получают max_tokens по длине уже полученных
+# ответов; ответ, упёршийся в уменьшенный лимит, запрашивается заново с max_output_tokens.
+def process_qna_with_ai(prompt_template, input_rows, journal, sink, max_in_flight=max_in_flight, cache=None,
+                        batch_size=1, batch_tokens=DEFAULT_BATCH_TOKEN_BUDGET, skip_ids=(),
+                        validation_retries=validation_retries, parse_workers=parse_workers,
+                        stream=False, stream_log=None, routes=routes, classifier=None,
+                        schedule=schedule_order, dynamic_max_tokens=dynamic_max_tokens):
+    usage = TokenUsage()
+    completed_ids = journal.completed_ids()
+    input_rows = list(input_rows)
+    rows = [(idx, question, answers) for idx, (question, answers) in enumerate(input_rows)
+            if idx + 1 not in completed_ids and idx + 1 not in skip_ids]
+    if completed_ids:
+        print(f"Пропущено уже обработанных вопросов: {len(input_rows) - len(rows)}")
+    rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    categories = load_categories(prompt_template) or None
+    validation = ValidationStats(int(len(rows) * retry_budget_share) + validation_retries)
+    prompt_tokens = count_tokens(prompt_template, model_name)
+    batch_prompt = build_batch_prompt(prompt_template)
+    batch_prompt_tokens = count_tokens(batch_prompt, model_name)
+    short_prompt = strip_category_section(prompt_template)
+    short_prompt_tokens = count_tokens(short_prompt, model_name)
+    local_categories = {}
+    if classifier is not None:
+        confident = classifier.confident_categories([(question, answers) for _, question, answers in rows])
+        local_categories = {idx: number for (idx, _, _), number in zip(rows, confident) if number is not None}
+
+    # Предварительная оценка входных токенов сразу для всех строк (в несколько потоков) - для ограничителя скорости
+    input_texts = [build_input_text(question, answers) for _, question, answers in rows]
+    estimated_tokens = count_tokens_batch(input_texts, model_name)
+    items = [(row, input_text, tokens) for row, input_text, tokens in zip(rows, input_texts, estimated_tokens)]
+    if batch_size > 1:
+        groups = pack_batches(items, lambda item: item[2], batch_size, batch_tokens,
+                              output_tokens_per_item=max_output_tokens)
     else:
-        return tokens_in_millions * OUTPUT_COST_PER_M
+        groups = [[item] for item in items]
+    # Стоимость группы для расписания - её входные токены
+    order = longest_first_order([sum(item[2] for item in group) for group in groups]) \
+        if schedule == SCHEDULE_LONGEST else None
+    output_lengths = OutputLengthModel(max_output_tokens, estimated_tokens) if dynamic_max_tokens else None
+    schedule_stats = ScheduleStats(max_in_flight)
 
-# Функция для извлечения ID категории из HTML-ответа
-def extract_category_from_html(html_response):
-    try:
-        soup = BeautifulSoup(html_response, "html.parser")
-        category_p = soup.find("h3", string="Категория:").find_next("p")
-        if category_p:
-            category_text = category_p.get_text(strip=True)
-            category_match = re.match(r"^(\d+)$", category_text)
-            return category_match.group(1) if category_match else "Не определена"
-        return "Не определена"
-    except Exception:
-        return "Ошибка"
-
-def parse_html_response(html_response):
-    try:
-        soup = BeautifulSoup(html_response, "html.parser")
-        question_h2 = soup.find("h2", string="Вопрос:")
-        question = question_h2.find_next("p").get_text(strip=True) if question_h2 else "Вопрос не найден"
-        answer_h2 = soup.find("h2", string="Ответ:")
-        answer_elements = []
-        if answer_h2:
-            for sibling in answer_h2.find_next_siblings():
-                if sibling.name == "h2":
+    parse_pool = ParsePool(categories, workers=parse_workers if rows else 0)
+    stream_stats = StreamStats(model_name) if stream else None
+    routing = RoutingStats(model_name)
+
+    # Ответ из кэша используется, только если проходит проверку
+    def is_valid_model_response(model_response):
+        return validate_response(parse_html_response(model_response), categories) is None
+
+    def is_valid_response_without_category(model_response):
+        return validate_response(parse_html_response(model_response), None) is None
+
+    # Обработка одного вопроса с проверкой ответа и повтором; retried - вопрос уже повторяется после пакета.
+    # Первая попытка - в модель маршрута, повторы (эскалация) - в model_name.
+    # group_route - маршрут пакета, в котором вопрос уже учтён (запросы добавляются к нему без нового вопроса);
+    # вопрос, блок которого пропущен в ответе на пакет, отправляется в ту же модель, что и пакет.
+    async def process_row(item, retried=False, group_route=None):
+        (idx, question, answers), input_text, text_tokens = item
+        local_category = local_categories.get(idx)
+        if local_category is None:
+            row_prompt, accept, input_tokens = prompt_template, is_valid_model_response, prompt_tokens + text_tokens
+        else:
+            row_prompt, accept = short_prompt, is_valid_response_without_category
+            input_tokens = short_prompt_tokens + text_tokens
+        route = model_name if retried else group_route or choose_model(text_tokens, routes, model_name)
+        attempts = []
+        try:
+            for attempt in range(validation_retries + 1):
+                model = route if attempt == 0 else model_name
+                # Первая попытка - с max_tokens по длине уже полученных ответов, повторы - с полным max_output_tokens
+                if attempt == 0 and not retried and output_lengths is not None:
+                    limit = output_lengths.max_tokens_for(text_tokens)
+                else:
+                    limit = max_output_tokens
+                while True:
+                    model_response, from_cache, response_usage = await request_cached_model_response(
+                        row_prompt, input_text, model, max_tokens=limit, cache=cache,
+                        cache_max_tokens=max_output_tokens, accept=accept, stream_stats=stream_stats,
+                        rate_limiter=rate_limiter, reserved_tokens=input_tokens + limit)
+                    if response_usage is not None:
+                        # Фактические токены из ответа API (для ответа из кэша - нули)
+                        attempts.append((model, response_usage[0], response_usage[1], False))
+                    else:
+                        # API не вернул usage - считаем по оценке
+                        attempts.append((model, input_tokens, count_tokens(model_response, model_name), True))
+                    output_tokens = count_tokens(model_response, model_name) if from_cache else attempts[-1][2]
+                    if not from_cache and limit < max_output_tokens and output_tokens >= limit:
+                        # Ответ упёрся в уменьшенный лимит - запрашиваем заново с полным
+                        output_lengths.truncated += 1
+                        limit = max_output_tokens
+                        continue
+                    if output_lengths is not None:
+                        output_lengths.observe(text_tokens, output_tokens)
+                    break
+                parsed, error = await parse_pool.parse(model_response, check_category=local_category is None)
+                if local_category is not None:
+                    parsed = (*parsed[:2], str(local_category))
+                if error is None:
+                    if attempt or retried:
+                        validation.recovered += 1
+                    result, status = [idx + 1, *parsed], STATUS_OK
                     break
-                answer_elements.append(str(sibling))
-            answer = ''.join(answer_elements)
+                validation.errors[error] += 1
+                if attempt == validation_retries or not validation.take_retry():
+                    validation.failed += 1
+                    result, status = [idx + 1, *parsed], STATUS_INVALID
+                    break
+        except Exception as e:
+            print(f"Ошибка при обработке вопроса {idx + 1}: {question}\n{str(e)}")
+            result, status = [idx + 1, "Ошибка", "Ошибка", "Не определена"], STATUS_ERROR
+        if group_route is None:
+            routing.record_row(route, attempts)
+        else:
+            routing.record_row(group_route, attempts, rows=0)
+        return (result, sum(attempt[1] for attempt in attempts), sum(attempt[2] for attempt in attempts), status,
+                any(attempt[3] for attempt in attempts))
+
+    # Обработка пакета вопросов одним запросом; возвращает результаты в порядке вопросов пакета
+    async def process_group(group):
+        if len(group) == 1:
+            return [await process_row(group[0])]
+        entries = [(idx + 1, input_text) for (idx, _, _), input_text, _ in group]
+        batch_input = build_batch_input(entries)
+        input_tokens = batch_prompt_tokens + count_tokens(batch_input, model_name)
+        output_tokens = min(max_output_tokens * len(group), MAX_BATCH_OUTPUT_TOKENS)
+        # Пакет идёт по маршруту самого длинного вопроса
+        route = choose_model(max(item[2] for item in group), routes, model_name)
+        response_usage = None
+        try:
+            model_response, from_cache, response_usage = await request_cached_model_response(
+                batch_prompt, batch_input, route, max_tokens=output_tokens, cache=cache,
+                accept=lambda response: bool(split_batch_response(response)),
+                rate_limiter=rate_limiter, reserved_tokens=input_tokens + output_tokens)
+            blocks = split_batch_response(model_response)
+        except Exception as e:
+            print(f"Ошибка пакетного запроса (id {entries[0][0]}-{entries[-1][0]}): {str(e)}")
+            blocks = {}
+            model_response = ""
+        if response_usage is not None:
+            routing.record_row(route, [(route, response_usage[0], response_usage[1], False)], rows=len(group))
+        elif model_response:
+            routing.record_row(route, [(route, input_tokens, count_tokens(model_response, model_name), True)],
+                               rows=len(group))
         else:
-            answer = "Заголовок 'Ответ:' не найден"
-        answer = re.sub(r"<h3>Категория:</h3>\s*<p>\d+</p>", "", answer, flags=re.DOTALL).strip()
-        category = extract_category_from_html(html_response)
-        return question, answer, category
-    except Exception:
-        return "Ошибка при разборе вопроса", "Ошибка при разборе ответа", "Ошибка"
+            routing.record_row(route, [], rows=len(group))
 
+        answered_ids = [row_id for row_id, _ in entries if row_id in blocks]
+        parsed = dict(zip(answered_ids, await asyncio.gather(*(parse_pool.parse(blocks[row_id])
+                                                                 for row_id in answered_ids))))
+        # Токены пакета делятся между вопросами с блоком в ответе: входные - по длине вопроса, выходные - по длине блока
+        answered = [item for item in group if item[0][0] + 1 in parsed]
+        if answered:
+            if response_usage is not None:
+                total_input, total_output, estimated = response_usage[0], response_usage[1], False
+            else:
+                total_input = input_tokens
+                total_output = count_tokens(model_response, model_name)
+                estimated = True
+            input_shares = split_tokens(total_input, [item[2] for item in answered])
+            output_shares = split_tokens(total_output, [len(blocks[item[0][0] + 1]) for item in answered])
+            shares = {item[0][0] + 1: (input_share, output_share)
+                      for item, input_share, output_share in zip(answered, input_shares, output_shares)}
 
-# Функция для обработки вопросов и ответов через OpenAI
-def process_qna_with_ai(prompt_template, input_data):
-    total_tokens = 0
-    total_cost = 0
+        outcomes = []
+        for item in group:
+            row_id = item[0][0] + 1
+            if row_id not in parsed:
+                # Блока нет в ответе - повторяем только этот вопрос отдельным запросом
+                outcomes.append(await process_row(item, group_route=route))
+                continue
+            block, error = parsed[row_id]
+            if error is None:
+                outcomes.append(([row_id, *block], *shares[row_id], STATUS_OK, estimated))
+                continue
+            validation.errors[error] += 1
+            if validation.take_retry():
+                # Блок не прошёл проверку - повторяем вопрос отдельно, токены пакета остаются за ним
+                result, retry_input, retry_output, status, retry_estimated = await process_row(
+                    item, retried=True, group_route=route)
+                outcomes.append((result, shares[row_id][0] + retry_input, shares[row_id][1] + retry_output,
+                                 status, estimated or retry_estimated))
+            else:
+                validation.failed += 1
+                outcomes.append(([row_id, *block], *shares[row_id], STATUS_INVALID, estimated))
+        return outcomes
+
+    # Обработка группы с замером длительности (для отчёта о расписании)
+    async def process_timed_group(entry):
+        position, group = entry
+        started = time.perf_counter()
+        outcomes = await process_group(group)
+        schedule_stats.record(position, time.perf_counter() - started)
+        return outcomes
+
+    with tqdm(total=len(rows), desc="Обработка вопросов", unit="вопрос") as pbar:
+        # Итоги, прогресс-бар и журнал обновляются по мере завершения запросов (в любом порядке)
+        def on_done(position, group_outcomes):
+            for result, input_tokens, output_tokens, status, estimated in group_outcomes:
+                journal.record(result, input_tokens, output_tokens, status=status)
+                if input_tokens or output_tokens or status == STATUS_OK:
+                    usage.add(input_tokens, output_tokens, estimated=estimated)
+            pbar.set_postfix({"Токены": usage.total_tokens, "Стоимость": routing.cost()})
+            pbar.update(len(group_outcomes))
+
+        def on_ordered(position, group_outcomes):
+            sink.write_rows([outcome[0] for outcome in group_outcomes])
+
+        with parse_pool:
+            started = time.perf_counter()
+            outcomes = asyncio.run(run_in_order(list(enumerate(groups)), process_timed_group, max_in_flight,
+                                                on_done=on_done, on_ordered=on_ordered, order=order))
+            wall_seconds = time.perf_counter() - started
+
+    print(validation.summary())
+    if classifier is not None:
+        print(f"Категория определена локально: {len(local_categories)} из {len(rows)} вопросов "
+              f"(порог {classifier.threshold}), промпт без раздела категорий короче на "
+              f"{prompt_tokens - short_prompt_tokens} токенов"
+              + (" - при --batch-size > 1 применяется только к вопросам, отправляемым по одному"
+                 if batch_size > 1 else ""))
+    print(routing.report())
+    print(schedule_stats.report(order if order is not None else range(len(groups)), wall_seconds))
+    if output_lengths is not None:
+        print(output_lengths.summary())
+    if stream_stats is not None:
+        print(stream_stats.summary())
+        if stream_log:
+            stream_stats.write_csv(stream_log)
+    results = [outcome[0] for group_outcomes in outcomes for outcome in group_outcomes]
+    return results, usage.total_tokens, routing.cost()
+
+# Функция для обработки вопросов через Batch API: файл запросов -> отправка -> опрос -> разбор результатов.
+# Результаты разбираются тем же parse_html_response, записываются в журнал и в sink в порядке id.
+# batch_ids - уже созданные задания (продолжение опроса без повторной отправки).
+# Ответы, не прошедшие проверку, сразу повторяются обычными запросами (process_qna_with_ai) с настройками
+# retry_options (маршруты, кэш, окно запросов и т. д., см. ai_options_from_args).
+def process_qna_with_batch_api(prompt_template, input_rows, journal, sink, provider, batch_ids=None,
+                               poll_interval=30.0, skip_ids=(), validation_retries=validation_retries,
+                               retry_options=None):
+    usage = TokenUsage()
+    completed_ids = journal.completed_ids()
+    input_rows = list(input_rows)
+    rows = {idx + 1: (question, answers) for idx, (question, answers) in enumerate(input_rows)
+            if idx + 1 not in completed_ids and idx + 1 not in skip_ids}
+    if completed_ids:
+        print(f"Пропущено уже обработанных вопросов: {len(input_rows) - len(rows)}")
+
+    if not batch_ids:
+        entries = ((row_id, build_input_text(question, answers)) for row_id, (question, answers) in rows.items())
+        paths = write_batch_files(batch_requests_file_name, entries, prompt_template, model_name,
+                                  max_tokens=max_output_tokens)
+        batch_ids = [submit_batch(provider, path) for path in paths]
+        # id заданий выводятся, чтобы после обрыва продолжить опрос через --batch-id
+        print(f"Отправлены пакетные задания: {', '.join(batch_ids)}")
+
+    def on_status(batch):
+        counts = batch.get("request_counts") or {}
+        print(f"Задание {batch['id']}: {batch['status']}, выполнено {counts.get('completed', 0)} "
+              f"из {counts.get('total', 0)}, ошибок {counts.get('failed', 0)}")
+
+    batch_results = {}
+    for batch_id in batch_ids:
+        batch = wait_for_batch(provider, batch_id, poll_interval, on_status=on_status)
+        batch_results.update(download_batch_results(provider, batch))
+
+    categories = load_categories(prompt_template) or None
+    validation = ValidationStats(0)
     results = []
+    invalid_results = {}
+    for row_id, (question, answers) in rows.items():
+        model_response, response_usage, error = batch_results.get(row_id, (None, None, "нет в результатах задания"))
+        if model_response is None:
+            print(f"Ошибка при обработке вопроса {row_id}: {question}\n{error}")
+            result = [row_id, "Ошибка", "Ошибка", "Не определена"]
+            journal.record(result, status=STATUS_ERROR)
+        else:
+            result = [row_id, *parse_html_response(model_response)]
+            error = validate_response(result[1:], categories)
+            usage.add(response_usage[0], response_usage[1])
+            if error is not None:
+                validation.errors[error] += 1
+                invalid_results[row_id] = result
+                journal.record(result, response_usage[0], response_usage[1], status=STATUS_INVALID)
+                continue
+            journal.record(result, response_usage[0], response_usage[1], status=STATUS_OK)
+        results.append(result)
+    sink.write_rows(results)
+    cost = model_cost(model_name, usage.input_tokens, usage.output_tokens, BATCH_PRICE_FACTOR)
+    if not invalid_results:
+        return results, usage.total_tokens, cost
+    print(f"Ответы Batch API, не прошедшие проверку: {len(invalid_results)} ({validation.summary()})")
+    if validation_retries <= 0:
+        sink.write_rows(list(invalid_results.values()))
+        return results + list(invalid_results.values()), usage.total_tokens, cost
+    # Повтор обычными запросами только для вопросов с некорректным ответом
+    other_ids = set(range(1, len(input_rows) + 1)) - invalid_results.keys()
+    retried, retry_tokens, retry_cost = process_qna_with_ai(
+        prompt_template, input_rows, journal, sink, skip_ids=other_ids, validation_retries=validation_retries - 1,
+        **(retry_options or {}))
+    return results + retried, usage.total_tokens + retry_tokens, cost + retry_cost
+
+# Функция для переноса результатов неизменённых строк из манифеста прошлого запуска.
+# Строка с тем же хэшем содержимого (вопрос + ответы) записывается в журнал и sink под своим новым id без запроса к API,
+# поэтому дальше отправляются только новые и изменённые вопросы - даже если строки выгрузки сдвинулись.
+def carry_forward_unchanged(hashes, manifest, journal, sink, chunk_size=1000):
+    previous_rows = len(manifest)
+    completed_ids = journal.completed_ids()
+    found_hashes = set()
+    unchanged = 0
+    # Манифест читается частями, чтобы не держать в памяти все прежние ответы сразу
+    for start in range(0, len(hashes), chunk_size):
+        found = manifest.lookup(hashes[start:start + chunk_size])
+        found_hashes.update(found)
+        carried = []
+        for row_id, row_hash in enumerate(hashes[start:start + chunk_size], start=start + 1):
+            if row_hash not in found:
+                continue
+            unchanged += 1
+            if row_id not in completed_ids:
+                result = [row_id, *found[row_hash]]
+                journal.record(result, status=STATUS_OK)
+                carried.append(result)
+        sink.write_rows(carried)
+    journal.commit()
+    print(f"Сравнение с прошлым запуском: без изменений {unchanged}, новых или изменённых {len(hashes) - unchanged}, "
+          f"исчезло из выгрузки {previous_rows - len(found_hashes)}")
+
+# Функция для обновления манифеста: хэши и результаты всех успешно обработанных строк текущей выгрузки
+def update_manifest(manifest, hashes, journal):
+    manifest.replace((hashes[row_id - 1], row_id, question, answer, category)
+                     for row_id, question, answer, category in journal.rows(status=STATUS_OK)
+                     if row_id <= len(hashes))
+
+# Функция для поиска почти одинаковых вопросов среди ещё не обработанных строк.
+# Возвращает {id дубликата: (id представителя, сходство)} и сохраняет отчёт для проверки.
+def collapse_near_duplicates(input_rows, journal, threshold, report_path):
+    completed_ids = journal.completed_ids()
+    pending = [(row_id, question) for row_id, (question, _) in enumerate(input_rows, start=1)
+               if row_id not in completed_ids]
+    duplicates = find_near_duplicates(pending, threshold)
+    write_dedup_report(report_path, duplicates, dict(pending))
+    print(f"Почти одинаковые вопросы: {len(duplicates)} из {len(pending)} "
+          f"({len(duplicates) / max(1, len(pending)) * 100:.1f}%) получат ответ представителя, отчёт: {report_path}")
+    return duplicates
+
+# Функция для копирования результата представителя на его дубликаты (без запросов к API).
+# Если представитель завершился ошибкой, дубликаты тоже помечаются ошибкой и будут отправлены при --resume.
+def fan_out_duplicates(duplicates, journal, sink):
+    if not duplicates:
+        return
+    representative_ids = set(representative_id for representative_id, _ in duplicates.values())
+    results = {row[0]: row for row in journal.rows(status=STATUS_OK) if row[0] in representative_ids}
+    fanned = []
+    for row_id, (representative_id, _) in sorted(duplicates.items()):
+        if representative_id in results:
+            result = [row_id, *results[representative_id][1:]]
+            journal.record(result, status=STATUS_OK)
+        else:
+            result = [row_id, "Ошибка", "Ошибка", "Не определена"]
+            journal.record(result, status=STATUS_ERROR)
+        fanned.append(result)
+    sink.write_rows(fanned)
+    journal.commit()
+
+# Функция для рабочего процесса очереди: берёт шарды в аренду и обрабатывает их, пока свободные шарды не кончатся.
+# Результаты шарда пишутся в его журнал; если процесс упадёт, шард после истечения аренды заберёт другой
+# и продолжит с уже обработанных строк.
+def run_queue_worker(args, prompt_template, cache):
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    data = list(open_input_rows(args.input, use_cache=not args.no_input_cache))
+    queue = WorkQueue(args.queue)
+    if queue.total_rows != len(data) or queue.input_fingerprint != input_fingerprint(data):
+        raise SystemExit(f"Очередь {args.queue} создана для другого входа, чем {args.input} - "
+                         f"запустите координатор (--coordinator) для этого входа")
+    data = compact_input(data, args.input_budget)
+    queue.register_worker(worker_id, requests_per_minute, tokens_per_minute)
+    classifier = classifier_from_args(args, prompt_template)
+    total_tokens, total_cost = 0, 0.0
+    while True:
+        shard = queue.claim(worker_id, args.lease_seconds)
+        if shard is None:
+            break
+        shard_id, start_id, end_id = shard
+        print(f"{worker_id}: шард {shard_id} (id {start_id}-{end_id})")
+        journal = ResultJournal(queue.shard_journal_path(shard_id))
+        skip_ids = set(range(1, start_id)) | set(range(end_id + 1, len(data) + 1))
+        try:
+            with LeaseKeeper(args.queue, shard_id, worker_id, args.lease_seconds) as keeper:
+                _, tokens, cost = process_qna_with_ai(
+                    prompt_template, data, journal, NullSink(), skip_ids=skip_ids,
+                    validation_retries=args.validation_retries, **ai_options_from_args(args, cache, classifier))
+        finally:
+            journal.commit()
+        complete = set(range(start_id, end_id + 1)) <= journal.completed_ids()
+        journal.close()
+        total_tokens += tokens
+        total_cost += cost
+        # Шард, аренду которого уже забрал другой процесс, не отмечается - его статус определит новый владелец
+        status = None if keeper.lost else queue.finish(shard_id, worker_id, complete)
+        if status is None:
+            print(f"{worker_id}: шард {shard_id} - аренда потеряна, статус шарда не изменён")
+            continue
+        print(f"{worker_id}: шард {shard_id} - {'готов' if status != SHARD_PENDING else 'возвращён в очередь'}")
+    queue.close()
+    print(f"{worker_id}: свободных шардов нет. Стоимость: ${total_cost:.4f}, токенов: {total_tokens}")
+
+# Функция для координатора: делит вход на шарды, при необходимости запускает локальные рабочие процессы,
+# ждёт завершения всех шардов и объединяет результаты в --output и итоговый XLSX в порядке id.
+# Рабочие процессы на других машинах запускаются с --worker и тем же файлом очереди.
+def run_coordinator(args):
+    data = list(open_input_rows(args.input, use_cache=not args.no_input_cache))
+    queue = WorkQueue(args.queue)
+    created = queue.create_shards(len(data), args.shard_size, input_fingerprint(data))
+    print(f"Очередь {args.queue}: {len(queue.shards())} шардов по {args.shard_size} строк"
+          f"{'' if created else ' (продолжение существующей очереди)'}")
+
+    workers = []
+    keys = args.worker_keys or []
+    for number in range(args.spawn_workers):
+        command = [sys.executable, os.path.abspath(__file__), "--worker", "--queue", args.queue,
+                   "--input", args.input, "--worker-id", f"{socket.gethostname()}-w{number}",
+                   "--max-in-flight", str(args.max_in_flight), "--lease-seconds", str(args.lease_seconds)]
+        if keys:
+            # У каждого процесса свой ключ (по кругу) и полный бюджет ключа
+            command += ["--api-key-env", keys[number % len(keys)],
+                        "--rpm", str(requests_per_minute), "--tpm", str(tokens_per_minute)]
+        else:
+            # Общий ключ - бюджет делится между процессами
+            command += ["--rpm", str(max(1, requests_per_minute // args.spawn_workers)),
+                        "--tpm", str(max(1, tokens_per_minute // args.spawn_workers))]
+        if args.api_base:
+            command += ["--api-base", args.api_base]
+        if args.no_cache:
+            command.append("--no-cache")
+        if args.input_budget:
+            command += ["--input-budget", str(args.input_budget)]
+        command += ["--schedule", args.schedule]
+        if args.fixed_max_tokens:
+            command.append("--fixed-max-tokens")
+        if args.pre_classify:
+            command += ["--pre-classify", "--classifier-model", args.classifier_model,
+                        "--classifier-threshold", str(args.classifier_threshold)]
+        workers.append(subprocess.Popen(command))
+
+    # Ожидание завершения шардов (аренды упавших процессов истекают и шарды забирают другие процессы)
+    while True:
+        counts = queue.progress()
+        print(f"Шарды: готово {counts['done']}, в работе {counts[SHARD_LEASED]}, в очереди {counts[SHARD_PENDING]}")
+        if counts[SHARD_PENDING] + counts[SHARD_LEASED] == 0:
+            break
+        if workers and all(worker.poll() is not None for worker in workers):
+            print("Все локальные рабочие процессы завершились, не все шарды готовы - объединяются готовые")
+            break
+        time.sleep(args.poll_interval)
+    for worker in workers:
+        worker.wait()
+
+    sink = open_sink(args.output)
+    try:
+        rows = merge_shards(queue, sink)
+    finally:
+        sink.close()
+    queue.close()
+    export_to_xlsx(rows, output_file_name)
+    print(f"Processed results saved to {args.output} and {output_file_name} ({len(rows)} строк)")
+
+# Функция для настроек process_qna_with_ai из командной строки (кроме входа, журнала и числа повторов) -
+# общие для обычного запуска, рабочего процесса очереди и повтора ответов Batch API
+def ai_options_from_args(args, cache, classifier, stream_log=None):
+    return dict(max_in_flight=args.max_in_flight, cache=cache, batch_size=args.batch_size,
+                batch_tokens=args.batch_tokens, parse_workers=args.parse_workers, stream=args.stream,
+                stream_log=stream_log, routes=routes_from_args(args), classifier=classifier,
+                schedule=args.schedule, dynamic_max_tokens=not args.fixed_max_tokens)
+
+# Функция для маршрутов из командной строки (--route / --no-routing)
+def routes_from_args(args):
+    if args.no_routing:
+        return []
+    return [parse_route(route) for route in args.route] if args.route else routes
+
+# Функция для локального классификатора категорий из командной строки (--pre-classify); None - не используется
+def classifier_from_args(args, prompt_template):
+    if not args.pre_classify:
+        return None
+    if "Категория:" in strip_category_section(prompt_template):
+        print("Не удалось убрать раздел категорий из промпта - локальное определение категории отключено")
+        return None
+    classifier = CategoryClassifier.load(load_categories(prompt_template), args.classifier_model,
+                                         args.classifier_threshold)
+    if classifier.model is None:
+        print(f"Модель {args.classifier_model} не найдена - категория определяется только по словарям "
+              f"(обучение: python category_classifier.py train --results ...)")
+    return classifier
+
+# Разбор аргументов командной строки
+def parse_args():
+    parser = argparse.ArgumentParser(description="Обработка вопросов и ответов через OpenAI")
+    parser.add_argument("--input", default=input_file_name,
+                        help="входной файл: .xlsx, .csv, .jsonl, .parquet или txt с разделителем #")
+    parser.add_argument("--no-input-cache", action="store_true",
+                        help="не создавать и не использовать колоночный кэш входного файла (<файл>.rows.parquet)")
+    parser.add_argument("--estimate", action="store_true",
+                        help="только оценить токены и стоимость по входному файлу, без запросов к API")
+    parser.add_argument("--output-tokens", type=int, nargs=2, default=[400, max_output_tokens],
+                        metavar=("МИН", "МАКС"), help="предполагаемая длина ответа для оценки стоимости")
+    parser.add_argument("--resume", action="store_true",
+                        help="продолжить прерванный запуск: отправить только вопросы, которых нет в журнале")
+    parser.add_argument("--journal", default=journal_file_name, help="файл журнала результатов (SQLite)")
+    parser.add_argument("--manifest", default=manifest_file_name,
+                        help="манифест прошлого запуска: результаты неизменённых строк переносятся без запросов")
+    parser.add_argument("--full", action="store_true",
+                        help="обработать все строки заново, не перенося результаты из манифеста")
+    parser.add_argument("--output", default=sink_file_name,
+                        help="рабочий файл результатов: .jsonl, .csv или .parquet")
+    parser.add_argument("--cache", default=cache_file_name, help="файл кэша ответов модели (SQLite)")
+    parser.add_argument("--no-cache", action="store_true", help="не использовать кэш ответов")
+    parser.add_argument("--dedup", action="store_true",
+                        help="отправлять один вопрос из группы почти одинаковых, остальным копировать его ответ")
+    parser.add_argument("--dedup-threshold", type=float, default=DEFAULT_SIMILARITY_THRESHOLD,
+                        help="порог сходства вопросов (Жаккар по шинглам из 3 слов) для --dedup")
+    parser.add_argument("--dedup-report", default=dedup_report_file_name, help="отчёт о схлопнутых вопросах (CSV)")
+    parser.add_argument("--stream", action="store_true",
+                        help="потоковые ответы с остановкой после блока категории и прерыванием ответов не по шаблону")
+    parser.add_argument("--stream-log", default=stream_log_file_name,
+                        help="CSV с временем до первого фрагмента и сэкономленными токенами по запросам")
+    parser.add_argument("--route", action="append", metavar="МОДЕЛЬ:МАКС_ТОКЕНОВ",
+                        help="сначала отправлять вопросы до МАКС_ТОКЕНОВ входных токенов в МОДЕЛЬ "
+                             f"(можно несколько; по умолчанию {describe_routes(routes, model_name)})")
+    parser.add_argument("--no-routing", action="store_true", help=f"отправлять все вопросы сразу в {model_name}")
+    parser.add_argument("--input-budget", type=int, default=input_token_budget,
+                        help="бюджет входных токенов вопроса и ответов строки: повторы, приветствия и подписи "
+                             "убираются, наименее информативные ответы отбрасываются")
+    parser.add_argument("--compaction-report", default=compaction_report_file_name,
+                        help="CSV с токенами и ответами, убранными сжатием входа, по каждой строке")
+    parser.add_argument("--pre-classify", action="store_true",
+                        help="определять категорию локально и отправлять таким вопросам промпт без списка категорий")
+    parser.add_argument("--classifier-model", default=classifier_model_file_name,
+                        help="модель локального классификатора категорий (category_classifier.py train)")
+    parser.add_argument("--classifier-threshold", type=float, default=classifier_threshold,
+                        help="уверенность, с которой категория определяется локально")
+    parser.add_argument("--schedule", choices=[SCHEDULE_LONGEST, SCHEDULE_FILE], default=schedule_order,
+                        help="порядок запуска запросов: longest - самые длинные вопросы первыми (меньше хвост "
+                             "запуска), file - по порядку файла; результаты в любом случае пишутся в порядке id")
+    parser.add_argument("--fixed-max-tokens", action="store_true", default=not dynamic_max_tokens,
+                        help=f"всегда запрашивать max_tokens={max_output_tokens}, не подбирая его по длине ответов")
+    parser.add_argument("--parse-workers", type=int, default=parse_workers,
+                        help="число процессов для разбора ответов (0 - в основном процессе)")
+    parser.add_argument("--validation-retries", type=int, default=validation_retries,
+                        help="сколько раз повторять вопрос, ответ на который не прошёл проверку")
+    parser.add_argument("--max-in-flight", type=int, default=max_in_flight,
+                        help="число одновременных запросов к OpenAI")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="сколько вопросов отправлять одним запросом (1 - по одному)")
+    parser.add_argument("--batch-tokens", type=int, default=DEFAULT_BATCH_TOKEN_BUDGET,
+                        help="бюджет входных токенов вопросов в одном пакетном запросе")
+    parser.add_argument("--batch-api", action="store_true",
+                        help="обработать через Batch API (дешевле, результат в течение 24 часов)")
+    parser.add_argument("--batch-id", nargs="+", help="продолжить опрос уже отправленных заданий Batch API")
+    parser.add_argument("--poll-interval", type=float, default=30.0, help="интервал опроса Batch API, секунд")
+    parser.add_argument("--api-base", help="адрес API (например, http://127.0.0.1:8765/v1 для fake_openai_server.py)")
+    parser.add_argument("--api-key-env", help="имя переменной окружения с API-ключом этого процесса")
+    parser.add_argument("--rpm", type=int, default=requests_per_minute, help="бюджет запросов в минуту этого процесса")
+    parser.add_argument("--tpm", type=int, default=tokens_per_minute, help="бюджет токенов в минуту этого процесса")
+    parser.add_argument("--coordinator", action="store_true",
+                        help="разделить вход на шарды в --queue, дождаться их обработки и объединить результаты")
+    parser.add_argument("--worker", action="store_true", help="обрабатывать шарды из очереди --queue")
+    parser.add_argument("--queue", default=queue_file_name, help="файл очереди шардов (SQLite)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE, help="строк в шарде")
+    parser.add_argument("--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS,
+                        help="аренда шарда: если процесс не продлил её за это время, шард забирает другой")
+    parser.add_argument("--worker-id", help="имя рабочего процесса (по умолчанию хост-pid)")
+    parser.add_argument("--spawn-workers", type=int, default=0,
+                        help="сколько локальных рабочих процессов запустить из координатора")
+    parser.add_argument("--worker-keys", nargs="+", metavar="ENV",
+                        help="переменные окружения с API-ключами для локальных рабочих процессов (по кругу)")
+    return parser.parse_args()
+
+def main():
+    global requests_per_minute, tokens_per_minute
+    args = parse_args()
+    if args.api_base:
+        openai.api_base = args.api_base
+    if args.api_key_env:
+        openai.api_key = os.environ[args.api_key_env]
+    requests_per_minute, tokens_per_minute = args.rpm, args.tpm
+
+    # Загрузка шаблона промпта из файла
+    with open(prompt_file_name, "r", encoding="windows-1251") as prompt_file:
+        prompt_template = prompt_file.read()
+
+    # Оценка стоимости без обращения к API
+    if args.estimate:
+        print_estimate(estimate_cost(args.input, prompt_template, model_name, build_input_text,
+                                     *model_prices(model_name), tuple(args.output_tokens),
+                                     batch_size=args.batch_size, batch_tokens=args.batch_tokens,
+                                     routes=routes_from_args(args), input_budget=args.input_budget))
+        return
+
+    # Распределённая обработка через очередь шардов
+    if args.coordinator:
+        run_coordinator(args)
+        return
+    if args.worker:
+        cache = None if args.no_cache else ResponseCache(args.cache)
+        try:
+            run_queue_worker(args, prompt_template, cache)
+        finally:
+            if cache is not None:
+                cache.close()
+        return
+
+    # Входные данные читаются потоково (при повторных запусках - из колоночного кэша)
+    data = list(open_input_rows(args.input, use_cache=not args.no_input_cache))
+    hashes = [row_content_hash(question, answers) for question, answers in data]
+    data = compact_input(data, args.input_budget, args.compaction_report)
+    active_routes = routes_from_args(args)
+    fingerprint_model = f"{model_name} ({describe_routes(active_routes, model_name)})" if active_routes else model_name
+    if args.input_budget:
+        fingerprint_model += f", вход до {args.input_budget} токенов"
+    classifier = classifier_from_args(args, prompt_template)
+    if classifier is not None:
+        fingerprint_model += f", {classifier.fingerprint(args.classifier_model)}"
+    manifest = RunManifest(args.manifest, processing_fingerprint(fingerprint_model, prompt_template, max_output_tokens))
+    if manifest.stale:
+        print("Модель или промпт изменились - результаты прошлого запуска не переносятся")
+
+    # Журнал результатов: без --resume начинаем с чистого листа
+    journal = ResultJournal(args.journal)
+    if not args.resume:
+        journal.reset()
+
+    # Рабочий файл результатов: при --resume дописываем к уже сохранённым строкам.
+    # Перенесённые, повторённые после ошибки и скопированные с представителя строки пишутся не по порядку id,
+    # поэтому в конце запуска файл пересобирается из журнала
+    sink = open_sink(args.output, append=args.resume)
+
+    # Кэш ответов модели
+    cache = None if args.no_cache else ResponseCache(args.cache)
+
+    # Обрабатываем данные: сначала переносим результаты неизменённых строк, затем отправляем остальные
+    try:
+        if not args.full:
+            carry_forward_unchanged(hashes, manifest, journal, sink)
+        duplicates = {}
+        if args.dedup:
+            duplicates = collapse_near_duplicates(data, journal, args.dedup_threshold, args.dedup_report)
+        ai_options = ai_options_from_args(args, cache, classifier, stream_log=args.stream_log)
+        if args.batch_api or args.batch_id:
+            provider = OpenAIBatchProvider(api_base=args.api_base)
+            processed_results, total_tokens, total_cost = process_qna_with_batch_api(
+                prompt_template, data, journal, sink, provider, batch_ids=args.batch_id,
+                poll_interval=args.poll_interval, skip_ids=duplicates, validation_retries=args.validation_retries,
+                retry_options=ai_options)
+        else:
+            processed_results, total_tokens, total_cost = process_qna_with_ai(
+                prompt_template, data, journal, sink, skip_ids=duplicates,
+                validation_retries=args.validation_retries, **ai_options)
+        fan_out_duplicates(duplicates, journal, sink)
+    finally:
+        journal.commit()
+        sink.close()
+        if cache is not None:
+            cache.close()
+
+    # Итоговый XLSX выгружается один раз из журнала в порядке id (включая строки предыдущих запусков).
+    # Рабочий файл тоже пересобирается из журнала: одна строка на id, строки по возрастанию id.
+    rows = journal.rows()
+    rewrite_sink(args.output, rows)
+    export_to_xlsx(rows, output_file_name)
+    update_manifest(manifest, hashes, journal)
+    manifest.close()
+    journal.close()
+
+    print(f"Processed results saved to {args.output} and {output_file_name}")
+    print(f"Итоговая стоимость: ${total_cost:.4f}")
+    print(f"Итоговое количество токенов: {total_tokens}")
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Кэш ответов: попаданий {stats['hits']}, промахов {stats['misses']} ({stats['hit_rate'] * 100:.1f}%)")
 
-    with tqdm(total=len(input_data), desc="Обработка вопросов", unit="вопрос") as pbar:
-        for idx, row in input_data.iterrows():
-            question = row[0]
-            answers = row[1:].dropna().tolist()
-            input_text = f"Спаршенный вопрос с ответами:\n{question}#{'#'.join(map(str, answers))}"
-            input_tokens = count_tokens(input_text, model=model_name)
-
-            try:
-                response = openai.ChatCompletion.create(
-                    model=model_name,
-                    messages=[{"role": "system", "content": prompt_template},
-                              {"role": "user", "content": input_text}],
-                    max_tokens=1500,
-                    temperature=0.7
-                )
-                model_response = response['choices'][0]['message']['content'].strip()
-                output_tokens = count_tokens(model_response, model=model_name)
-                total_tokens += input_tokens + output_tokens
-                input_cost = calculate_cost(input_tokens, input=True)
-                output_cost = calculate_cost(output_tokens, input=False)
-                total_cost += input_cost + output_cost
-
-                reformulated_question, answer, category_id = parse_html_response(model_response)
-                results.append([idx + 1, reformulated_question, answer, category_id])
-
-                # Обновляем прогресс-бар
-                pbar.set_postfix({"Токены": total_tokens, "Стоимость": total_cost})
-                pbar.update(1)
-
-                # Сохраняем каждые 100 вопросов
-                if (idx + 1) % 100 == 0:
-                    save_to_excel(results, output_file_name)
-                    results.clear()  # Очищаем список для следующей партии
-            except Exception as e:
-                print(f"Ошибка при обработке вопроса {idx + 1}: {question}\n{str(e)}")
-                results.append([idx + 1, "Ошибка", "Ошибка", "Не определена"])
-
-    return results, total_tokens, total_cost
-
-# Функция для сохранения данных в Excel
-def save_to_excel(data, file_name):
-    df = pd.DataFrame(data, columns=["id", "переформулированный вопрос", "ответ", "категория"])
-    with pd.ExcelWriter(file_name, mode='a', engine='openpyxl', if_sheet_exists='overlay') as writer:
-        start_row = writer.sheets['Sheet1'].max_row if 'Sheet1' in writer.sheets else 0
-        df.to_excel(writer, index=False, header=start_row == 0, startrow=start_row)
-
-# Загрузка шаблона промпта из файла
-with open(prompt_file_name, "r", encoding="windows-1251") as prompt_file:
-    prompt_template = prompt_file.read()
-
-# Загрузка входных данных из XLSX
-data = pd.read_excel(input_file_name, sheet_name=0, header=None)
-
-# Инициализация файла
-pd.DataFrame(columns=["id", "переформулированный вопрос", "ответ", "категория"]).to_excel(output_file_name, index=False)
-
-# Обра батываем данные
-processed_results, total_tokens, total_cost = process_qna_with_ai(prompt_template, data)
-
-# Сохраняем оставшиеся данные
-if processed_results:
-    save_to_excel(processed_results, output_file_name)
-
-print(f"Processed results saved to {output_file_name}")
-print(f"Итоговая стоимость: ${total_cost:.4f}")
-print(f"Итоговое количество токенов: {total_tokens}")
+if __name__ == "__main__":
+    main()
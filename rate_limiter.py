@@ -0,0 +1,116 @@
+import asyncio
+import re
+import time
+
+# Лимиты аккаунта по умолчанию (запросов и токенов в минуту)
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 300_000
+
+
+# Функция для перевода длительности из заголовков OpenAI ("6m0s", "1.5s", "20ms") в секунды
+def parse_reset_duration(value):
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = re.findall(r"(\d+(?:\.\d+)?)(ms|h|m|s)", value)
+    if not parts:
+        return None
+    multipliers = {"h": 3600, "m": 60, "s": 1, "ms": 0.001}
+    return sum(float(number) * multipliers[unit] for number, unit in parts)
+
+
+# Клиентский планировщик запросов: два «ведра» токенов (запросы/мин и токены/мин)
+# с адаптивной скоростью по схеме AIMD - при 429 скорость уменьшается вдвое,
+# после каждого успешного запроса понемногу возвращается к лимиту аккаунта.
+# Скорость снижается не чаще раза за decrease_cooldown секунд (или за паузу Retry-After, если она длиннее):
+# пачка 429 от запросов, которые уже были в работе, - это одна перегрузка, а не несколько.
+class RateLimiter:
+    def __init__(self, requests_per_minute=DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=DEFAULT_TOKENS_PER_MINUTE,
+                 decrease_factor=0.5, increase_step=0.02, min_scale=0.05, decrease_cooldown=1.0):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step
+        self.min_scale = min_scale
+        self.decrease_cooldown = decrease_cooldown
+        self.decrease_until = 0.0  # До этого момента новые 429 скорость не снижают
+        self.scale = 1.0  # Доля от лимита аккаунта, которую сейчас используем
+        self.available_requests = float(requests_per_minute)
+        self.available_tokens = float(tokens_per_minute)
+        self.blocked_until = 0.0  # Пауза после 429 (Retry-After)
+        self.rate_limited_count = 0
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        request_capacity = self.requests_per_minute * self.scale
+        token_capacity = self.tokens_per_minute * self.scale
+        self.available_requests = min(request_capacity, self.available_requests + elapsed * request_capacity / 60)
+        self.available_tokens = min(token_capacity, self.available_tokens + elapsed * token_capacity / 60)
+
+    # Ожидание, пока в обоих «ведрах» хватит места для запроса стоимостью tokens
+    async def acquire(self, tokens):
+        async with self._lock:
+            while True:
+                self._refill()
+                # Запрос больше текущей ёмкости ведра не должен блокировать очередь навсегда
+                tokens_needed = min(tokens, self.tokens_per_minute * self.scale)
+                wait = max(0.0, self.blocked_until - time.monotonic())
+                if wait == 0 and self.available_requests >= 1 and self.available_tokens >= tokens_needed:
+                    self.available_requests -= 1
+                    self.available_tokens -= tokens_needed
+                    return
+                if wait == 0:
+                    request_rate = self.requests_per_minute * self.scale / 60
+                    token_rate = self.tokens_per_minute * self.scale / 60
+                    wait = max((1 - self.available_requests) / request_rate,
+                               (tokens_needed - self.available_tokens) / token_rate, 0.01)
+                await asyncio.sleep(wait)
+
+    # Успешный ответ - аддитивно увеличиваем скорость
+    def on_success(self):
+        self.scale = min(1.0, self.scale + self.increase_step)
+
+    # Ответ 429 - мультипликативно уменьшаем скорость (не чаще раза за период охлаждения) и выдерживаем паузу
+    def on_rate_limited(self, retry_after=None):
+        self.rate_limited_count += 1
+        now = time.monotonic()
+        if now >= self.decrease_until:
+            self.scale = max(self.min_scale, self.scale * self.decrease_factor)
+            self.decrease_until = now + max(self.decrease_cooldown, retry_after or 0)
+        self.available_requests = min(self.available_requests, 0.0)
+        self.available_tokens = min(self.available_tokens, 0.0)
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+    # Учёт заголовков x-ratelimit-* и Retry-After из ответа OpenAI
+    def observe_headers(self, headers):
+        if not headers:
+            return
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_requests is not None:
+            self.available_requests = min(self.available_requests, float(remaining_requests))
+        if remaining_tokens is not None:
+            self.available_tokens = min(self.available_tokens, float(remaining_tokens))
+        retry_after = parse_reset_duration(headers.get("retry-after"))
+        if retry_after:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+
+
+# Функция для получения паузы из ошибки 429: наибольшее из Retry-After и x-ratelimit-reset-* -
+# по ошибке не видно, какой лимит исчерпан (запросов или токенов), поэтому ждём сброса обоих
+def retry_after_from_error(error):
+    headers = getattr(error, "headers", None) or {}
+    values = [parse_reset_duration(headers.get(name))
+              for name in ("retry-after", "x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+    values = [seconds for seconds in values if seconds]
+    return max(values) if values else None
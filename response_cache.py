@@ -0,0 +1,98 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Максимальный размер кэша по умолчанию (байт ответов)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+# Функция для построения ключа кэша: хэш от модели, системного промпта, входного текста и параметров генерации
+def make_cache_key(model, system_prompt, input_text, temperature, max_tokens):
+    payload = json.dumps([model, system_prompt, input_text, temperature, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# Локальный кэш ответов модели в SQLite с вытеснением давно не используемых записей (LRU по размеру)
+class ResponseCache:
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES, commit_every=50):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.commit_every = commit_every
+        self.pending = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT,
+                size INTEGER,
+                last_used REAL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self.connection.commit()
+        self.total_bytes = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, model, system_prompt, input_text, temperature, max_tokens):
+        key = make_cache_key(model, system_prompt, input_text, temperature, max_tokens)
+        with self._lock:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._maybe_commit()
+            return row[0]
+
+    def put(self, model, system_prompt, input_text, temperature, max_tokens, response):
+        key = make_cache_key(model, system_prompt, input_text, temperature, max_tokens)
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            old = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if old is not None:
+                self.total_bytes -= old[0]
+            self.connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                                    (key, response, size, time.time()))
+            self.total_bytes += size
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self._maybe_commit()
+
+    # Удаление самых старых по использованию записей, пока кэш не станет меньше 90% лимита
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        cursor = self.connection.execute("SELECT key, size FROM responses ORDER BY last_used")
+        evicted = []
+        for key, size in cursor:
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        self.connection.executemany("DELETE FROM responses WHERE key = ?", evicted)
+
+    def _maybe_commit(self):
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.connection.commit()
+            self.pending = 0
+
+    # Статистика попаданий в кэш
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size_bytes": self.total_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            self.connection.commit()
+            self.connection.close()
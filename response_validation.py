@@ -0,0 +1,65 @@
+import re
+from collections import Counter
+
+from categories import is_valid_category
+
+# Типы ошибок проверки ответа модели и их описание для отчёта
+VALIDATION_ERRORS = {
+    "missing_question": "нет блока «Вопрос:»",
+    "missing_answer": "нет блока «Ответ:»",
+    "empty_answer": "пустой ответ",
+    "missing_category": "нет блока «Категория:»",
+    "invalid_category": "категория не число",
+    "category_out_of_range": "категория вне списка 1..30",
+}
+
+# Повторов одного вопроса после ответа, не прошедшего проверку
+DEFAULT_VALIDATION_RETRIES = 2
+
+# Доля вопросов запуска, для которых допускаются повторы (ограничивает перерасход при системной ошибке промпта)
+DEFAULT_RETRY_SHARE = 0.2
+
+
+# Функция для проверки разобранного ответа (вопрос, ответ, категория).
+# Возвращает тип ошибки из VALIDATION_ERRORS или None, если ответ корректен.
+# categories - словарь категорий из промпта; None - категория не проверяется.
+def validate_response(parsed, categories):
+    question, answer, category = parsed
+    if question in ("Вопрос не найден", "Ошибка при разборе вопроса"):
+        return "missing_question"
+    if answer in ("Заголовок 'Ответ:' не найден", "Ошибка при разборе ответа"):
+        return "missing_answer"
+    if not re.sub(r"<[^>]*>", "", answer).strip():
+        return "empty_answer"
+    if categories is None:
+        return None
+    if category == "Ошибка":
+        return "missing_category"
+    if not str(category).isdigit():
+        return "invalid_category"
+    if not is_valid_category(category, categories):
+        return "category_out_of_range"
+    return None
+
+
+# Учёт проверки ответов за запуск: ошибки по типам, повторы, исправленные и оставшиеся с ошибкой вопросы.
+# Общее число повторов ограничено max_retries.
+class ValidationStats:
+    def __init__(self, max_retries):
+        self.max_retries = max_retries
+        self.errors = Counter()
+        self.retries = 0
+        self.recovered = 0
+        self.failed = 0
+
+    # Функция для резервирования повтора: False, если бюджет повторов запуска исчерпан
+    def take_retry(self):
+        if self.retries >= self.max_retries:
+            return False
+        self.retries += 1
+        return True
+
+    def summary(self):
+        errors = ", ".join(f"{VALIDATION_ERRORS[error]}: {count}" for error, count in self.errors.most_common())
+        return (f"Проверка ответов: повторов {self.retries} (бюджет {self.max_retries}), исправлено {self.recovered}, "
+                f"осталось с ошибкой {self.failed}" + (f"; ошибки - {errors}" if errors else ""))
@@ -0,0 +1,85 @@
+import sqlite3
+import threading
+import time
+
+# Статусы строк в журнале
+STATUS_OK = "ok"  # Ответ получен и разобран
+STATUS_ERROR = "error"  # Запрос завершился ошибкой, при --resume строка отправляется повторно
+STATUS_INVALID = "invalid"  # Ответ не прошёл проверку после всех повторов, при --resume строка отправляется повторно
+
+
+# Журнал результатов в SQLite (режим WAL): каждая обработанная строка записывается сразу,
+# а фиксация на диск (fsync) выполняется партиями - каждые commit_every строк или commit_interval секунд.
+# Несколько процессов могут писать в один журнал одновременно, SQLite сам разруливает блокировки.
+class ResultJournal:
+    def __init__(self, path, commit_every=50, commit_interval=2.0):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self.pending = 0
+        self.last_commit = time.monotonic()
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY,
+                question TEXT,
+                answer TEXT,
+                category TEXT,
+                input_tokens INTEGER DEFAULT 0,
+                output_tokens INTEGER DEFAULT 0,
+                status TEXT,
+                updated_at REAL
+            )
+        """)
+        self.connection.commit()
+
+    # Запись результата [id, вопрос, ответ, категория]
+    def record(self, row, input_tokens=0, output_tokens=0, status=STATUS_OK):
+        with self._lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (int(row[0]), str(row[1]), str(row[2]), str(row[3]),
+                 input_tokens, output_tokens, status, time.time())
+            )
+            self.pending += 1
+            if self.pending >= self.commit_every or time.monotonic() - self.last_commit >= self.commit_interval:
+                self._commit()
+
+    def _commit(self):
+        self.connection.commit()
+        self.pending = 0
+        self.last_commit = time.monotonic()
+
+    def commit(self):
+        with self._lock:
+            self._commit()
+
+    # id строк, которые уже успешно обработаны и не требуют повторной отправки
+    def completed_ids(self):
+        with self._lock:
+            cursor = self.connection.execute("SELECT id FROM results WHERE status = ?", (STATUS_OK,))
+            return {row[0] for row in cursor}
+
+    # Все строки журнала в порядке id (status - только строки с этим статусом)
+    def rows(self, status=None):
+        with self._lock:
+            if status is None:
+                cursor = self.connection.execute("SELECT id, question, answer, category FROM results ORDER BY id")
+            else:
+                cursor = self.connection.execute(
+                    "SELECT id, question, answer, category FROM results WHERE status = ? ORDER BY id", (status,))
+            return [list(row) for row in cursor]
+
+    # Очистка журнала перед новым (не продолжаемым) запуском
+    def reset(self):
+        with self._lock:
+            self.connection.execute("DELETE FROM results")
+            self._commit()
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            self.connection.close()
@@ -0,0 +1,81 @@
+import hashlib
+import sqlite3
+import time
+
+# Сколько хэшей запрашивается из манифеста за один SELECT (ограничение SQLite на число параметров)
+LOOKUP_CHUNK_SIZE = 500
+
+
+# Функция для хэша содержимого исходной строки (вопрос + ответы).
+# Значения приводятся к строкам и обрезаются по краям, чтобы 1 и "1" из разных форматов давали один хэш.
+def row_content_hash(question, answers):
+    parts = ["" if question is None else str(question).strip()]
+    parts.extend(str(answer).strip() for answer in answers)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+# Функция для отпечатка настроек обработки: при смене модели или промпта прежние результаты не переносятся
+def processing_fingerprint(model, prompt_template, max_tokens):
+    return hashlib.sha256(f"{model}\x1f{max_tokens}\x1f{prompt_template}".encode("utf-8")).hexdigest()
+
+
+# Манифест прошлого запуска в SQLite: хэш содержимого исходной строки -> результат обработки.
+# Строки, хэш которых есть в манифесте, не отправляются повторно - их результат переносится в новый запуск.
+# fingerprint - отпечаток настроек; если он не совпадает с записанным, манифест считается устаревшим.
+class RunManifest:
+    def __init__(self, path, fingerprint=""):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS rows (
+                hash TEXT PRIMARY KEY,
+                row_id INTEGER,
+                question TEXT,
+                answer TEXT,
+                category TEXT,
+                updated_at REAL
+            )
+        """)
+        self.connection.commit()
+        stored = self.connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+        self.stale = stored is not None and stored[0] != fingerprint
+
+    # Число строк в манифесте (у устаревшего манифеста - 0)
+    def __len__(self):
+        if self.stale:
+            return 0
+        return self.connection.execute("SELECT COUNT(*) FROM rows").fetchone()[0]
+
+    # Функция для поиска результатов по хэшам: {хэш: (вопрос, ответ, категория)}
+    def lookup(self, hashes):
+        found = {}
+        if self.stale:
+            return found
+        hashes = list(dict.fromkeys(hashes))
+        for start in range(0, len(hashes), LOOKUP_CHUNK_SIZE):
+            chunk = hashes[start:start + LOOKUP_CHUNK_SIZE]
+            cursor = self.connection.execute(
+                f"SELECT hash, question, answer, category FROM rows WHERE hash IN ({','.join('?' * len(chunk))})",
+                chunk)
+            for row_hash, question, answer, category in cursor:
+                found[row_hash] = (question, answer, category)
+        return found
+
+    # Функция для замены содержимого манифеста результатами текущего запуска.
+    # entries - (хэш, id, вопрос, ответ, категория); строки, которых нет в текущей выгрузке, удаляются.
+    def replace(self, entries):
+        now = time.time()
+        with self.connection:
+            self.connection.execute("DELETE FROM rows")
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (self.fingerprint,))
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?, ?)",
+                ((row_hash, int(row_id), str(question), str(answer), str(category), now)
+                 for row_hash, row_id, question, answer, category in entries))
+        self.stale = False
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,120 @@
+# Планирование запросов для сокращения «хвоста» запуска.
+# Запросы запускаются в порядке убывания оценки стоимости (longest processing time first): самые длинные ветки
+# уходят в начале, а в конце остаются короткие, которые равномерно заполняют окно одновременных запросов.
+# Результаты по-прежнему выдаются в порядке id (run_in_order, on_ordered).
+# max_tokens каждого запроса выводится из процентиля длины уже полученных ответов для входа похожего размера
+# (OutputLengthModel), поэтому ограничитель скорости резервирует меньше токенов, чем при постоянных 1500.
+import heapq
+import math
+from collections import deque
+
+# Порядок запуска запросов
+SCHEDULE_FILE = "file"  # В порядке входного файла
+SCHEDULE_LONGEST = "longest"  # По убыванию оценки стоимости
+
+# Процентиль длины ответа и запас сверху для max_tokens
+DEFAULT_OUTPUT_PERCENTILE = 95
+DEFAULT_OUTPUT_MARGIN = 1.25
+
+# Нижняя граница max_tokens и шаг округления
+MIN_DYNAMIC_MAX_TOKENS = 300
+MAX_TOKENS_STEP = 50
+
+# Сколько ответов нужно получить, прежде чем max_tokens начнёт выводиться из наблюдений
+DEFAULT_WARMUP = 50
+
+# Число групп по размеру входа и сколько последних ответов хранится в каждой
+DEFAULT_SIZE_BINS = 4
+OBSERVATIONS_PER_BIN = 2000
+
+
+# Функция для порядка запуска: позиции элементов по убыванию стоимости (при равной - в исходном порядке)
+def longest_first_order(costs):
+    return sorted(range(len(costs)), key=lambda position: (-costs[position], position))
+
+
+# Функция для времени выполнения (makespan) при жадной раздаче элементов в заданном порядке workers исполнителям:
+# каждый следующий элемент достаётся исполнителю, который освободился первым (как окно run_in_order)
+def simulate_makespan(durations, order, workers):
+    finish_times = [0.0] * max(1, min(workers, len(order)))
+    for position in order:
+        heapq.heapreplace(finish_times, finish_times[0] + durations[position])
+    return max(finish_times) if order else 0.0
+
+
+# Функция для значения процентиля отсортированного списка
+def percentile(sorted_values, share):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(math.ceil(len(sorted_values) * share / 100)) - 1)]
+
+
+# Модель длины ответа: max_tokens запроса - процентиль длины ответов с входом того же размера, умноженный
+# на запас и ограниченный [MIN_DYNAMIC_MAX_TOKENS, max_tokens]. Группы по размеру входа задаются квантилями
+# оценок входных токенов запуска. Пока ответов меньше warmup, возвращается max_tokens.
+class OutputLengthModel:
+    def __init__(self, max_tokens, input_sizes, percentile_share=DEFAULT_OUTPUT_PERCENTILE,
+                 margin=DEFAULT_OUTPUT_MARGIN, warmup=DEFAULT_WARMUP, bins=DEFAULT_SIZE_BINS):
+        self.max_tokens = max_tokens
+        self.percentile_share = percentile_share
+        self.margin = margin
+        self.warmup = warmup
+        sizes = sorted(input_sizes)
+        self.edges = [percentile(sizes, 100 * step / bins) for step in range(1, bins)] if sizes else []
+        self.observations = [deque(maxlen=OBSERVATIONS_PER_BIN) for _ in range(len(self.edges) + 1)]
+        self.observed = 0
+        self.truncated = 0  # Ответы, упёршиеся в уменьшенный max_tokens и запрошенные заново
+        self.reserved = 0  # Сумма max_tokens выданных запросов
+        self.requests = 0
+
+    def _bin(self, input_tokens):
+        return sum(1 for edge in self.edges if input_tokens > edge)
+
+    # Функция для учёта длины полученного ответа
+    def observe(self, input_tokens, output_tokens):
+        self.observations[self._bin(input_tokens)].append(output_tokens)
+        self.observed += 1
+
+    # Функция для max_tokens запроса со входом input_tokens
+    def max_tokens_for(self, input_tokens):
+        limit = self.max_tokens
+        if self.observed >= self.warmup:
+            values = self.observations[self._bin(input_tokens)]
+            if len(values) < self.warmup // 2:
+                values = [value for observations in self.observations for value in observations]
+            limit = percentile(sorted(values), self.percentile_share) * self.margin
+            limit = math.ceil(limit / MAX_TOKENS_STEP) * MAX_TOKENS_STEP
+            limit = max(MIN_DYNAMIC_MAX_TOKENS, min(self.max_tokens, limit))
+        self.reserved += limit
+        self.requests += 1
+        return limit
+
+    def summary(self):
+        average = self.reserved / self.requests if self.requests else self.max_tokens
+        return (f"max_tokens по длине ответов (p{self.percentile_share} x {self.margin}): в среднем {average:.0f} "
+                f"вместо {self.max_tokens} ({self.requests} запросов), "
+                f"повторено из-за обрезанного ответа {self.truncated}")
+
+
+# Учёт расписания: длительность каждого запроса (группы) и оценка makespan при разных порядках запуска
+class ScheduleStats:
+    def __init__(self, workers):
+        self.workers = workers
+        self.durations = {}  # позиция -> секунды
+
+    def record(self, position, seconds):
+        self.durations[position] = seconds
+
+    # Отчёт: фактическое время и моделирование по измеренным длительностям для порядка файла и порядка запуска
+    def report(self, order, wall_seconds):
+        if not self.durations:
+            return "Расписание: запросов не было"
+        positions = set(self.durations)
+        durations = [self.durations.get(position, 0.0) for position in range(max(positions) + 1)]
+        order = [position for position in order if position in positions]
+        file_makespan = simulate_makespan(durations, sorted(positions), self.workers)
+        scheduled_makespan = simulate_makespan(durations, order, self.workers)
+        gain = (file_makespan - scheduled_makespan) / file_makespan * 100 if file_makespan else 0.0
+        return (f"Расписание: фактически {wall_seconds:.1f} с; по измеренным длительностям при окне {self.workers} "
+                f"в порядке файла {file_makespan:.1f} с, в порядке запуска {scheduled_makespan:.1f} с "
+                f"(выигрыш {gain:.1f}%, без учёта ограничителя скорости)")
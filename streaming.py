@@ -0,0 +1,86 @@
+# Потоковый режим ответов: HTML проверяется по мере поступления токенов.
+# Поток останавливается, как только закрылся блок «Категория:» (дальше модель может только дописывать лишнее),
+# и прерывается сразу, если начало ответа не похоже на шаблон <div><h2>Вопрос: - такой ответ всё равно
+# не пройдёт проверку, и платить за его оставшиеся токены незачем.
+import csv
+import re
+
+from token_accounting import count_tokens
+
+# Ожидаемое начало ответа (пробелы между тегами и обёртка ```html допускаются)
+EXPECTED_START_RE = re.compile(r"(?:```\w*\s*)?<div[^>]*>\s*<h2>\s*Вопрос:")
+
+# Сколько символов начала ответа достаточно, чтобы решить, что он не по шаблону
+START_CHECK_CHARS = 64
+
+CATEGORY_HEADING = "Категория:"
+
+# Причины остановки потока
+STOP_COMPLETE = "complete"  # Блок категории закрыт
+STOP_OFF_FORMAT = "off_format"  # Начало ответа не по шаблону
+
+
+# Проверка ответа по мере поступления фрагментов
+class StreamMonitor:
+    def __init__(self):
+        self.text = ""
+        self.start_ok = False
+        self.scanned = 0  # До какой позиции текст уже просмотрен в поисках заголовка категории
+        self.category_at = -1
+
+    # Функция для добавления фрагмента; возвращает причину остановки или None, если поток читается дальше
+    def feed(self, delta):
+        self.text += delta
+        if not self.start_ok:
+            head = self.text.lstrip()
+            if EXPECTED_START_RE.match(head):
+                self.start_ok = True
+            elif len(head) >= START_CHECK_CHARS or (head and head[0] not in "<`"):
+                return STOP_OFF_FORMAT
+            else:
+                return None
+        if self.category_at < 0:
+            self.category_at = self.text.find(CATEGORY_HEADING, max(0, self.scanned - len(CATEGORY_HEADING)))
+            self.scanned = len(self.text)
+        if self.category_at >= 0 and "</p>" in self.text[self.category_at:]:
+            return STOP_COMPLETE
+        return None
+
+
+# Учёт потоковых запросов: время до первого фрагмента и токены, сэкономленные остановкой потока.
+# Сэкономленные токены - оценка сверху: max_tokens минус полученные токены.
+class StreamStats:
+    def __init__(self, model):
+        self.model = model
+        self.records = []
+
+    # Функция для записи результата одного потокового запроса
+    def record(self, text, usage, ttfb, stop_reason, max_tokens):
+        output_tokens = usage[1] if usage is not None else count_tokens(text, self.model)
+        self.records.append({
+            "ttfb_ms": round(ttfb * 1000, 1) if ttfb is not None else None,
+            "output_tokens": output_tokens,
+            "stop": stop_reason or "",
+            "tokens_saved": max(0, max_tokens - output_tokens) if stop_reason else 0,
+        })
+
+    def summary(self):
+        if not self.records:
+            return "Потоковых запросов не было"
+        ttfbs = sorted(record["ttfb_ms"] for record in self.records if record["ttfb_ms"] is not None)
+        ttfb_p50 = ttfbs[len(ttfbs) // 2] if ttfbs else 0.0
+        ttfb_p90 = ttfbs[min(len(ttfbs) - 1, int(len(ttfbs) * 0.9))] if ttfbs else 0.0
+        parts = [f"Потоковые запросы: {len(self.records)}, TTFB p50 {ttfb_p50:.0f} мс, p90 {ttfb_p90:.0f} мс"]
+        for stop_reason, label in ((STOP_COMPLETE, "остановлено после категории"),
+                                   (STOP_OFF_FORMAT, "прервано из-за формата")):
+            stopped = [record for record in self.records if record["stop"] == stop_reason]
+            saved = sum(record["tokens_saved"] for record in stopped)
+            parts.append(f"{label} {len(stopped)} (сэкономлено не больше {saved} выходных токенов)")
+        return "; ".join(parts)
+
+    # Функция для сохранения данных по каждому запросу в CSV
+    def write_csv(self, path):
+        with open(path, "w", encoding="utf-8-sig", newline="") as log_file:
+            writer = csv.DictWriter(log_file, fieldnames=["ttfb_ms", "output_tokens", "stop", "tokens_saved"])
+            writer.writeheader()
+            writer.writerows(self.records)
@@ -0,0 +1,5 @@
+# Скрипты лежат в корне репозитория без пакета - добавляем корень в путь импорта
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,106 @@
+import random
+import re
+
+import pytest
+
+from bench_html_parser import make_sample_response, parse_html_response_bs4
+from html_response_parser import parse_html_response, extract_category_from_html
+
+bs4 = pytest.importorskip("bs4")
+
+ANSWER = """<div>
+  <h3>Что сделать в первую очередь:</h3>
+  <p>Отключите технику от сети &amp; проверьте <b>датчик</b>.</p>
+</div>
+<div>
+  <h3>Диагностика:</h3>
+  <ol>
+    <li>Шаг 1</li>
+    <li>Шаг 2<br>и дальше</li>
+  </ol>
+</div>"""
+
+# Ответы модели, на которых проверяется совпадение с прежним парсером BeautifulSoup
+EDGE_CASES = {
+    "обычный ответ": f"<div><h2>Вопрос:</h2><p>Почему не морозит?</p><h2>Ответ:</h2>{ANSWER}"
+                     f"<h3>Категория:</h3><p>12</p></div>",
+    "обёртка ```html": f"```html\n<div>\n<h2>Вопрос:</h2>\n<p>Вопрос</p>\n<h2>Ответ:</h2>\n{ANSWER}\n"
+                       f"<h3>Категория:</h3>\n<p>7</p>\n</div>\n```",
+    "категория не число": f"<div><h2>Вопрос:</h2><p>В</p><h2>Ответ:</h2>{ANSWER}"
+                          f"<h3>Категория:</h3><p>Холодильники</p></div>",
+    "категория 0": f"<div><h2>Вопрос:</h2><p>В</p><h2>Ответ:</h2>{ANSWER}<h3>Категория:</h3><p>0</p></div>",
+    "нет блока категории": f"<div><h2>Вопрос:</h2><p>В</p><h2>Ответ:</h2>{ANSWER}</div>",
+    "нет заголовка ответа": "<div><h2>Вопрос:</h2><p>В</p><h3>Категория:</h3><p>3</p></div>",
+    "нет вопроса": f"<div><h2>Ответ:</h2>{ANSWER}<h3>Категория:</h3><p>3</p></div>",
+    "незакрытые теги": "<div><h2>Вопрос:</h2><p>В<h2>Ответ:</h2><div><p>Текст<ul><li>пункт"
+                       "<h3>Категория:</h3><p>5",
+    "лишний закрывающий тег": f"<div><h2>Вопрос:</h2><p>В</p></span><h2>Ответ:</h2>{ANSWER}</b>"
+                              f"<h3>Категория:</h3><p>4</p></div>",
+    "категория внутри ответа": f"<div><h2>Вопрос:</h2><p>В</p><h2>Ответ:</h2><div>{ANSWER}"
+                               f"<h3>Категория:</h3><p>9</p></div></div>",
+    "второй заголовок h2 после ответа": f"<div><h2>Вопрос:</h2><p>В</p><h2>Ответ:</h2>{ANSWER}"
+                                        f"<h2>Примечание:</h2><p>лишнее</p><h3>Категория:</h3><p>2</p></div>",
+    "атрибуты и пробелы": f'<div class="qna">\n  <h2>Вопрос:</h2>\n  <p class="q">  Вопрос  </p>\n'
+                          f'  <h2>Ответ:</h2>\n  <div data-x="a&quot;b">{ANSWER}</div>\n'
+                          f'  <h3>Категория:</h3>\n  <p> 15 </p>\n</div>',
+    "незакрытый абзац вопроса": f"<div><h2>Вопрос:</h2><p>В<h3>Категория:</h3><p>5</p></div>",
+    "категория раньше абзаца вопроса": "<h2>Вопрос:</h2><div><h3>Категория:</h3><p>5</p></div><p>Вопрос</p>",
+    "повтор заголовка вопроса": "<h2>Вопрос:</h2><p>а<h2>Вопрос:</h2><p>б</p></p>",
+    "незакрытый заголовок ответа": f"<div><h2>Вопрос:</h2><p>В</p><h2>Ответ:\n{ANSWER}"
+                                   f"<h3>Категория:</h3><p>8</p></div>",
+    "заголовок с лишним содержимым": f"<div><h2>Вопрос:</h2><p>В</p><h2>Ответ:</h2>{ANSWER}"
+                                     f"<h3>Категория:<h3></h3><p>28</p></h3></div>",
+    "заголовок во вложенном теге": f"<div><h2><b>Вопрос:</b></h2><p>В</p><h2>Ответ:</h2>{ANSWER}"
+                                   f"<h3>Категория:</h3><p>1</p></div>",
+    "кавычки в атрибутах": f"<div><h2>Вопрос:</h2><p>В</p><h2>Ответ:</h2>"
+                           f"<p title='двойная \"' alt=\"одинарная '\" data-x='обе \"&#39;'>т</p></div>",
+    "пустой ответ": "",
+    "не HTML": "Извините, я не могу ответить на этот вопрос.",
+}
+
+
+@pytest.mark.parametrize("name", list(EDGE_CASES))
+def test_matches_bs4_parser_on_edge_cases(name):
+    html = EDGE_CASES[name]
+    assert parse_html_response(html) == parse_html_response_bs4(html)
+
+
+def test_matches_bs4_parser_on_generated_responses():
+    rng = random.Random(1)
+    for _ in range(200):
+        html = make_sample_response(rng)
+        assert parse_html_response(html) == parse_html_response_bs4(html)
+
+
+# Функция для порчи ответа: случайные теги удаляются или повторяются в другом месте (как в оборванных ответах модели)
+def damage(html, rng):
+    tags = [match.span() for match in re.finditer(r"</?[a-z0-9]+>", html)]
+    for _ in range(rng.randint(1, 4)):
+        start, end = rng.choice(tags)
+        if rng.random() < 0.5:
+            html = html[:start] + " " * (end - start) + html[end:]
+        else:
+            position = rng.choice(tags)[0]
+            return html[:position] + html[start:end] + html[position:]
+    return html
+
+
+def test_matches_bs4_parser_on_damaged_responses():
+    rng = random.Random(2)
+    for _ in range(500):
+        html = damage(make_sample_response(rng), rng)
+        assert parse_html_response(html) == parse_html_response_bs4(html), html
+
+
+def test_category_block_is_removed_from_answer():
+    question, answer, category = parse_html_response(EDGE_CASES["обычный ответ"])
+    assert question == "Почему не морозит?"
+    assert category == "12"
+    assert "Категория:" not in answer
+    assert answer.startswith("<div>") and answer.endswith("</div>")
+
+
+def test_extract_category_from_html():
+    assert extract_category_from_html(EDGE_CASES["обычный ответ"]) == "12"
+    assert extract_category_from_html(EDGE_CASES["категория не число"]) == "Не определена"
+    assert extract_category_from_html(EDGE_CASES["нет блока категории"]) == "Ошибка"
@@ -0,0 +1,61 @@
+from micro_batching import build_batch_input, pack_batches, split_batch_response, split_tokens
+
+
+# Ответ модели на пакет: blocks - список (id, HTML блока)
+def batch_reply(blocks):
+    return "\n".join(f"<!-- QNA id={row_id} -->\n{html}\n<!-- /QNA -->" for row_id, html in blocks)
+
+
+def test_split_batch_response():
+    reply = batch_reply([(3, "<div>три</div>"), (7, "<div>семь</div>")])
+    assert split_batch_response(reply) == {3: "<div>три</div>", 7: "<div>семь</div>"}
+
+
+def test_missing_block_is_absent():
+    reply = batch_reply([(1, "<div>один</div>"), (3, "<div>три</div>")])
+    blocks = split_batch_response(reply)
+    assert set(blocks) == {1, 3}
+    assert 2 not in blocks
+
+
+def test_duplicated_block_keeps_first():
+    reply = batch_reply([(1, "<div>первый</div>"), (2, "<div>два</div>"), (1, "<div>повтор</div>")])
+    assert split_batch_response(reply) == {1: "<div>первый</div>", 2: "<div>два</div>"}
+
+
+def test_unclosed_block_and_text_outside_markers_are_ignored():
+    reply = "Вот ответы:\n" + batch_reply([(1, "<div>один</div>")]) + "\n<!-- QNA id=2 -->\n<div>оборван"
+    assert split_batch_response(reply) == {1: "<div>один</div>"}
+
+
+def test_markers_with_extra_spaces():
+    assert split_batch_response("<!--QNA  id=5-->\n<p>x</p>\n<!--  /QNA-->") == {5: "<p>x</p>"}
+
+
+def test_empty_reply():
+    assert split_batch_response("") == {}
+
+
+def test_build_batch_input_keeps_ids():
+    text = build_batch_input([(4, "вопрос 4"), (9, "вопрос 9")])
+    assert text == "=== ВОПРОС id=4 ===\nвопрос 4\n\n=== ВОПРОС id=9 ===\nвопрос 9"
+
+
+def test_pack_batches_respects_size_and_budget():
+    items = [10, 10, 10, 50, 10, 200, 10]
+    batches = pack_batches(items, lambda tokens: tokens, batch_size=3, token_budget=60, output_tokens_per_item=1)
+    assert batches == [[10, 10, 10], [50, 10], [200], [10]]
+    assert [item for batch in batches for item in batch] == items
+
+
+def test_pack_batches_limits_output_reserve():
+    batches = pack_batches(range(10), lambda item: 1, batch_size=8, output_tokens_per_item=1500,
+                           max_output_tokens=6000)
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+
+
+def test_split_tokens_keeps_total():
+    assert split_tokens(100, [1, 1, 2]) == [25, 25, 50]
+    assert sum(split_tokens(101, [3, 5, 7])) == 101
+    assert split_tokens(9, [0, 0, 0]) == [3, 3, 3]
+    assert split_tokens(5, []) == []
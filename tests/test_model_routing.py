@@ -0,0 +1,31 @@
+import pytest
+
+from model_routing import choose_model, parse_route
+
+ROUTES = [(500, "gpt-4.1-nano"), (1000, "gpt-4o-mini")]
+
+
+@pytest.mark.parametrize("input_tokens, model", [
+    (0, "gpt-4.1-nano"),
+    (500, "gpt-4.1-nano"),
+    (501, "gpt-4o-mini"),
+    (1000, "gpt-4o-mini"),
+    (1001, "gpt-4o"),
+])
+def test_choose_model_thresholds(input_tokens, model):
+    assert choose_model(input_tokens, ROUTES, "gpt-4o") == model
+
+
+def test_choose_model_without_routes():
+    assert choose_model(10, [], "gpt-4o") == "gpt-4o"
+
+
+def test_routes_are_checked_in_order():
+    assert choose_model(100, [(1000, "gpt-4o-mini"), (500, "gpt-4.1-nano")], "gpt-4o") == "gpt-4o-mini"
+
+
+def test_parse_route():
+    assert parse_route("gpt-4o-mini:1000") == (1000, "gpt-4o-mini")
+    for text in ("gpt-4o-mini", "gpt-4o-mini:много", ":1000", "unknown-model:1000"):
+        with pytest.raises(ValueError):
+            parse_route(text)
@@ -0,0 +1,80 @@
+import asyncio
+import random
+
+from qna_async import run_in_order
+
+
+# Обработчик со случайной задержкой, который запоминает, сколько элементов обрабатывается одновременно
+def make_worker(in_flight, peak, seed=0):
+    rng = random.Random(seed)
+    delays = {}
+
+    async def worker(item):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(delays.setdefault(item, rng.random() / 200))
+        in_flight[0] -= 1
+        return item * 10
+
+    return worker
+
+
+def test_results_and_on_ordered_follow_input_order():
+    in_flight, peak = [0], [0]
+    done, ordered = [], []
+    results = asyncio.run(run_in_order(range(50), make_worker(in_flight, peak), max_in_flight=8,
+                                       on_done=lambda position, result: done.append(position),
+                                       on_ordered=lambda position, result: ordered.append((position, result))))
+    assert results == [item * 10 for item in range(50)]
+    assert ordered == [(position, position * 10) for position in range(50)]
+    assert sorted(done) == list(range(50))
+
+
+def test_on_ordered_waits_for_earlier_items():
+    done, ordered = [], []
+
+    # Первые элементы обрабатываются дольше всех, поэтому завершаются последними
+    async def worker(item):
+        await asyncio.sleep((5 - item) / 500)
+        return item
+
+    asyncio.run(run_in_order(range(5), worker, max_in_flight=5,
+                             on_done=lambda position, result: done.append(position),
+                             on_ordered=lambda position, result: ordered.append(position)))
+    assert done == [4, 3, 2, 1, 0]
+    assert ordered == [0, 1, 2, 3, 4]
+
+
+def test_window_is_bounded_by_max_in_flight():
+    for max_in_flight in (1, 3, 16):
+        in_flight, peak = [0], [0]
+        asyncio.run(run_in_order(range(40), make_worker(in_flight, peak), max_in_flight=max_in_flight))
+        assert peak[0] == max_in_flight
+        assert in_flight[0] == 0
+
+
+def test_window_is_not_larger_than_input():
+    in_flight, peak = [0], [0]
+    results = asyncio.run(run_in_order(range(3), make_worker(in_flight, peak), max_in_flight=16))
+    assert results == [0, 10, 20]
+    assert peak[0] == 3
+
+
+def test_empty_input():
+    assert asyncio.run(run_in_order([], make_worker([0], [0]))) == []
+
+
+def test_launch_order_does_not_change_output_order():
+    started, ordered = [], []
+
+    async def worker(item):
+        started.append(item)
+        await asyncio.sleep(0)
+        return item
+
+    order = [4, 2, 0, 3, 1]
+    results = asyncio.run(run_in_order("abcde", worker, max_in_flight=1, order=order,
+                                       on_ordered=lambda position, result: ordered.append(result)))
+    assert started == ["e", "c", "a", "d", "b"]
+    assert results == list("abcde")
+    assert ordered == list("abcde")
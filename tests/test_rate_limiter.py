@@ -0,0 +1,106 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import RateLimiter, parse_reset_duration, retry_after_from_error
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("6m0s", 360.0),
+    ("1.5s", 1.5),
+    ("20ms", 0.02),
+    ("1h2m3s", 3723.0),
+    ("2m30.5s", 150.5),
+    ("7", 7.0),
+    (" 0.25 ", 0.25),
+    (3, 3.0),
+])
+def test_parse_reset_duration(value, seconds):
+    assert parse_reset_duration(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", [None, "", "soon", "5 minutes"])
+def test_parse_reset_duration_unknown(value):
+    assert parse_reset_duration(value) is None
+
+
+# Часы, которыми тест управляет сам
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+
+def test_rate_limited_halves_scale_once_per_cooldown(clock):
+    limiter = RateLimiter(decrease_cooldown=2.0)
+    limiter.on_rate_limited()
+    limiter.on_rate_limited()
+    clock.now += 1.0
+    limiter.on_rate_limited()
+    assert limiter.scale == 0.5
+    assert limiter.rate_limited_count == 3
+    clock.now += 1.0
+    limiter.on_rate_limited()
+    assert limiter.scale == 0.25
+
+
+def test_longer_retry_after_extends_cooldown(clock):
+    limiter = RateLimiter(decrease_cooldown=1.0)
+    limiter.on_rate_limited(retry_after=5.0)
+    assert limiter.blocked_until == clock.now + 5.0
+    clock.now += 3.0
+    limiter.on_rate_limited()
+    assert limiter.scale == 0.5
+    clock.now += 2.0
+    limiter.on_rate_limited()
+    assert limiter.scale == 0.25
+
+
+def test_scale_stays_within_bounds(clock):
+    limiter = RateLimiter(decrease_cooldown=0.0, min_scale=0.1, increase_step=0.3)
+    for _ in range(10):
+        limiter.on_rate_limited()
+    assert limiter.scale == 0.1
+    for _ in range(10):
+        limiter.on_success()
+    assert limiter.scale == 1.0
+
+
+def test_rate_limited_empties_buckets(clock):
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=6000)
+    limiter.on_rate_limited()
+    assert limiter.available_requests == 0.0
+    assert limiter.available_tokens == 0.0
+
+
+def test_observe_headers_lowers_available_budget(clock):
+    limiter = RateLimiter(requests_per_minute=500, tokens_per_minute=300_000)
+    limiter.observe_headers({"x-ratelimit-remaining-requests": "3", "x-ratelimit-remaining-tokens": "1200",
+                             "retry-after": "2"})
+    assert limiter.available_requests == 3.0
+    assert limiter.available_tokens == 1200.0
+    assert limiter.blocked_until == clock.now + 2.0
+
+
+# Ошибка 429 с заголовками ответа, как у openai.error.RateLimitError
+class RateLimitError(Exception):
+    def __init__(self, headers):
+        super().__init__("rate limited")
+        self.headers = headers
+
+
+def test_retry_after_from_error_takes_longest_reset():
+    error = RateLimitError({"retry-after": "1", "x-ratelimit-reset-requests": "120ms",
+                            "x-ratelimit-reset-tokens": "6m0s"})
+    assert retry_after_from_error(error) == 360.0
+    assert retry_after_from_error(RateLimitError({"x-ratelimit-reset-requests": "1.5s"})) == 1.5
+    assert retry_after_from_error(RateLimitError({})) is None
+    assert retry_after_from_error(Exception()) is None
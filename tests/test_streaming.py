@@ -0,0 +1,64 @@
+from streaming import StreamMonitor, STOP_COMPLETE, STOP_OFF_FORMAT, START_CHECK_CHARS
+
+RESPONSE = ("<div>\n  <h2>Вопрос:</h2>\n  <p>Почему не морозит?</p>\n  <h2>Ответ:</h2>\n  <div><p>Текст</p></div>\n"
+            "  <h3>Категория:</h3>\n  <p>12</p>\n</div>")
+
+
+# Функция для подачи текста монитору фрагментами по size символов; возвращает (причина, сколько символов подано)
+def feed_in_chunks(monitor, text, size):
+    for start in range(0, len(text), size):
+        stop_reason = monitor.feed(text[start:start + size])
+        if stop_reason is not None:
+            return stop_reason, start + size
+    return None, len(text)
+
+
+def test_stops_after_category_paragraph():
+    for size in (1, 3, 7, len(RESPONSE)):
+        monitor = StreamMonitor()
+        stop_reason, fed = feed_in_chunks(monitor, RESPONSE + "\nЛишний текст после ответа", size)
+        assert stop_reason == STOP_COMPLETE
+        # Поток остановлен на фрагменте, закрывшем абзац категории
+        assert len(monitor.text) - monitor.text.index("<p>12</p>") - len("<p>12</p>") < size
+        assert fed < len(RESPONSE) + size
+
+
+def test_heading_split_across_chunks():
+    monitor = StreamMonitor()
+    for piece in RESPONSE.partition("Категория:")[0], "Катего", "рия:</h3>\n  <p>3", "</p>":
+        stop_reason = monitor.feed(piece)
+    assert stop_reason == STOP_COMPLETE
+
+
+def test_no_stop_before_category_closed():
+    monitor = StreamMonitor()
+    stop_reason, _ = feed_in_chunks(monitor, RESPONSE[:RESPONSE.index("</p>\n</div>")], 5)
+    assert stop_reason is None
+
+
+def test_code_fence_is_accepted():
+    monitor = StreamMonitor()
+    stop_reason, _ = feed_in_chunks(monitor, "```html\n" + RESPONSE, 4)
+    assert stop_reason == STOP_COMPLETE
+
+
+def test_plain_text_is_off_format_at_first_character():
+    monitor = StreamMonitor()
+    assert monitor.feed("  ") is None
+    assert monitor.feed("Извините") == STOP_OFF_FORMAT
+
+
+def test_wrong_markup_is_off_format_after_check_window():
+    monitor = StreamMonitor()
+    stop_reason, fed = feed_in_chunks(monitor, "<div><h2>Ответ:</h2>" + "<p>текст</p>" * 20, 2)
+    assert stop_reason == STOP_OFF_FORMAT
+    assert fed <= START_CHECK_CHARS + 2
+
+
+def test_short_partial_start_waits_for_more_text():
+    monitor = StreamMonitor()
+    assert monitor.feed("<div") is None
+    assert monitor.feed(">\n  <h2>Вопр") is None
+    assert monitor.start_ok is False
+    assert monitor.feed("ос:</h2>") is None
+    assert monitor.start_ok is True
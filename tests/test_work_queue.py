@@ -0,0 +1,59 @@
+import pytest
+
+from work_queue import WorkQueue, SHARD_DONE, SHARD_LEASED, SHARD_PENDING
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    queue.create_shards(25, shard_size=10, fingerprint="вход")
+    yield queue
+    queue.close()
+
+
+def test_shards_cover_all_rows(queue):
+    assert queue.shards() == [(0, 1, 10, SHARD_PENDING), (1, 11, 20, SHARD_PENDING), (2, 21, 25, SHARD_PENDING)]
+    assert queue.create_shards(25, shard_size=10, fingerprint="вход") is False
+    assert queue.create_shards(25, shard_size=10, fingerprint="другой вход") is True
+
+
+def test_claim_takes_free_shards_in_order(queue):
+    assert queue.claim("a") == (0, 1, 10)
+    assert queue.claim("b") == (1, 11, 20)
+    assert queue.claim("a") == (2, 21, 25)
+    assert queue.claim("c") is None
+    assert queue.progress() == {SHARD_PENDING: 0, SHARD_LEASED: 3, SHARD_DONE: 0}
+
+
+def test_expired_lease_is_taken_over(queue):
+    queue.create_shards(5, shard_size=10, fingerprint="один шард")
+    assert queue.claim("a", lease_seconds=-1) == (0, 1, 5)
+    assert queue.claim("b") == (0, 1, 5)
+    assert queue.renew(0, "a") is False
+    assert queue.renew(0, "b") is True
+
+
+def test_live_lease_is_not_taken_over(queue):
+    queue.create_shards(5, shard_size=10, fingerprint="один шард")
+    assert queue.claim("a", lease_seconds=60) == (0, 1, 5)
+    assert queue.claim("b") is None
+
+
+def test_finish_is_ignored_after_lease_was_lost(queue):
+    queue.create_shards(5, shard_size=10, fingerprint="один шард")
+    queue.claim("a", lease_seconds=-1)
+    queue.claim("b")
+    assert queue.finish(0, "a") is None
+    assert queue.shards() == [(0, 1, 5, SHARD_LEASED)]
+    assert queue.finish(0, "b") == SHARD_DONE
+    assert queue.finish(0, "b") is None  # Повторное завершение уже готового шарда ничего не меняет
+
+
+def test_incomplete_shard_returns_to_queue_until_max_attempts(queue):
+    queue.create_shards(5, shard_size=10, fingerprint="один шард")
+    for _ in range(2):
+        queue.claim("a")
+        assert queue.finish(0, "a", complete=False, max_attempts=3) == SHARD_PENDING
+    queue.claim("a")
+    assert queue.finish(0, "a", complete=False, max_attempts=3) == SHARD_DONE
+    assert queue.claim("a") is None
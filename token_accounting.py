@@ -0,0 +1,57 @@
+import os
+from functools import lru_cache
+
+import tiktoken
+
+
+# Кодировщик создаётся один раз на модель, а не при каждом подсчёте
+@lru_cache(maxsize=None)
+def get_encoder(model):
+    return tiktoken.encoding_for_model(model)
+
+
+# Функция для подсчёта токенов
+def count_tokens(text, model):
+    return len(get_encoder(model).encode(text))
+
+
+# Функция для пакетного подсчёта токенов (encode_batch распределяет тексты по потокам)
+def count_tokens_batch(texts, model, num_threads=None):
+    texts = [str(text) for text in texts]
+    if not texts:
+        return []
+    encoded = get_encoder(model).encode_batch(texts, num_threads=num_threads or os.cpu_count() or 1)
+    return [len(tokens) for tokens in encoded]
+
+
+# Функция для получения фактического расхода токенов из ответа API: (входные, выходные) или None
+def usage_from_response(response):
+    usage = response.get("usage") if hasattr(response, "get") else None
+    if not usage:
+        return None
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+# Накопительный учёт токенов по ходу обработки.
+# Если API вернул usage - используются его значения, иначе - предварительная оценка по tiktoken.
+class TokenUsage:
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.requests = 0
+        self.estimated_requests = 0  # Запросы, для которых usage не пришёл и токены оценены локально
+
+    def add(self, input_tokens, output_tokens, estimated=False):
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.requests += 1
+        if estimated:
+            self.estimated_requests += 1
+
+    @property
+    def total_tokens(self):
+        return self.input_tokens + self.output_tokens
+
+    # Стоимость в долларах по ценам за 1M входящих и выходящих токенов
+    def cost(self, input_cost_per_m, output_cost_per_m):
+        return (self.input_tokens * input_cost_per_m + self.output_tokens * output_cost_per_m) / 1_000_000
@@ -0,0 +1,252 @@
+# Очередь шардов для обработки на нескольких процессах или машинах через общий файл SQLite (без внешних сервисов).
+# Координатор делит вход на диапазоны id (шарды). Рабочий процесс берёт шард в аренду на lease_seconds
+# и продлевает аренду, пока его обрабатывает; аренда упавшего процесса истекает, и шард забирает другой.
+# Каждый шард пишет результаты в свой журнал (ResultJournal), поэтому подхвативший шард процесс продолжает
+# с места остановки, а объединение читает журналы в порядке шардов.
+# Файл очереди должен лежать там, где работают блокировки SQLite (локальный диск или общая ФС с блокировками).
+import glob
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+
+from result_journal import ResultJournal
+from run_manifest import row_content_hash
+
+# Строк в одном шарде по умолчанию
+DEFAULT_SHARD_SIZE = 1000
+
+# Длительность аренды шарда, секунд (продлевается каждые lease_seconds / 3)
+DEFAULT_LEASE_SECONDS = 120
+
+# Сколько раз шард с ошибочными строками возвращается в очередь, прежде чем считается завершённым
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Статусы шардов
+SHARD_PENDING = "pending"
+SHARD_LEASED = "leased"
+SHARD_DONE = "done"
+
+
+# Функция для отпечатка входа: хэш содержимого всех строк по порядку.
+# Очередь продолжается только для того же входа, а не для любого с тем же числом строк.
+def input_fingerprint(rows):
+    digest = hashlib.sha256()
+    for question, answers in rows:
+        digest.update(row_content_hash(question, answers).encode("ascii"))
+    return digest.hexdigest()
+
+
+# Очередь шардов в SQLite
+class WorkQueue:
+    def __init__(self, path):
+        self.path = path
+        # Транзакции открываются явно (BEGIN IMMEDIATE), чтобы выбор и захват шарда были атомарными
+        self.connection = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                shard_id INTEGER PRIMARY KEY,
+                start_id INTEGER,
+                end_id INTEGER,
+                status TEXT,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER DEFAULT 0,
+                updated_at REAL
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS workers (
+                worker TEXT PRIMARY KEY,
+                host TEXT,
+                pid INTEGER,
+                requests_per_minute INTEGER,
+                tokens_per_minute INTEGER,
+                last_seen REAL
+            )
+        """)
+
+    def _meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    # Число строк входа, на которое рассчитана очередь (None, если шарды ещё не созданы)
+    @property
+    def total_rows(self):
+        value = self._meta("total_rows")
+        return int(value) if value is not None else None
+
+    # Отпечаток входа, для которого созданы шарды (input_fingerprint)
+    @property
+    def input_fingerprint(self):
+        return self._meta("input_fingerprint")
+
+    # Функция для разбиения входа на шарды по shard_size строк.
+    # Если очередь уже создана для того же входа (fingerprint), числа строк и размера шарда, она сохраняется
+    # (продолжение работы). Иначе журналы прежних шардов удаляются, чтобы их строки не попали в новый запуск.
+    # Возвращает True, если шарды созданы заново.
+    def create_shards(self, total_rows, shard_size=DEFAULT_SHARD_SIZE, fingerprint=""):
+        if (self.total_rows == total_rows and self._meta("shard_size") == str(shard_size)
+                and self.input_fingerprint == fingerprint):
+            return False
+        self.remove_shard_journals()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            self.connection.execute("DELETE FROM shards")
+            self.connection.executemany(
+                "INSERT INTO shards (shard_id, start_id, end_id, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                ((number, start, min(start + shard_size - 1, total_rows), SHARD_PENDING, time.time())
+                 for number, start in enumerate(range(1, total_rows + 1, shard_size))))
+            self.connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                                        [("total_rows", str(total_rows)), ("shard_size", str(shard_size)),
+                                         ("input_fingerprint", fingerprint)])
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return True
+
+    # Функция для записи рабочего процесса и его бюджета (для просмотра состояния очереди)
+    def register_worker(self, worker_id, requests_per_minute=None, tokens_per_minute=None):
+        self.connection.execute("INSERT OR REPLACE INTO workers VALUES (?, ?, ?, ?, ?, ?)",
+                                (worker_id, socket.gethostname(), os.getpid(),
+                                 requests_per_minute, tokens_per_minute, time.time()))
+
+    # Функция для захвата свободного шарда или шарда с истёкшей арендой.
+    # Возвращает (shard_id, start_id, end_id) или None, если свободных шардов нет.
+    def claim(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        now = time.time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.connection.execute(
+                "SELECT shard_id, start_id, end_id, status, worker FROM shards "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) ORDER BY shard_id LIMIT 1",
+                (SHARD_PENDING, SHARD_LEASED, now)).fetchone()
+            if row is not None:
+                self.connection.execute(
+                    "UPDATE shards SET status = ?, worker = ?, lease_expires = ?, updated_at = ? WHERE shard_id = ?",
+                    (SHARD_LEASED, worker_id, now + lease_seconds, now, row[0]))
+            self.connection.execute("UPDATE workers SET last_seen = ? WHERE worker = ?", (now, worker_id))
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+        shard_id, start_id, end_id, status, previous_worker = row
+        if status == SHARD_LEASED:
+            print(f"Шард {shard_id}: аренда {previous_worker} истекла, шард передан {worker_id}")
+        return shard_id, start_id, end_id
+
+    # Функция для продления аренды; False, если шард уже забрал другой процесс
+    def renew(self, shard_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        now = time.time()
+        cursor = self.connection.execute(
+            "UPDATE shards SET lease_expires = ?, updated_at = ? WHERE shard_id = ? AND worker = ? AND status = ?",
+            (now + lease_seconds, now, shard_id, worker_id, SHARD_LEASED))
+        self.connection.execute("UPDATE workers SET last_seen = ? WHERE worker = ?", (now, worker_id))
+        return cursor.rowcount == 1
+
+    # Функция для завершения работы над шардом.
+    # complete=False (остались ошибочные строки) - шард возвращается в очередь, пока не исчерпано max_attempts.
+    # Шард меняется, только если аренда всё ещё у worker_id. Возвращает новый статус шарда
+    # или None, если шард не изменён (аренду забрал другой процесс).
+    def finish(self, shard_id, worker_id, complete=True, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            attempts = self.connection.execute("SELECT attempts FROM shards WHERE shard_id = ?",
+                                               (shard_id,)).fetchone()[0] + 1
+            status = SHARD_DONE if complete or attempts >= max_attempts else SHARD_PENDING
+            cursor = self.connection.execute(
+                "UPDATE shards SET status = ?, lease_expires = NULL, attempts = ?, updated_at = ? "
+                "WHERE shard_id = ? AND worker = ? AND status = ?",
+                (status, attempts, time.time(), shard_id, worker_id, SHARD_LEASED))
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+        return status if cursor.rowcount == 1 else None
+
+    # Функция для числа шардов по статусам
+    def progress(self):
+        counts = dict.fromkeys((SHARD_PENDING, SHARD_LEASED, SHARD_DONE), 0)
+        for status, count in self.connection.execute("SELECT status, COUNT(*) FROM shards GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    # Все шарды в порядке id: (shard_id, start_id, end_id, status)
+    def shards(self):
+        cursor = self.connection.execute("SELECT shard_id, start_id, end_id, status FROM shards ORDER BY shard_id")
+        return cursor.fetchall()
+
+    # Функция для пути журнала шарда (рядом с файлом очереди)
+    def shard_journal_path(self, shard_id):
+        base, _ = os.path.splitext(self.path)
+        return f"{base}.shard-{shard_id:05d}.sqlite"
+
+    # Функция для удаления журналов всех шардов очереди (вместе с файлами WAL)
+    def remove_shard_journals(self):
+        base, _ = os.path.splitext(self.path)
+        for path in glob.glob(f"{glob.escape(base)}.shard-*.sqlite*"):
+            os.remove(path)
+
+    def close(self):
+        self.connection.close()
+
+
+# Продление аренды шарда в фоновом потоке, пока шард обрабатывается.
+# Использует отдельное соединение с очередью: sqlite3 не разрешает общее соединение между потоками.
+class LeaseKeeper:
+    def __init__(self, queue_path, shard_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.queue_path = queue_path
+        self.shard_id = shard_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        queue = WorkQueue(self.queue_path)
+        try:
+            while not self.stopped.wait(self.lease_seconds / 3):
+                if not queue.renew(self.shard_id, self.worker_id, self.lease_seconds):
+                    self.lost = True
+                    print(f"Шард {self.shard_id}: аренда потеряна, шард обрабатывает другой процесс")
+                    return
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+
+# Функция для объединения результатов шардов: строки всех журналов в порядке id записываются в sink.
+# Строки журнала с id вне диапазона его шарда отбрасываются.
+# Возвращает все строки (для выгрузки в XLSX).
+def merge_shards(queue, sink):
+    merged = []
+    for shard_id, start_id, end_id, status in queue.shards():
+        journal_path = queue.shard_journal_path(shard_id)
+        if not os.path.exists(journal_path):
+            print(f"Шард {shard_id} (id {start_id}-{end_id}) ещё не обработан")
+            continue
+        journal = ResultJournal(journal_path)
+        rows = journal.rows()
+        journal.close()
+        foreign = [row for row in rows if not start_id <= row[0] <= end_id]
+        if foreign:
+            print(f"Шард {shard_id} (id {start_id}-{end_id}): отброшено строк с чужими id: {len(foreign)}")
+            rows = [row for row in rows if start_id <= row[0] <= end_id]
+        sink.write_rows(rows)
+        merged.extend(rows)
+    return merged